@@ -1,5 +1,41 @@
 from django.contrib import admin
-from .models import Gasto
+from django.db import transaction
+
+from .models import (
+    Categoria, CorteArchivo, Gasto, GastoArchivado, GastoDiario, GastoMensual, MensajeEntrante, MensajeSaliente, Presupuesto,
+    TelefonoAutorizado, Usuario,
+)
+from .services import ResumenDiarioService
+
+
+@admin.register(Usuario)
+class UsuarioAdmin(admin.ModelAdmin):
+    """
+    Teléfonos de los gastos (dimensión; las filas no se modifican ni se eliminan)
+    """
+    list_display = ['id', 'numero_telefono']
+    search_fields = ['numero_telefono']
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Categoria)
+class CategoriaAdmin(admin.ModelAdmin):
+    """
+    Nombres de categorías de los gastos (dimensión; las filas no se modifican ni se eliminan)
+    """
+    list_display = ['id', 'nombre']
+    search_fields = ['nombre']
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Gasto)
@@ -7,15 +43,16 @@ class GastoAdmin(admin.ModelAdmin):
     """
     Configuración del admin para el modelo Gasto
     """
-    list_display = ['categoria', 'monto', 'numero_telefono', 'fecha', 'fecha_str']
-    list_filter = ['categoria', 'fecha', 'numero_telefono']
-    search_fields = ['categoria', 'numero_telefono', 'mensaje_original']
+    list_display = ['categoria', 'monto', 'usuario', 'fecha', 'fecha_str']
+    list_filter = ['fecha']
+    search_fields = ['categoria__nombre', 'usuario__numero_telefono', 'mensaje_original']
+    autocomplete_fields = ['usuario', 'categoria']
     readonly_fields = ['fecha']
     ordering = ['-fecha']
     
     fieldsets = (
         ('Información del Gasto', {
-            'fields': ('numero_telefono', 'categoria', 'monto')
+            'fields': ('usuario', 'categoria', 'monto')
         }),
         ('Metadatos', {
             'fields': ('fecha', 'mensaje_original'),
@@ -27,4 +64,157 @@ class GastoAdmin(admin.ModelAdmin):
         """
         Optimizar consultas
         """
-        return super().get_queryset(request)
+        return super().get_queryset(request).select_related('usuario', 'categoria')
+    
+    def save_model(self, request, obj, form, change):
+        """
+        Mantiene los totales diarios al crear o editar desde el admin
+        """
+        with transaction.atomic():
+            if change:
+                ResumenDiarioService.descontar(Gasto.objects.select_for_update().get(pk=obj.pk))
+            super().save_model(request, obj, form, change)
+            ResumenDiarioService.registrar(obj)
+    
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            ResumenDiarioService.descontar(obj)
+    
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            gastos = list(queryset)
+            super().delete_queryset(request, queryset)
+            for gasto in gastos:
+                ResumenDiarioService.descontar(gasto)
+
+
+@admin.register(GastoArchivado)
+class GastoArchivadoAdmin(admin.ModelAdmin):
+    """
+    Gastos movidos al archivo (solo lectura)
+    """
+    list_display = ['id', 'categoria', 'monto', 'usuario', 'fecha']
+    list_filter = ['fecha']
+    search_fields = ['categoria__nombre', 'usuario__numero_telefono', 'mensaje_original']
+    ordering = ['-fecha']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('usuario', 'categoria')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CorteArchivo)
+class CorteArchivoAdmin(admin.ModelAdmin):
+    """
+    Corte del archivo (lo actualiza el comando archive_gastos)
+    """
+    list_display = ['corte', 'actualizado']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(GastoDiario)
+class GastoDiarioAdmin(admin.ModelAdmin):
+    """
+    Totales diarios (solo lectura; se recalculan con rebuild_resumen_diario)
+    """
+    list_display = ['dia', 'usuario', 'categoria', 'total', 'cantidad']
+    list_filter = ['dia']
+    search_fields = ['usuario__numero_telefono', 'categoria__nombre']
+    ordering = ['-dia']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('usuario', 'categoria')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(GastoMensual)
+class GastoMensualAdmin(admin.ModelAdmin):
+    """
+    Totales mensuales (solo lectura; se recalculan con rebuild_resumen_diario)
+    """
+    list_display = ['mes', 'usuario', 'categoria', 'total', 'cantidad']
+    list_filter = ['mes']
+    search_fields = ['usuario__numero_telefono', 'categoria__nombre']
+    ordering = ['-mes']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('usuario', 'categoria')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Presupuesto)
+class PresupuestoAdmin(admin.ModelAdmin):
+    """
+    Presupuestos mensuales por categoría
+    """
+    list_display = ['usuario', 'categoria', 'monto', 'actualizado']
+    search_fields = ['usuario__numero_telefono', 'categoria__nombre']
+    autocomplete_fields = ['usuario', 'categoria']
+    readonly_fields = ['actualizado']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('usuario', 'categoria')
+
+
+@admin.register(MensajeSaliente)
+class MensajeSalienteAdmin(admin.ModelAdmin):
+    """
+    Configuración del admin para el outbox de respuestas
+    """
+    list_display = ['numero_telefono', 'estado', 'intentos', 'creado', 'enviado']
+    list_filter = ['estado']
+    search_fields = ['numero_telefono', 'cuerpo', 'message_sid']
+    readonly_fields = ['creado', 'enviado', 'message_sid', 'ultimo_error']
+    ordering = ['-creado']
+
+
+@admin.register(MensajeEntrante)
+class MensajeEntranteAdmin(admin.ModelAdmin):
+    """
+    Mensajes recibidos por MessageSid (solo lectura; evitan procesar reintentos)
+    """
+    list_display = ['message_sid', 'numero_telefono', 'procesado']
+    search_fields = ['message_sid', 'numero_telefono']
+    ordering = ['-procesado']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TelefonoAutorizado)
+class TelefonoAutorizadoAdmin(admin.ModelAdmin):
+    """
+    Números habilitados para usar el bot (se aplican sin redeploy)
+    """
+    list_display = ['numero_telefono', 'nombre', 'activo', 'creado']
+    list_editable = ['activo']
+    list_filter = ['activo']
+    search_fields = ['numero_telefono', 'nombre']
+    readonly_fields = ['creado']
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class GastosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gastos'
+
+    def ready(self):
+        # Registra las señales que invalidan los teléfonos autorizados, los
+        # índices de categorías y el corte del archivo, el contador de
+        # consultas de cada conexión y los chequeos de configuración
+        from . import archivo, categorias, checks, queries, telefonos  # noqa: F401
@@ -0,0 +1,117 @@
+"""
+Archivo de gastos viejos.
+
+Los gastos anteriores al corte del archivo (CorteArchivo) se mueven de
+Gasto a GastoArchivado con el comando ``archive_gastos``, así la tabla que
+se escribe y se consulta todo el tiempo queda chica. Las lecturas eligen
+el modelo según el rango pedido: si empieza después del corte alcanza con
+Gasto; si no, se lee GastoHistorico (la vista con las dos tablas).
+
+Cada proceso guarda el corte en memoria y lo vuelve a leer cada
+ARCHIVO_CORTE_REFRESH_SECONDS. Por eso el comando primero publica el corte
+nuevo, espera a que todos los procesos lo vean y recién después mueve
+filas: ningún proceso lee solo Gasto un rango que ya puede estar archivado.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from .models import CorteArchivo, Gasto, GastoArchivado, GastoHistorico
+
+CAMPOS = ('id', 'usuario_id', 'categoria_id', 'monto', 'fecha', 'mensaje_original')
+
+
+class Archivo:
+    """
+    Corte del archivo en memoria del proceso y movimiento de gastos
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._corte = None
+        self._checked_at = None
+        self.loads = 0
+
+    def corte(self):
+        """
+        Fecha hasta la que puede haber gastos archivados (None si nunca se
+        archivó nada)
+        """
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < settings.ARCHIVO_CORTE_REFRESH_SECONDS:
+            return self._corte
+        corte = CorteArchivo.objects.values_list('corte', flat=True).first()
+        with self._lock:
+            self._corte, self._checked_at = corte, now
+            self.loads += 1
+        return corte
+
+    def modelo(self, desde=None):
+        """
+        Modelo a consultar para gastos desde esa fecha (None: sin límite).
+        GastoHistorico solo si el rango puede incluir gastos archivados.
+        """
+        corte = self.corte()
+        if corte is None or (desde is not None and desde >= corte):
+            return Gasto
+        return GastoHistorico
+
+    def publicar(self, corte):
+        """
+        Guarda el corte nuevo (solo avanza) y lo aplica en este proceso.
+        Retorna el corte vigente.
+        """
+        with transaction.atomic():
+            actual = CorteArchivo.objects.select_for_update().first()
+            if actual is None:
+                actual = CorteArchivo.objects.create(corte=corte)
+            elif corte > actual.corte:
+                actual.corte = corte
+                actual.save(update_fields=['corte', 'actualizado'])
+        with self._lock:
+            self._corte, self._checked_at = actual.corte, time.monotonic()
+        return actual.corte
+
+    def mover(self, corte, chunk_size=5000):
+        """
+        Mueve a GastoArchivado los gastos anteriores al corte, de a
+        chunk_size por transacción (copia y borrado juntos). Genera la
+        cantidad movida en cada tanda.
+        """
+        while True:
+            with transaction.atomic():
+                filas = list(
+                    Gasto.objects.select_for_update().filter(fecha__lt=corte)
+                    .order_by('fecha', 'id').values_list(*CAMPOS)[:chunk_size]
+                )
+                if not filas:
+                    return
+                GastoArchivado.objects.bulk_create(
+                    [GastoArchivado(**dict(zip(CAMPOS, fila))) for fila in filas]
+                )
+                Gasto.objects.filter(id__in=[fila[0] for fila in filas]).delete()
+            yield len(filas)
+
+    def reset(self):
+        """
+        Olvida el corte del proceso actual (se vuelve a leer en la próxima consulta)
+        """
+        with self._lock:
+            self._corte, self._checked_at = None, None
+
+    def stats(self):
+        return {'corte': self._corte.isoformat() if self._corte else None, 'cargas': self.loads}
+
+
+archivo = Archivo()
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting.startswith('ARCHIVO'):
+        archivo.reset()
@@ -0,0 +1,27 @@
+"""
+Protocolo lifespan de ASGI, que el handler de Django no atiende: al
+apagar el worker se cierran las sesiones aiohttp del cliente de Twilio
+en lugar de dejar los sockets abiertos hasta que termine el proceso.
+"""
+
+from .twilio_client import async_registry
+
+
+def con_lifespan(app):
+    """
+    Envuelve la aplicación ASGI de Django: los eventos de lifespan se
+    atienden acá y el resto de las conexiones pasan a la aplicación
+    """
+    async def application(scope, receive, send):
+        if scope['type'] != 'lifespan':
+            return await app(scope, receive, send)
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                await async_registry.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    return application
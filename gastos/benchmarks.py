@@ -0,0 +1,351 @@
+"""
+Utilidades para los comandos de benchmark: stand-in local de Twilio,
+servidor de la app en un proceso aparte y estadísticas de latencia
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings as django_settings
+from django.db import transaction
+from django.test import override_settings
+
+
+def percentile(values, pct):
+    """
+    Percentil por rango más cercano de una lista de valores
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_stats(latencies):
+    """
+    Resume una lista de latencias (en segundos) en milisegundos
+    """
+    return {
+        'requests': len(latencies),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+
+@contextmanager
+def rollback():
+    """
+    Ejecuta el bloque dentro de una transacción que se descarta al final,
+    para no dejar datos sintéticos en la base
+    """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+class TwilioStandIn:
+    """
+    Servidor HTTP local que imita el endpoint de mensajes de Twilio.
+
+    Responde a ``POST /2010-04-01/Accounts/<sid>/Messages.json`` con un
+    mensaje en formato JSON, luego de esperar ``latency`` segundos para
+    simular el viaje de ida y vuelta a la API real.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def settings(self, **extra):
+        """
+        override_settings que apunta el cliente de Twilio a este stand-in
+        """
+        return override_settings(
+            TWILIO_ACCOUNT_SID='ACstandin',
+            TWILIO_AUTH_TOKEN='standin',
+            TWILIO_WHATSAPP_NUMBER='whatsapp:+14155238886',
+            TWILIO_API_BASE_URL=self.base_url,
+            TWILIO_STUB=False,
+            **extra
+        )
+
+    def environ(self, **extra):
+        """
+        Variables de entorno equivalentes a settings(), para un AppServer
+        """
+        return {
+            'TWILIO_ACCOUNT_SID': 'ACstandin',
+            'TWILIO_AUTH_TOKEN': 'standin',
+            'TWILIO_WHATSAPP_NUMBER': 'whatsapp:+14155238886',
+            'TWILIO_API_BASE_URL': self.base_url,
+            'TWILIO_STUB': 'False',
+            **{key: str(value) for key, value in extra.items()},
+        }
+
+    def _next_sid(self):
+        with self._lock:
+            self.requests += 1
+            return f'SM{next(self._counter):032d}'
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Sin Nagle: las respuestas keep-alive no esperan el ACK diferido
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                if standin.latency:
+                    time.sleep(standin.latency)
+                body = json.dumps({
+                    'sid': standin._next_sid(),
+                    'account_sid': 'ACstandin',
+                    'status': 'queued',
+                    'num_segments': '1',
+                }).encode()
+                self.send_response(201)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class AppServer:
+    """
+    Levanta la app con gunicorn en un proceso aparte, como en producción:
+    WSGI con workers sync (Procfile) o ASGI con workers de uvicorn.
+
+    Usa una base SQLite temporal (migrada al arrancar) salvo que el
+    entorno indique DATABASE_URL, y DEBUG desactivado.
+    """
+
+    def __init__(self, asgi=False, workers=1, env=None):
+        self.asgi = asgi
+        self.workers = workers
+        self.env = env or {}
+        self.port = _free_port()
+        self._tmp = None
+        self._process = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        env = {
+            **os.environ,
+            'DATABASE_URL': f"sqlite:///{os.path.join(self._tmp.name, 'bench.sqlite3')}",
+            'DEBUG': 'False',
+            'LOG_FILE': os.path.join(self._tmp.name, 'bench.log'),
+            **self.env,
+        }
+        base_dir = str(django_settings.BASE_DIR)
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v0'], cwd=base_dir, env=env, check=True)
+
+        if self.asgi:
+            app = ['gastos_whatsapp.asgi:application', '-k', 'uvicorn.workers.UvicornWorker']
+        else:
+            app = ['gastos_whatsapp.wsgi:application']
+        # La salida del servidor (logs de consola) va a un archivo temporal
+        self._output = open(os.path.join(self._tmp.name, 'server.out'), 'w+')
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *app, '--bind', f'127.0.0.1:{self.port}',
+             '--workers', str(self.workers), '--log-level', 'warning'],
+            cwd=base_dir, env=env, stdout=self._output, stderr=subprocess.STDOUT,
+        )
+        self._wait_ready()
+        return self
+
+    def _wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                self._output.seek(0)
+                raise RuntimeError(
+                    f"El servidor terminó con código {self._process.returncode}:\n{self._output.read()[-2000:]}"
+                )
+            try:
+                with urllib.request.urlopen(f'{self.base_url}/health/', timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("El servidor no respondió a tiempo")
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        self._output.close()
+        self._tmp.cleanup()
+
+
+def run_load(url, payloads, concurrency, timeout=60):
+    """
+    Envía cada payload (form data) por POST a url, con hasta concurrency
+    requests en vuelo. Los payloads son diccionarios o tuplas (tipo, datos).
+
+    Retorna (resultados, segundos): un diccionario por request con tipo,
+    ok, latencia, consultas (header X-DB-Queries, si el servidor lo envía)
+    y error.
+    """
+    import aiohttp
+
+    async def main():
+        results = []
+        pending = iter(payloads)
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+            async def worker():
+                for item in pending:
+                    kind, data = item if isinstance(item, tuple) else (None, item)
+                    result = {'tipo': kind, 'ok': False, 'consultas': None, 'error': None}
+                    start = time.perf_counter()
+                    try:
+                        async with session.post(url, data=data) as response:
+                            await response.read()
+                            result['ok'] = response.status < 300
+                            if not result['ok']:
+                                result['error'] = f'HTTP {response.status}'
+                            if 'X-DB-Queries' in response.headers:
+                                result['consultas'] = int(response.headers['X-DB-Queries'])
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        result['error'] = type(e).__name__
+                    result['latencia'] = time.perf_counter() - start
+                    results.append(result)
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return results, time.perf_counter() - t0
+
+    return asyncio.run(main())
+
+
+# Mensajes de cada tipo para las pruebas de carga del webhook
+MENSAJES_CARGA = {
+    'gasto': lambda rnd: f"{rnd.choice(['comida', 'taxi', 'super', 'netflix', 'farmacia', 'nafta'])} "
+                         f"{rnd.randint(50, 20000)}",
+    'resumen': lambda rnd: rnd.choice(['resumen hoy', 'resumen semana', 'resumen mes', 'resumen 01-01 al 31-12']),
+    'eliminar': lambda rnd: 'eliminar ultimo',
+    'listar': lambda rnd: 'mis gastos',
+}
+
+MIX_DEFAULT = {'gasto': 70, 'resumen': 15, 'eliminar': 5, 'listar': 10}
+
+
+def parse_mix(value):
+    """
+    Convierte "gasto=70,resumen=15" en {'gasto': 70, 'resumen': 15}
+    """
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in MENSAJES_CARGA:
+            raise ValueError(f"Tipo de mensaje desconocido: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def webhook_payloads(total, mix, phones, seed=0, prefix='SMLOAD'):
+    """
+    Genera total webhooks (tipo, datos) con la proporción de mix, repartidos
+    entre phones y con un MessageSid distinto cada uno. Con la misma seed
+    genera siempre la misma secuencia.
+    """
+    rnd = random.Random(seed)
+    kinds = rnd.choices(list(mix), weights=list(mix.values()), k=total)
+    return [
+        (kind, {
+            'From': f'whatsapp:{rnd.choice(phones)}',
+            'Body': MENSAJES_CARGA[kind](rnd),
+            'MessageSid': f'{prefix}{seed:04d}{i:022d}',
+        })
+        for i, kind in enumerate(kinds)
+    ]
+
+
+def load_stats(results, elapsed):
+    """
+    Throughput, percentiles, consultas por request y errores, en total y
+    por tipo de mensaje
+    """
+    def stats(rows):
+        ok = [r for r in rows if r['ok']]
+        consultas = [r['consultas'] for r in ok if r['consultas'] is not None]
+        errores = {}
+        for r in rows:
+            if not r['ok']:
+                errores[r['error']] = errores.get(r['error'], 0) + 1
+        return {
+            **latency_stats([r['latencia'] for r in ok]),
+            'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+            'consultas_media': round(statistics.fmean(consultas), 2) if consultas else None,
+            'consultas_max': max(consultas) if consultas else None,
+            'errores': errores,
+        }
+
+    por_tipo = {}
+    for r in results:
+        por_tipo.setdefault(r['tipo'], []).append(r)
+    return {
+        'segundos': round(elapsed, 3),
+        'total': stats(results),
+        'por_tipo': {kind: stats(rows) for kind, rows in sorted(por_tipo.items())},
+    }
@@ -0,0 +1,102 @@
+"""
+Cache de resúmenes de gastos por teléfono
+"""
+
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+from .metrics import count_cache
+
+
+class ResumenCache:
+    """
+    Cache de resúmenes por teléfono y rango de fechas.
+
+    Cada teléfono tiene un número de generación que forma parte de la clave;
+    al crear o eliminar un gasto se incrementa y todas las entradas de ese
+    teléfono (y solo de ese) quedan obsoletas. Las entradas viejas las
+    descarta el propio backend por TTL o por tamaño.
+    """
+
+    def __init__(self, alias='resumenes'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _generation_key(self, phone_number):
+        return f'resumen:gen:{phone_number}'
+
+    def _generation(self, phone_number):
+        key = self._generation_key(phone_number)
+        generation = self.cache.get(key)
+        if generation is None:
+            # Sin generación (nueva o descartada por el backend): se arranca
+            # desde el reloj para no reutilizar claves de entradas viejas
+            self.cache.add(key, time.time_ns(), timeout=None)
+            generation = self.cache.get(key)
+        return generation
+
+    def get_or_compute(self, phone_number, desde, hasta, compute):
+        """
+        Retorna el resumen cacheado o lo calcula con compute() y lo guarda
+        """
+        key = f'resumen:{phone_number}:{self._generation(phone_number)}:{desde.isoformat()}:{hasta.isoformat()}'
+        resumen = self.cache.get(key)
+        count_cache('resumenes', resumen is not None)
+        if resumen is not None:
+            self._count('hits')
+            return resumen
+
+        self._count('misses')
+        resumen = compute()
+        self.cache.set(key, resumen)
+        return resumen
+
+    def invalidate(self, phone_number):
+        """
+        Invalida los resúmenes del teléfono cuando confirma la transacción
+        actual (o en el momento, si no hay transacción)
+        """
+        transaction.on_commit(lambda: self._bump(phone_number))
+
+    def clear(self):
+        """
+        Descarta todos los resúmenes cacheados
+        """
+        self.cache.clear()
+
+    def _bump(self, phone_number):
+        key = self._generation_key(phone_number)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, time.time_ns(), timeout=None)
+        self._count('invalidations')
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        """
+        Contadores de aciertos y fallos del proceso actual
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+
+resumen_cache = ResumenCache()
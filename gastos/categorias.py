@@ -0,0 +1,247 @@
+"""
+Canonicalización de categorías: "comidas", "Cmida" y "COMIDA" se registran
+como la categoría que el usuario ya usa ("Comida").
+
+Cada proceso mantiene, por teléfono, un índice de las categorías conocidas
+(más los alias de CATEGORIA_ALIASES) con sus variantes por borrado de
+caracteres (estilo SymSpell): buscar una categoría con hasta dos errores es
+generar las variantes del texto recibido y cruzarlas con diccionarios, sin
+recorrer todas las categorías.
+"""
+
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models import Sum
+from django.dispatch import receiver
+
+from .dimensiones import categoria_cache, usuario_cache
+from .models import GastoMensual
+
+
+def normalizar(texto):
+    """
+    Clave de comparación: minúsculas, sin acentos, espacios simples y sin
+    plural final ("Comidas " -> "comida")
+    """
+    texto = ' '.join(texto.lower().split())
+    if not texto.isascii():
+        texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    if len(texto) > 4 and texto.endswith('s'):
+        # "pantalones" queda en "pantalone", a un error de "pantalon"
+        texto = texto[:-1]
+    return texto
+
+
+def max_errores(clave):
+    """
+    Errores tolerados según el largo: las claves de hasta 3 letras solo
+    coinciden exactas y las de hasta 7 con un error que no sea un reemplazo
+    (ver es_reemplazo)
+    """
+    if len(clave) <= 3:
+        return 0
+    if len(clave) <= 7:
+        return 1
+    return 2
+
+
+def es_reemplazo(a, b):
+    """
+    Si a y b, a distancia 1, difieren en una letra reemplazada ("ropa" y
+    "sopa") y no en una transpuesta, agregada o faltante ("rpoa", "rop").
+    En las claves cortas un reemplazo suele ser otra palabra.
+    """
+    return len(a) == len(b) and sorted(a) != sorted(b)
+
+
+def borrados(clave, distancia):
+    """
+    Variantes de la clave con hasta `distancia` caracteres borrados
+    """
+    variantes = {clave}
+    nivel = {clave}
+    for _ in range(distancia):
+        nivel = {v[:i] + v[i + 1:] for v in nivel if len(v) > 1 for i in range(len(v))}
+        variantes |= nivel
+    return variantes
+
+
+def distancia(a, b, tope):
+    """
+    Distancia de edición con transposiciones (OSA), cortando apenas supera
+    tope. Solo calcula la franja de la matriz a `tope` de la diagonal.
+    """
+    if a == b:
+        return 0
+    n, m = len(a), len(b)
+    if abs(n - m) > tope:
+        return tope + 1
+    fuera = tope + 1
+    anterior2, anterior = None, [j if j <= tope else fuera for j in range(m + 1)]
+    for i in range(1, n + 1):
+        ca = a[i - 1]
+        desde, hasta = max(1, i - tope), min(m, i + tope)
+        actual = [fuera] * (m + 1)
+        actual[0] = i if i <= tope else fuera
+        minimo = actual[0]
+        for j in range(desde, hasta + 1):
+            cb = b[j - 1]
+            valor = anterior[j - 1] + (ca != cb)
+            if anterior[j] + 1 < valor:
+                valor = anterior[j] + 1
+            if actual[j - 1] + 1 < valor:
+                valor = actual[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and anterior2[j - 2] + 1 < valor:
+                valor = anterior2[j - 2] + 1
+            actual[j] = valor
+            if valor < minimo:
+                minimo = valor
+        if minimo > tope:
+            return fuera
+        anterior2, anterior = anterior, actual
+    return min(anterior[m], fuera)
+
+
+class CategoriaIndex:
+    """
+    Categorías de un usuario indexadas por clave normalizada y por sus
+    variantes con hasta dos borrados
+    """
+
+    def __init__(self):
+        self.categorias = {}  # clave -> categoría como se muestra
+        self.usos = {}        # clave -> cantidad de gastos (desempate)
+        self.variantes = {}   # variante -> claves que la generan
+
+    def __len__(self):
+        return len(self.categorias)
+
+    def add(self, categoria, usos=1, clave=None):
+        clave = clave or normalizar(categoria)
+        if clave in self.categorias:
+            self.usos[clave] += usos
+            return
+        self.categorias[clave] = categoria
+        self.usos[clave] = usos
+        for variante in borrados(clave, max_errores(clave)):
+            self.variantes.setdefault(variante, []).append(clave)
+
+    def lookup(self, texto):
+        """
+        Categoría conocida más parecida al texto, o None
+        """
+        clave = normalizar(texto)
+        categoria = self.categorias.get(clave)
+        if categoria is not None:
+            return categoria
+        tope = max_errores(clave)
+        if not tope:
+            return None
+
+        mejor = None
+        vistas = set()
+        for variante in borrados(clave, tope):
+            for candidata in self.variantes.get(variante, ()):
+                if candidata in vistas:
+                    continue
+                vistas.add(candidata)
+                limite = min(tope, max_errores(candidata))
+                d = distancia(clave, candidata, limite)
+                if d <= limite and not (limite == 1 and d == 1 and es_reemplazo(clave, candidata)):
+                    orden = (d, -self.usos[candidata], candidata)
+                    if mejor is None or orden < mejor:
+                        mejor = orden
+        return self.categorias[mejor[2]] if mejor else None
+
+
+class CategoriaResolver:
+    """
+    Índices de categorías por teléfono, en memoria del proceso.
+
+    El índice de un teléfono se arma la primera vez con sus categorías de
+    GastoMensual (ponderadas por cantidad de gastos) y los alias, se amplía
+    con cada categoría nueva que registra el usuario y se recarga cada
+    CATEGORIAS_INDEX_TTL segundos para ver las que crearon otros procesos.
+    Se guardan hasta CATEGORIAS_INDEX_MAX_PHONES teléfonos (LRU).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indices = OrderedDict()
+        self.loads = 0
+
+    def resolve(self, phone_number, categoria):
+        """
+        Categoría canónica para el texto recibido: la del usuario (o alias)
+        más parecida, o el texto mismo si no se parece a ninguna
+        """
+        if not settings.CATEGORIAS_FUZZY:
+            return categoria
+        return self._index(phone_number).lookup(categoria) or categoria
+
+    def learn(self, phone_number, categoria):
+        """
+        Agrega al índice una categoría recién registrada
+        """
+        with self._lock:
+            entrada = self._indices.get(phone_number)
+        if entrada is not None:
+            entrada[0].add(categoria)
+
+    def _index(self, phone_number):
+        now = time.monotonic()
+        with self._lock:
+            entrada = self._indices.get(phone_number)
+            if entrada is not None and now - entrada[1] < settings.CATEGORIAS_INDEX_TTL:
+                self._indices.move_to_end(phone_number)
+                return entrada[0]
+
+        index = self._load(phone_number)
+        with self._lock:
+            self._indices[phone_number] = (index, now)
+            self._indices.move_to_end(phone_number)
+            while len(self._indices) > settings.CATEGORIAS_INDEX_MAX_PHONES:
+                self._indices.popitem(last=False)
+            self.loads += 1
+        return index
+
+    def _load(self, phone_number):
+        index = CategoriaIndex()
+        # Las más usadas primero: si ya hay variantes registradas ("Comida" y
+        # "Comidas"), la que queda como canónica es la más usada
+        usos = dict(
+            GastoMensual.objects.filter(usuario_id=usuario_cache.id(phone_number)).order_by()
+            .values_list('categoria_id').annotate(usos=Sum('cantidad'))
+        )
+        nombres = categoria_cache.valores(usos)
+        for categoria_id in sorted(usos, key=lambda categoria_id: (-usos[categoria_id], nombres[categoria_id])):
+            index.add(nombres[categoria_id], usos[categoria_id])
+        for alias, categoria in settings.CATEGORIA_ALIASES.items():
+            clave = normalizar(alias)
+            if clave not in index.categorias:
+                index.add(categoria, 0, clave=clave)
+        return index
+
+    def reset(self):
+        """
+        Descarta los índices del proceso actual
+        """
+        with self._lock:
+            self._indices.clear()
+
+    def stats(self):
+        return {'telefonos': len(self._indices), 'cargas': self.loads}
+
+
+categoria_resolver = CategoriaResolver()
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting.startswith('CATEGORIA'):
+        categoria_resolver.reset()
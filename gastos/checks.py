@@ -0,0 +1,65 @@
+"""
+Chequeos de configuración del proyecto (``manage.py check`` y al arrancar)
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# Backends de cache que guardan los datos en la memoria de cada proceso
+CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def cache_de_replicas(app_configs, **kwargs):
+    """
+    Con réplicas, la marca de read-your-writes (gastos/replicas.py) se
+    guarda en el cache default: un cache por proceso no la comparte con los
+    demás workers y sus lecturas irían a una réplica atrasada
+    """
+    if settings.DATABASE_REPLICAS and settings.CACHES['default']['BACKEND'] in CACHES_POR_PROCESO:
+        return [Error(
+            'DATABASE_REPLICA_URLS necesita un cache default compartido entre procesos',
+            hint='Definir CACHE_BACKEND y CACHE_LOCATION (ej: django.core.cache.backends.redis.RedisCache)',
+            obj='CACHES',
+            id='gastos.E001',
+        )]
+    return []
+
+
+@register()
+def cache_de_resumenes(app_configs, **kwargs):
+    """
+    La invalidación de los resúmenes (gastos/cache.py) solo llega al cache
+    del proceso que registró el gasto: con varios workers y LocMemCache los
+    demás muestran resúmenes viejos hasta RESUMEN_CACHE_TIMEOUT
+    """
+    if settings.WEB_CONCURRENCY > 1 and settings.CACHES['resumenes']['BACKEND'].endswith('LocMemCache'):
+        return [Warning(
+            f'WEB_CONCURRENCY={settings.WEB_CONCURRENCY} con la cache de resúmenes en memoria de cada proceso',
+            hint='Definir RESUMEN_CACHE_BACKEND y RESUMEN_CACHE_LOCATION con un backend compartido (ej: Redis)',
+            obj='CACHES',
+            id='gastos.W001',
+        )]
+    return []
+
+
+@register()
+def cache_de_telefonos(app_configs, **kwargs):
+    """
+    La versión de los teléfonos autorizados (gastos/telefonos.py) se publica
+    en el cache default: con varios workers y un cache por proceso, una baja
+    solo se aplica en los demás a los AUTHORIZED_PHONES_MAX_AGE segundos
+    """
+    if settings.WEB_CONCURRENCY > 1 and settings.CACHES['default']['BACKEND'] in CACHES_POR_PROCESO:
+        return [Warning(
+            f'WEB_CONCURRENCY={settings.WEB_CONCURRENCY} con el cache default en memoria de cada proceso: '
+            f'los cambios de teléfonos autorizados tardan hasta {settings.AUTHORIZED_PHONES_MAX_AGE:g} s '
+            'en llegar a los demás workers',
+            hint='Definir CACHE_BACKEND y CACHE_LOCATION con un backend compartido (ej: Redis)',
+            obj='CACHES',
+            id='gastos.W002',
+        )]
+    return []
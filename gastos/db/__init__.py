@@ -0,0 +1,5 @@
+"""
+Backends de base de datos con el manejo de conexiones del proyecto (ver
+configurar_conexion en settings.py): perfil de PRAGMAs para SQLite y pool
+de conexiones de psycopg 3 para PostgreSQL
+"""
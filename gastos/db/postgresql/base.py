@@ -0,0 +1,87 @@
+"""
+PostgreSQL (psycopg 3) con un pool de conexiones por proceso (psycopg_pool).
+
+Cada request toma una conexión del pool y la devuelve al terminar
+(CONN_MAX_AGE = 0), así los hilos de las vistas async y los workers sync
+comparten un conjunto acotado de conexiones ya abiertas. Las opciones del
+pool vienen de OPTIONS['pool'] (ver DB_POOL_* en settings.py).
+"""
+
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.utils.asyncio import async_unsafe
+from psycopg import IsolationLevel
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Pools del proceso por (alias, base): las pruebas cambian NAME a la
+    # base de prueba sin cerrar el pool anterior
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        clave = (self.alias, self.settings_dict['NAME'])
+        pool = self._pools.get(clave)
+        if pool is not None:
+            return pool
+        if ConnectionPool is None:
+            raise ImproperlyConfigured('DB_POOL necesita psycopg_pool: pip install "psycopg[pool]"')
+        if self.settings_dict['CONN_MAX_AGE']:
+            raise ImproperlyConfigured('Con DB_POOL las conexiones vuelven al pool: usar CONN_MAX_AGE = 0')
+        with self._pools_lock:
+            if clave not in self._pools:
+                self._pools[clave] = ConnectionPool(
+                    kwargs={**self.get_connection_params(), 'autocommit': True},
+                    # Verifica cada conexión antes de entregarla
+                    check=ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                    open=False,
+                    name=self.alias,
+                    **self.settings_dict['OPTIONS'].get('pool', {}),
+                )
+            return self._pools[clave]
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        # Las conexiones para crear o borrar bases (NO_DB_ALIAS) no usan pool
+        if self.alias == NO_DB_ALIAS:
+            return super().get_new_connection(conn_params)
+        pool = self.pool
+        pool.open()
+        connection = pool.getconn()
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        if isolation_level is None:
+            self.isolation_level = IsolationLevel.READ_COMMITTED
+        else:
+            try:
+                self.isolation_level = IsolationLevel(isolation_level)
+            except ValueError:
+                pool.putconn(connection)
+                raise ImproperlyConfigured(f"Nivel de aislamiento inválido: {isolation_level}")
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.alias == NO_DB_ALIAS:
+            return super()._close()
+        # El pool descarta la conexión si quedó rota o en una transacción fallida
+        with self.wrap_database_errors:
+            self.connection._pool.putconn(self.connection)
+        self.connection = None
+
+    def pool_stats(self):
+        pool = self._pools.get((self.alias, self.settings_dict['NAME']))
+        return pool.get_stats() if pool is not None else {}
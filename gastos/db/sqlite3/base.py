@@ -0,0 +1,24 @@
+"""
+SQLite con el perfil de SQLITE_PRAGMAS aplicado en cada conexión nueva
+(WAL, busy_timeout, mmap) y transacciones que toman el lock de escritura
+al empezar
+"""
+
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for nombre, valor in settings.SQLITE_PRAGMAS.items():
+            conn.execute(f'PRAGMA {nombre} = {valor}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # Con BEGIN (DEFERRED) una transacción que lee y después escribe
+        # falla con "database is locked" apenas otra tiene el lock de
+        # escritura, sin esperar busy_timeout. BEGIN IMMEDIATE espera al
+        # principio y la transacción ya no puede quedar bloqueada a mitad.
+        self.cursor().execute('BEGIN IMMEDIATE')
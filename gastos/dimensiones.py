@@ -0,0 +1,138 @@
+"""
+Caché en memoria de las tablas de dimensión (Usuario y Categoria).
+
+Gasto guarda enteros (usuario_id, categoria_id) en lugar de repetir el
+teléfono y la categoría en cada fila. Las filas de dimensión no cambian ni
+se eliminan, así que cada proceso guarda los pares valor <-> id sin tener
+que invalidarlos.
+
+Lo único que hay que evitar es guardar un id de una fila creada en una
+transacción que después se revierte (SQLite puede reutilizar ese id para
+otro valor). Como dentro de una transacción no se sabe si una fila la
+creó la misma transacción, todo lo leído se agrega a la caché recién
+cuando se confirma (on_commit; fuera de una transacción, en el momento).
+Si se revierte no queda nada pendiente y esas filas se vuelven a
+consultar a la base.
+"""
+
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Categoria, Usuario
+
+
+class DimensionCache:
+    """
+    Pares valor <-> id de una tabla de dimensión, con hasta
+    DIMENSIONES_CACHE_MAX valores por tabla (se descartan los más viejos)
+    """
+
+    def __init__(self, model, campo):
+        self.model = model
+        self.campo = campo
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._valores = {}
+        self.hits = 0
+        self.misses = 0
+
+    def id(self, valor, crear=False):
+        """
+        Id de la fila con ese valor (o None); con crear=True la crea si no existe
+        """
+        pk = self._ids.get(valor)
+        if pk is not None:
+            self.hits += 1
+            return pk
+        return self.ids([valor], crear=crear).get(valor)
+
+    def ids(self, valores, crear=False):
+        """
+        Diccionario valor -> id con una consulta para los que no están en
+        caché (y un bulk_create para los nuevos si crear=True)
+        """
+        resultado, faltantes = {}, set()
+        for valor in valores:
+            pk = self._ids.get(valor)
+            if pk is None:
+                faltantes.add(valor)
+            else:
+                resultado[valor] = pk
+        self.hits += len(resultado)
+        if not faltantes:
+            return resultado
+
+        self.misses += len(faltantes)
+        encontrados = self._buscar(**{f'{self.campo}__in': faltantes})
+        nuevos = faltantes - encontrados.keys()
+        if crear and nuevos:
+            self.model.objects.bulk_create(
+                [self.model(**{self.campo: valor}) for valor in nuevos], ignore_conflicts=True
+            )
+            encontrados.update(self._buscar(**{f'{self.campo}__in': nuevos}))
+        self._guardar_al_confirmar(encontrados)
+        resultado.update(encontrados)
+        return resultado
+
+    def valor(self, pk):
+        """
+        Valor de la fila con ese id
+        """
+        valor = self._valores.get(pk)
+        if valor is not None:
+            self.hits += 1
+            return valor
+        return self.valores([pk]).get(pk)
+
+    def valores(self, pks):
+        """
+        Diccionario id -> valor con una consulta para los que no están en caché
+        """
+        resultado, faltantes = {}, set()
+        for pk in pks:
+            valor = self._valores.get(pk)
+            if valor is None:
+                faltantes.add(pk)
+            else:
+                resultado[pk] = valor
+        self.hits += len(resultado)
+        if faltantes:
+            self.misses += len(faltantes)
+            encontrados = self._buscar(pk__in=faltantes)
+            self._guardar_al_confirmar(encontrados)
+            resultado.update((pk, valor) for valor, pk in encontrados.items())
+        return resultado
+
+    def _buscar(self, **filtro):
+        return dict(self.model.objects.filter(**filtro).order_by().values_list(self.campo, 'pk'))
+
+    def _guardar_al_confirmar(self, pares):
+        if pares:
+            transaction.on_commit(partial(self._guardar, pares))
+
+    def _guardar(self, pares):
+        with self._lock:
+            for valor, pk in pares.items():
+                self._ids[valor] = pk
+                self._valores[pk] = valor
+            while len(self._ids) > settings.DIMENSIONES_CACHE_MAX:
+                valor = next(iter(self._ids))
+                self._valores.pop(self._ids.pop(valor), None)
+
+    def reset(self):
+        """
+        Descarta la caché del proceso actual
+        """
+        with self._lock:
+            self._ids.clear()
+            self._valores.clear()
+
+    def stats(self):
+        return {'valores': len(self._ids), 'hits': self.hits, 'misses': self.misses}
+
+
+usuario_cache = DimensionCache(Usuario, 'numero_telefono')
+categoria_cache = DimensionCache(Categoria, 'nombre')
@@ -0,0 +1,101 @@
+"""
+Exportación de gastos en CSV o NDJSON con memoria constante
+"""
+
+import csv
+import io
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .dimensiones import categoria_cache, usuario_cache
+
+FIELDS = ['id', 'numero_telefono', 'categoria', 'monto', 'fecha', 'mensaje_original']
+COLUMNS = ['id', 'usuario_id', 'categoria_id', 'monto', 'fecha', 'mensaje_original']
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _rows(gastos, chunk_size):
+    """
+    Filas (tuplas) leídas con un cursor del servidor, de a chunk_size, con
+    el teléfono y la categoría resueltos por la caché de dimensiones
+    """
+    filas = gastos.order_by('fecha', 'id').values_list(*COLUMNS).iterator(chunk_size=chunk_size)
+    while chunk := list(itertools.islice(filas, chunk_size)):
+        telefonos = usuario_cache.valores({fila[1] for fila in chunk})
+        categorias = categoria_cache.valores({fila[2] for fila in chunk})
+        for pk, usuario_id, categoria_id, *resto in chunk:
+            yield (pk, telefonos[usuario_id], categorias[categoria_id], *resto)
+
+
+def iter_csv(gastos, chunk_size=None):
+    """
+    Genera el CSV en bloques de texto (un bloque por chunk de filas)
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+
+    for i, (pk, telefono, categoria, monto, fecha, mensaje) in enumerate(_rows(gastos, chunk_size), 1):
+        writer.writerow([pk, telefono, categoria, monto, fecha.isoformat(), mensaje])
+        if i % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(gastos, chunk_size=None):
+    """
+    Genera un objeto JSON por línea, en bloques de chunk_size líneas
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    lines = []
+    for pk, telefono, categoria, monto, fecha, mensaje in _rows(gastos, chunk_size):
+        lines.append(json.dumps({
+            'id': pk,
+            'numero_telefono': telefono,
+            'categoria': categoria,
+            'monto': str(monto),
+            'fecha': fecha.isoformat(),
+            'mensaje_original': mensaje,
+        }, ensure_ascii=False))
+        if len(lines) == chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_export(gastos, formato, chunk_size=None):
+    """
+    Generador de la exportación en el formato pedido ('csv' o 'ndjson')
+    """
+    if formato == 'csv':
+        return iter_csv(gastos, chunk_size)
+    if formato == 'ndjson':
+        return iter_ndjson(gastos, chunk_size)
+    raise ValueError(f"Formato no soportado: {formato}")
+
+
+async def aiter_export(gastos, formato, chunk_size=None):
+    """
+    Versión async de iter_export para servir la exportación bajo ASGI sin
+    cargarla en memoria: cada bloque se genera en el hilo del request
+    (mismo cursor y conexión) y se entrega desde el event loop
+    """
+    iterator = iter_export(gastos, formato, chunk_size)
+    siguiente = sync_to_async(next)
+    fin = object()
+    while True:
+        chunk = await siguiente(iterator, fin)
+        if chunk is fin:
+            break
+        yield chunk
@@ -0,0 +1,181 @@
+"""
+Importación masiva de gastos históricos desde CSV o NDJSON
+"""
+
+import csv
+import json
+import logging
+import time
+from datetime import datetime
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .categorias import categoria_resolver
+from .dimensiones import categoria_cache, usuario_cache
+from .models import Categoria, Gasto, Importacion, Usuario
+from .services import GastoService, ResumenDiarioService
+
+logger = logging.getLogger('gastos')
+
+
+def read_records(path, formato=None):
+    """
+    Lee los registros del archivo como diccionarios, uno por vez
+    """
+    formato = formato or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, encoding='utf-8', newline='') as f:
+        if formato == 'csv':
+            yield from csv.DictReader(f)
+        elif formato == 'ndjson':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Formato no soportado: {formato}")
+
+
+def parse_fecha(value):
+    """
+    Fecha del registro: ISO 8601 con hora o solo el día (hora local)
+    """
+    if not value:
+        return timezone.now()
+    fecha = parse_datetime(value)
+    if fecha is None:
+        dia = parse_date(value)
+        if dia is None:
+            raise ValueError(f"Fecha inválida: {value}")
+        fecha = datetime.combine(dia, datetime.min.time())
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def build_gasto(record, default_phone=None):
+    """
+    Valida un registro con las mismas reglas que los mensajes de WhatsApp
+    (GastoService.parse_gasto_message) y arma el Gasto sin guardarlo.
+    Acepta 'categoria' + 'monto' o un 'mensaje' como "comida 200"; la
+    categoría se lleva a la que ya usa el teléfono ("comidas" -> "Comida").
+
+    Retorna (teléfono, categoría, gasto): los ids de Usuario y Categoria se
+    asignan en la transacción del lote (GastoImporter._guardar_lote), así
+    un lote que falla no deja filas de dimensión creadas.
+    """
+    phone_number = (record.get('numero_telefono') or default_phone or '').strip()
+    if not phone_number:
+        raise ValueError("Falta numero_telefono")
+    validar_largo(Usuario, 'numero_telefono', phone_number)
+
+    mensaje = record.get('mensaje') or f"{record.get('categoria', '')} {record.get('monto', '')}"
+    categoria, monto = GastoService.parse_gasto_message(str(mensaje))
+    if not categoria or not monto:
+        raise ValueError(f"Gasto inválido: {mensaje!r}")
+    validar_largo(Categoria, 'nombre', categoria)
+    campo = Gasto._meta.get_field('monto')
+    if abs(monto) >= 10 ** (campo.max_digits - campo.decimal_places):
+        raise ValueError(f"Monto fuera de rango: {monto}")
+    categoria = categoria_resolver.resolve(phone_number, categoria)
+
+    gasto = Gasto(
+        monto=monto,
+        fecha=parse_fecha(record.get('fecha')),
+        mensaje_original=record.get('mensaje_original') or mensaje.strip(),
+    )
+    return phone_number, categoria, gasto
+
+
+def validar_largo(model, campo, valor):
+    """
+    Rechaza con ValueError lo que no entra en la columna (en PostgreSQL
+    sería un DataError que aborta la transacción del lote)
+    """
+    max_length = model._meta.get_field(campo).max_length
+    if len(valor) > max_length:
+        raise ValueError(f"{campo} supera los {max_length} caracteres: {valor[:20]!r}...")
+
+
+class GastoImporter:
+    """
+    Importa registros en lotes con bulk_create, una transacción por lote.
+
+    El progreso se guarda en Importacion dentro de la misma transacción,
+    así que si el proceso se corta se retoma desde el último lote
+    confirmado sin duplicar gastos.
+    """
+
+    def __init__(self, clave, batch_size=None, default_phone=None, on_batch=None):
+        self.clave = clave
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.default_phone = default_phone
+        self.on_batch = on_batch
+        self.errores = []
+
+    def run(self, records, restart=False):
+        importacion, _ = Importacion.objects.get_or_create(clave=self.clave)
+        if restart:
+            importacion.filas_procesadas = importacion.importados = importacion.rechazados = 0
+            importacion.completada = False
+            importacion.save()
+
+        saltear = importacion.filas_procesadas
+        lote, procesadas = [], 0
+        t0 = time.perf_counter()
+
+        for numero, record in enumerate(records, 1):
+            if numero <= saltear:
+                continue
+            lote.append((numero, record))
+            if len(lote) == self.batch_size:
+                procesadas += self._guardar_lote(importacion, lote)
+                self._report(importacion, procesadas, t0)
+                lote = []
+
+        if lote:
+            procesadas += self._guardar_lote(importacion, lote)
+            self._report(importacion, procesadas, t0)
+
+        importacion.completada = True
+        importacion.save(update_fields=['completada', 'actualizado'])
+        return importacion
+
+    def _report(self, importacion, procesadas, t0):
+        if self.on_batch:
+            self.on_batch(importacion, procesadas / (time.perf_counter() - t0))
+
+    def _guardar_lote(self, importacion, lote):
+        registros = []
+        rechazados = 0
+        for numero, record in lote:
+            try:
+                registros.append(build_gasto(record, self.default_phone))
+            except (ValueError, TypeError) as e:
+                rechazados += 1
+                self.errores.append((numero, str(e)))
+                logger.warning(f"Registro {numero} rechazado: {e}")
+
+        with transaction.atomic():
+            usuarios = usuario_cache.ids({phone for phone, _, _ in registros}, crear=True)
+            categorias = categoria_cache.ids({categoria for _, categoria, _ in registros}, crear=True)
+            gastos = []
+            for phone_number, categoria, gasto in registros:
+                gasto.usuario_id = usuarios[phone_number]
+                gasto.categoria_id = categorias[categoria]
+                gastos.append(gasto)
+            Gasto.objects.bulk_create(gastos, batch_size=self.batch_size)
+            ResumenDiarioService.registrar_lote(gastos)
+            importacion.filas_procesadas = lote[-1][0]
+            importacion.importados += len(gastos)
+            importacion.rechazados += rechazados
+            importacion.save(update_fields=['filas_procesadas', 'importados', 'rechazados', 'actualizado'])
+            # Las categorías nuevas del lote se usan para resolver los siguientes
+            transaction.on_commit(partial(self._aprender, gastos))
+        return len(lote)
+
+    def _aprender(self, gastos):
+        for gasto in gastos:
+            categoria_resolver.learn(gasto.numero_telefono, gasto.nombre_categoria)
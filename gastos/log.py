@@ -0,0 +1,209 @@
+"""
+Logging estructurado y sin bloqueo para el camino del webhook.
+
+Los handlers encolan el registro y un hilo aparte lo formatea y escribe,
+así el request solo paga crear el registro y ponerlo en la cola. El
+formateo (JSON, redacción de teléfonos) corre en ese hilo.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+_TELEFONO = re.compile(r'(?<!\w)\+?\d[\d\s\-()]{6,}(\d{4})\b')
+
+# Handlers creados, para exponer sus contadores en /health/
+queued_handlers = []
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+def redact_phones(text):
+    """
+    Oculta los números de teléfono dejando los últimos 4 dígitos
+    """
+    return _TELEFONO.sub(r'***\1', text)
+
+
+def _redact(value):
+    if isinstance(value, str):
+        return redact_phones(value)
+    if isinstance(value, dict):
+        return {k: _redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redact(v) for v in value]
+    return value
+
+
+def sampled(rate=None):
+    """
+    Decide si se registra un log de payload según LOG_PAYLOAD_SAMPLE_RATE
+    """
+    rate = settings.LOG_PAYLOAD_SAMPLE_RATE if rate is None else rate
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def log_payload(logger, message, **datos):
+    """
+    Log de detalle (headers, payloads) solo para una fracción de los
+    requests; el resto no arma ni formatea nada
+    """
+    if sampled() and logger.isEnabledFor(logging.INFO):
+        logger.info(message, extra={'datos': datos})
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Agrega el request ID del contexto actual a cada registro
+    """
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Un objeto JSON por línea, con los teléfonos redactados
+    """
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, dt_timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        datos = getattr(record, 'datos', None)
+        if datos:
+            data['datos'] = datos
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        if settings.LOG_REDACT_PHONES:
+            data = _redact(data)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RedactingFormatter(logging.Formatter):
+    """
+    Formatter de texto con los teléfonos redactados
+    """
+
+    def format(self, record):
+        text = super().format(record)
+        return redact_phones(text) if settings.LOG_REDACT_PHONES else text
+
+
+class QueuedHandler(QueueHandler):
+    """
+    Handler que encola los registros para un FileHandler (si se indica
+    filename) o StreamHandler atendido por un QueueListener.
+
+    La cola es acotada: si se llena, el registro se descarta y se cuenta
+    en lugar de bloquear el request. El hilo del listener no sobrevive a un
+    fork (gunicorn --preload): el proceso hijo arranca otro con una cola
+    nueva (ver reiniciar_listener).
+    """
+
+    def __init__(self, filename=None, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        if filename:
+            self.target = logging.FileHandler(filename, encoding='utf-8')
+        else:
+            self.target = logging.StreamHandler()
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self._lock_stats = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        queued_handlers.append(self)
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        # El formato se aplica en el hilo del listener
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Se resuelve el mensaje acá (los argumentos pueden cambiar después)
+        # pero el formateo final queda para el listener. Se copia porque el
+        # mismo registro va a otros handlers.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock_stats:
+                self.dropped += 1
+            return
+        with self._lock_stats:
+            self.enqueued += 1
+
+    def flush(self):
+        """
+        Espera a que el listener escriba lo encolado
+        """
+        if self.listener._thread is not None:
+            self.queue.join()
+        self.target.flush()
+
+    def reiniciar_listener(self):
+        """
+        Cola y listener nuevos en el proceso hijo después de un fork: lo
+        encolado antes del fork lo escribe el padre
+        """
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self._lock_stats = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        if self in queued_handlers:
+            queued_handlers.remove(self)
+        super().close()
+
+    def stats(self):
+        return {
+            'destino': getattr(self.target, 'baseFilename', 'stream'),
+            'encolados': self.enqueued,
+            'descartados': self.dropped,
+            'en_cola': self.queue.qsize(),
+        }
+
+
+def log_stats():
+    return [handler.stats() for handler in queued_handlers]
+
+
+def _reiniciar_despues_del_fork():
+    for handler in queued_handlers:
+        handler.reiniciar_listener()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_despues_del_fork)
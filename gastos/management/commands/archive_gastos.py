@@ -0,0 +1,57 @@
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from gastos.archivo import archivo
+from gastos.models import Gasto
+
+
+class Command(BaseCommand):
+    """
+    Comando que mueve los gastos viejos de Gasto a GastoArchivado en tandas
+    """
+    help = 'Archiva los gastos de más de ARCHIVO_DIAS días (se siguen viendo en resúmenes y listados)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.ARCHIVO_DIAS,
+                            help='Archivar los gastos anteriores a hace N días')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Gastos movidos por transacción')
+        parser.add_argument('--espera', type=float, default=None,
+                            help='Segundos entre publicar el corte y mover gastos '
+                                 '(por defecto, 2 x ARCHIVO_CORTE_REFRESH_SECONDS)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solo informar cuántos gastos se archivarían')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1:
+            raise CommandError('--dias debe ser al menos 1')
+        # El corte cae al inicio de un día local
+        dia = timezone.localdate() - timedelta(days=options['dias'])
+        corte = timezone.make_aware(datetime.combine(dia, datetime.min.time()))
+        pendientes = Gasto.objects.filter(fecha__lt=corte).count()
+        self.stdout.write(f"🗄️ Corte: {corte:%d/%m/%Y} | {pendientes} gastos para archivar")
+        if options['dry_run'] or not pendientes:
+            return
+
+        anterior = archivo.corte()
+        corte = archivo.publicar(corte)
+        if anterior is None or corte > anterior:
+            # Los demás procesos tienen que ver el corte nuevo antes de que
+            # falten gastos en Gasto
+            espera = options['espera']
+            if espera is None:
+                espera = 2 * settings.ARCHIVO_CORTE_REFRESH_SECONDS
+            self.stdout.write(f"⏳ Esperando {espera:.0f} s a que los procesos lean el corte")
+            time.sleep(espera)
+
+        movidos = 0
+        t0 = time.perf_counter()
+        for cantidad in archivo.mover(corte, options['chunk_size']):
+            movidos += cantidad
+            self.stdout.write(
+                f"📦 {movidos} gastos archivados | {movidos / (time.perf_counter() - t0):.0f} gastos/s"
+            )
+        self.stdout.write(self.style.SUCCESS(f"✅ {movidos} gastos archivados"))
@@ -0,0 +1,57 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from gastos.benchmarks import AppServer, TwilioStandIn, latency_stats, run_load
+
+
+class Command(BaseCommand):
+    """
+    Compara el webhook servido como en el Procfile (gunicorn WSGI, workers
+    sync) contra gunicorn con workers de uvicorn y las vistas async
+    """
+    help = 'Prueba de carga del webhook: WSGI (Procfile) vs ASGI con vistas async'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='Webhooks a enviar por servidor')
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='Webhooks en vuelo al mismo tiempo')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Workers de gunicorn (el Procfile usa el default: 1)')
+        parser.add_argument('--mode', default='rest', choices=['twiml', 'outbox', 'rest'],
+                            help='Modo de respuesta del webhook')
+        parser.add_argument('--twilio-latency', type=float, default=150,
+                            help='Latencia simulada de la API de Twilio en milisegundos')
+        parser.add_argument('--servers', nargs='+', default=['wsgi', 'asgi'], choices=['wsgi', 'asgi'])
+
+    def handle(self, *args, **options):
+        phone = '+5490000000000'
+        payloads = [
+            {'From': f'whatsapp:{phone}', 'Body': f'comida {i + 1}', 'MessageSid': f'SMBENCH{i:026d}'}
+            for i in range(options['requests'])
+        ]
+        self.stdout.write(
+            f"{options['requests']} webhooks, {options['concurrency']} en vuelo, "
+            f"modo {options['mode']}, Twilio {options['twilio_latency']:.0f} ms, "
+            f"{options['workers']} worker(s)"
+        )
+
+        with TwilioStandIn(latency=options['twilio_latency'] / 1000) as standin:
+            env = standin.environ(AUTHORIZED_PHONES=phone, WHATSAPP_REPLY_MODE=options['mode'],
+                                  LOG_PAYLOAD_SAMPLE_RATE=0)
+            for server in options['servers']:
+                with AppServer(asgi=server == 'asgi', workers=options['workers'], env=env) as app:
+                    results, elapsed = run_load(
+                        f'{app.base_url}/webhook/whatsapp/', payloads, options['concurrency']
+                    )
+                latencies = [r['latencia'] for r in results if r['ok']]
+                errors = [r['error'] for r in results if not r['ok']]
+                stats = latency_stats(latencies)
+                self.stdout.write(
+                    f"{server:>5}: {len(latencies) / elapsed:7.1f} req/s | p50 {stats['p50_ms']} ms | "
+                    f"p95 {stats['p95_ms']} ms | p99 {stats['p99_ms']} ms | errores {len(errors)}"
+                )
+                for error, cantidad in Counter(errors).most_common(3):
+                    self.stdout.write(f"       {error}: {cantidad}")
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
@@ -0,0 +1,91 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from gastos.categorias import CategoriaIndex, distancia, max_errores, normalizar
+
+
+def _palabra(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12))).capitalize()
+
+
+def _typo(rng, palabra):
+    """
+    Un error al azar: borrado, inserción, sustitución o transposición
+    """
+    i = rng.randrange(len(palabra) - 1)
+    letra = rng.choice(string.ascii_lowercase)
+    return rng.choice([
+        palabra[:i] + palabra[i + 1:],
+        palabra[:i] + letra + palabra[i:],
+        palabra[:i] + letra + palabra[i + 1:],
+        palabra[:i] + palabra[i + 1] + palabra[i] + palabra[i + 2:],
+    ])
+
+
+def _lineal(categorias, texto):
+    """
+    Búsqueda sin índice: distancia contra cada categoría
+    """
+    clave = normalizar(texto)
+    tope = max_errores(clave)
+    mejor = None
+    for categoria in categorias:
+        candidata = normalizar(categoria)
+        d = distancia(clave, candidata, tope)
+        if d <= tope and (mejor is None or d < mejor[0]):
+            mejor = (d, categoria)
+    return mejor[1] if mejor else None
+
+
+class Command(BaseCommand):
+    """
+    Mide las búsquedas por segundo del índice de categorías con miles de
+    categorías sintéticas, contra recorrer todas con la distancia de edición
+    """
+    help = 'Benchmark de la canonicalización de categorías'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categorias', type=int, default=5000, help='Categorías indexadas')
+        parser.add_argument('--lookups', type=int, default=20000, help='Búsquedas medidas')
+        parser.add_argument('--lineal', type=int, default=200, help='Búsquedas medidas sin índice')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        categorias = list({_palabra(rng) for _ in range(options['categorias'])})
+
+        t0 = time.perf_counter()
+        index = CategoriaIndex()
+        for categoria in categorias:
+            index.add(categoria, rng.randint(1, 50))
+        armado = time.perf_counter() - t0
+        self.stdout.write(
+            f"{len(index)} categorías indexadas en {armado * 1000:.0f} ms "
+            f"({len(index.variantes)} variantes)"
+        )
+
+        # Mitad exactas (con otra capitalización), mitad con un error
+        consultas = [
+            rng.choice(categorias).upper() if n % 2 else _typo(rng, rng.choice(categorias))
+            for n in range(options['lookups'])
+        ]
+        t0 = time.perf_counter()
+        encontradas = sum(1 for texto in consultas if index.lookup(texto))
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(
+            f"   índice: {len(consultas) / elapsed:10.0f} búsquedas/s | "
+            f"{elapsed / len(consultas) * 1e6:.1f} µs por búsqueda | {encontradas} resueltas"
+        )
+
+        muestra = consultas[:options['lineal']]
+        t0 = time.perf_counter()
+        for texto in muestra:
+            _lineal(categorias, texto)
+        lineal = time.perf_counter() - t0
+        self.stdout.write(
+            f"   lineal: {len(muestra) / lineal:10.0f} búsquedas/s | "
+            f"{lineal / len(muestra) * 1e6:.1f} µs por búsqueda"
+        )
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
@@ -0,0 +1,156 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections, transaction
+from django.db.backends.signals import connection_created
+from django.test import Client
+from gastos.benchmarks import latency_stats
+
+ALIAS = 'bench_conexiones'
+
+MOTORES_BASE = {
+    'gastos.db.sqlite3': 'django.db.backends.sqlite3',
+    'gastos.db.postgresql': 'django.db.backends.postgresql',
+}
+
+
+def modos(config):
+    """
+    Configuraciones de conexión a comparar: la anterior (una conexión por
+    request con el backend de Django) y las del proyecto
+    """
+    base = {**config, 'ENGINE': MOTORES_BASE.get(config['ENGINE'], config['ENGINE']), 'CONN_MAX_AGE': 0}
+    base['OPTIONS'] = {k: v for k, v in config.get('OPTIONS', {}).items() if k != 'pool'}
+    resultado = {'sin persistencia': base}
+    if base['ENGINE'] == 'django.db.backends.sqlite3':
+        perfil = {**base, 'ENGINE': 'gastos.db.sqlite3'}
+        resultado['sin persistencia + PRAGMAs'] = perfil
+        resultado['persistente + PRAGMAs'] = {**perfil, 'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True}
+    else:
+        resultado['persistente'] = {**base, 'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True}
+        resultado['pool'] = {
+            **base, 'ENGINE': 'gastos.db.postgresql',
+            'OPTIONS': {**base['OPTIONS'], 'pool': settings.DB_POOL_OPTIONS},
+        }
+    return resultado
+
+
+class Command(BaseCommand):
+    """
+    Costo de conexión por request con cada configuración de la base
+    (sin persistencia, persistente, pool) y, en SQLite, escrituras
+    concurrentes con y sin el perfil de PRAGMAs
+    """
+    help = 'Benchmark del manejo de conexiones a la base'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests por configuración')
+        parser.add_argument('--url', type=str, default='/api/gastos/?page_size=5', help='Endpoint medido')
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos escribiendo en SQLite')
+        parser.add_argument('--escrituras', type=int, default=100, help='Transacciones por hilo')
+
+    def handle(self, *args, **options):
+        original = connections.settings['default']
+        abiertas = []
+
+        def contar(connection, **kwargs):
+            if connection.alias == 'default':
+                abiertas.append(connection)
+
+        connection_created.connect(contar)
+        self.stdout.write(f"{options['requests']} requests a {options['url']} por configuración")
+        try:
+            for nombre, config in modos(original).items():
+                self._usar(config)
+                abiertas.clear()
+                stats = self._requests(options)
+                self.stdout.write(
+                    f"  {nombre:<28} media {stats['mean_ms']:6.2f} ms | p95 {stats['p95_ms']:6.2f} ms | "
+                    f"{len(abiertas)} conexiones abiertas"
+                )
+        finally:
+            connection_created.disconnect(contar)
+            self._usar(original)
+
+        if original['ENGINE'] in ('gastos.db.sqlite3', 'django.db.backends.sqlite3'):
+            self._concurrencia(options)
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
+
+    def _usar(self, config):
+        connections['default'].close()
+        del connections['default']
+        connections.settings['default'] = config
+
+    def _requests(self, options):
+        client = Client(HTTP_HOST='localhost')
+        client.get(options['url'])
+        latencias = []
+        for _ in range(options['requests']):
+            t0 = time.perf_counter()
+            # El cliente de prueba no cierra conexiones con las señales de
+            # request; los handlers WSGI/ASGI sí, al empezar y al terminar
+            close_old_connections()
+            response = client.get(options['url'])
+            close_old_connections()
+            latencias.append(time.perf_counter() - t0)
+        if response.status_code != 200:
+            self.stderr.write(f"⚠️ {options['url']} respondió {response.status_code}")
+        return latency_stats(latencias)
+
+    def _concurrencia(self, options):
+        self.stdout.write(
+            f"SQLite: {options['hilos']} hilos x {options['escrituras']} transacciones (leer y después escribir)"
+        )
+        for nombre, engine in (('sin perfil', 'django.db.backends.sqlite3'), ('con perfil', 'gastos.db.sqlite3')):
+            with tempfile.TemporaryDirectory() as directorio:
+                connections.settings[ALIAS] = {
+                    **connections.settings['default'],
+                    'ENGINE': engine,
+                    'NAME': os.path.join(directorio, 'bench.sqlite3'),
+                    'OPTIONS': {},
+                    'CONN_MAX_AGE': 0,
+                }
+                try:
+                    ok, errores, elapsed = self._escribir(options)
+                finally:
+                    connections[ALIAS].close()
+                    del connections[ALIAS]
+                    del connections.settings[ALIAS]
+            self.stdout.write(
+                f"  {nombre:<12} {ok / elapsed:8.0f} transacciones/s | {errores} 'database is locked'"
+            )
+
+    def _escribir(self, options):
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute('CREATE TABLE bench (id INTEGER PRIMARY KEY, total INTEGER)')
+        contadores = {'ok': 0, 'errores': 0}
+        lock = threading.Lock()
+
+        def trabajar():
+            try:
+                for _ in range(options['escrituras']):
+                    try:
+                        # Como el webhook: lee (idempotencia, totales) y después inserta
+                        with transaction.atomic(using=ALIAS), connections[ALIAS].cursor() as cursor:
+                            cursor.execute('SELECT COUNT(*) FROM bench')
+                            total = cursor.fetchone()[0]
+                            cursor.execute('INSERT INTO bench (total) VALUES (%s)', [total])
+                        resultado = 'ok'
+                    except OperationalError:
+                        resultado = 'errores'
+                    with lock:
+                        contadores[resultado] += 1
+            finally:
+                connections[ALIAS].close()
+
+        hilos = [threading.Thread(target=trabajar) for _ in range(options['hilos'])]
+        t0 = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return contadores['ok'], contadores['errores'], time.perf_counter() - t0
@@ -0,0 +1,157 @@
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+ALIAS = 'bench_dimensiones'
+CATEGORIAS = [
+    'Comida', 'Transporte', 'Supermercado', 'Netflix', 'Farmacia', 'Nafta', 'Ropa', 'Regalos',
+    'Alquiler', 'Expensas', 'Gimnasio', 'Veterinaria', 'Electricidad', 'Internet', 'Peluqueria',
+    'Delivery', 'Cafe', 'Libros', 'Cine', 'Estacionamiento',
+]
+
+
+# Tablas con teléfono y categoría (texto antes de 0010-0015)
+TABLAS = ['gastos_gasto', 'gastos_gastodiario', 'gastos_gastomensual', 'gastos_presupuesto']
+
+
+def tamanos(cursor, tablas):
+    """
+    Bytes ocupados por cada tabla y sus índices (SQLite, vía dbstat)
+    """
+    marcadores = ', '.join(['%s'] * len(tablas))
+    cursor.execute(
+        f"SELECT m.tbl_name, m.name, SUM(s.pgsize) FROM sqlite_master m JOIN dbstat s ON s.name = m.name "
+        f"WHERE m.tbl_name IN ({marcadores}) GROUP BY m.tbl_name, m.name ORDER BY m.tbl_name, m.type DESC, m.name",
+        tablas
+    )
+    return cursor.fetchall()
+
+
+def mejor_tiempo(cursor, sql, params, repeat):
+    tiempos = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        tiempos.append(time.perf_counter() - t0)
+    return min(tiempos)
+
+
+class Command(BaseCommand):
+    """
+    Tamaño de las tablas de gastos, totales y presupuestos y sus índices
+    antes y después de normalizar teléfono y categoría (migraciones 0010 a
+    0015), sobre una base SQLite temporal con gastos sintéticos
+    """
+    help = 'Tamaño de tablas e índices con teléfono y categoría como texto vs claves enteras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200_000, help='Gastos sintéticos a generar')
+        parser.add_argument('--phones', type=int, default=50, help='Teléfonos entre los que se reparten')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones del resumen agrupado')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directorio:
+            connections.settings[ALIAS] = {
+                **connections.settings['default'],
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(directorio, 'bench.sqlite3'),
+                'OPTIONS': {},
+                'CONN_MAX_AGE': 0,
+            }
+            try:
+                self._run(options)
+            finally:
+                connections[ALIAS].close()
+                del connections[ALIAS]
+                del connections.settings[ALIAS]
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
+
+    def _run(self, options):
+        call_command('migrate', 'gastos', '0009', database=ALIAS, verbosity=0)
+        phones = [f'+549351{i:07d}' for i in range(options['phones'])]
+        connection = connections[ALIAS]
+
+        with transaction.atomic(using=ALIAS), connection.cursor() as cursor:
+            self._generar(cursor, phones, options['rows'])
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+            antes = tamanos(cursor, TABLAS)
+            resumen_antes = mejor_tiempo(
+                cursor,
+                'SELECT categoria, SUM(monto), COUNT(*) FROM gastos_gasto WHERE numero_telefono = %s GROUP BY categoria',
+                [phones[0]], options['repeat']
+            )
+
+        t0 = time.perf_counter()
+        call_command('migrate', 'gastos', database=ALIAS, verbosity=0)
+        migracion = time.perf_counter() - t0
+
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+            despues = tamanos(cursor, TABLAS + ['gastos_usuario', 'gastos_categoria'])
+            cursor.execute('SELECT id FROM gastos_usuario WHERE numero_telefono = %s', [phones[0]])
+            usuario_id = cursor.fetchone()[0]
+            resumen_despues = mejor_tiempo(
+                cursor,
+                'SELECT categoria_id, SUM(monto), COUNT(*) FROM gastos_gasto WHERE usuario_id = %s GROUP BY categoria_id',
+                [usuario_id], options['repeat']
+            )
+
+        self.stdout.write(f"{options['rows']} gastos, {len(phones)} teléfonos, {len(CATEGORIAS)} categorías")
+        self.stdout.write(f"Migraciones 0010-0015: {migracion:.1f} s")
+        for titulo, filas in (('Antes (texto)', antes), ('Después (claves enteras)', despues)):
+            self.stdout.write(f"{titulo}:")
+            for tabla, nombre, bytes_ in filas:
+                tipo = 'tabla' if nombre == tabla else 'índice'
+                self.stdout.write(f"  {nombre:<40} {tipo:<7} {bytes_ / 1024 / 1024:8.2f} MB")
+            self.stdout.write(f"  {'total':<48} {sum(f[2] for f in filas) / 1024 / 1024:8.2f} MB")
+        cambio = (sum(f[2] for f in despues) - sum(f[2] for f in antes)) / sum(f[2] for f in antes) * 100
+        self.stdout.write(f"Cambio total: {cambio:+.1f}%")
+        self.stdout.write(
+            f"Resumen agrupado de un teléfono: {resumen_antes * 1000:.1f} ms -> {resumen_despues * 1000:.1f} ms "
+            f"(mejor de {options['repeat']})"
+        )
+
+    def _generar(self, cursor, phones, rows, batch_size=10_000):
+        self._generar_gastos(cursor, phones, rows, batch_size)
+        # Totales como los deja rebuild_resumen_diario y un presupuesto por
+        # teléfono para la mitad de las categorías
+        cursor.execute(
+            'INSERT INTO gastos_gastodiario (numero_telefono, dia, categoria, total, cantidad) '
+            'SELECT numero_telefono, date(fecha), categoria, SUM(monto), COUNT(*) FROM gastos_gasto GROUP BY 1, 2, 3'
+        )
+        cursor.execute(
+            "INSERT INTO gastos_gastomensual (numero_telefono, mes, categoria, total, cantidad) "
+            "SELECT numero_telefono, strftime('%%Y-%%m-01', dia), categoria, SUM(total), SUM(cantidad) "
+            "FROM gastos_gastodiario GROUP BY 1, 2, 3"
+        )
+        cursor.executemany(
+            "INSERT INTO gastos_presupuesto (numero_telefono, categoria, monto, actualizado) "
+            "VALUES (%s, %s, %s, '2024-01-01 00:00:00')",
+            [(phone, categoria, '50000.00') for phone in phones for categoria in CATEGORIAS[::2]]
+        )
+
+    def _generar_gastos(self, cursor, phones, rows, batch_size):
+        rng = random.Random(42)
+        base = datetime(2024, 1, 1)
+        for offset in range(0, rows, batch_size):
+            cursor.executemany(
+                'INSERT INTO gastos_gasto (numero_telefono, categoria, monto, fecha, mensaje_original) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [
+                    (
+                        rng.choice(phones), categoria, f'{rng.randint(100, 500_000) / 100:.2f}',
+                        (base + timedelta(seconds=rng.randint(0, 365 * 86400))).isoformat(sep=' '),
+                        f'{categoria.lower()} {rng.randint(1, 5000)}',
+                    )
+                    for categoria in (rng.choice(CATEGORIAS) for _ in range(min(batch_size, rows - offset)))
+                ]
+            )
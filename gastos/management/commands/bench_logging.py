@@ -0,0 +1,98 @@
+import logging
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from gastos.benchmarks import latency_stats
+from gastos.log import JsonFormatter, QueuedHandler, RequestIdFilter, log_payload
+
+HEADERS = {
+    'Host': 'gastos.example.com',
+    'User-Agent': 'TwilioProxy/1.1',
+    'Content-Type': 'application/x-www-form-urlencoded',
+    'X-Twilio-Signature': 'q1w2e3r4t5y6u7i8o9p0',
+    'I-Twilio-Idempotency-Token': '4c0f3f9e-7f5e-4a8e-9b1e-2d8c1f0a7b6c',
+}
+POST = {
+    'From': ['whatsapp:+5493531234567'],
+    'To': ['whatsapp:+14155238886'],
+    'Body': ['comida 200'],
+    'MessageSid': ['SM0123456789abcdef0123456789abcdef'],
+    'AccountSid': ['AC0123456789abcdef0123456789abcdef'],
+    'NumMedia': ['0'],
+}
+
+
+def webhook_anterior(logger):
+    """
+    Logs que hacía TwilioWebhookView.post en cada request
+    """
+    logger.info("=== WEBHOOK RECIBIDO ===")
+    logger.info("Método: POST")
+    logger.info(f"Headers: {dict(HEADERS)}")
+    logger.info(f"POST data: {dict(POST)}")
+    logger.info("Número origen: +5493531234567")
+    logger.info("Mensaje: comida 200")
+    logger.info("Respuesta generada: Gasto registrado: Comida: $200 - 17/10/2026 12:00")
+
+
+def webhook_actual(logger):
+    """
+    Logs actuales: una línea por request y el payload solo si sale sorteado
+    """
+    log_payload(logger, "Payload del webhook", headers=HEADERS, post=POST)
+    logger.info("Webhook recibido", extra={'datos': {'from': '+5493531234567', 'modo': 'twiml'}})
+
+
+class Command(BaseCommand):
+    """
+    Mide el costo de logging en el hilo del request: FileHandler sincrónico
+    con los logs anteriores del webhook contra la cola con JSON y muestreo
+    """
+    help = 'Benchmark del costo de logging por request del webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000,
+                            help='Requests simulados por variante')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        with tempfile.TemporaryDirectory() as tmp:
+            sincronico = logging.FileHandler(os.path.join(tmp, 'sync.log'))
+            sincronico.setFormatter(logging.Formatter(
+                '{levelname} {asctime} {module} {process:d} {thread:d} {message}', style='{'
+            ))
+            encolado = QueuedHandler(filename=os.path.join(tmp, 'queued.log'), queue_size=total * 2)
+            encolado.addFilter(RequestIdFilter())
+            encolado.setFormatter(JsonFormatter())
+
+            variants = (
+                ('anterior', sincronico, webhook_anterior),
+                ('cola', encolado, webhook_actual),
+            )
+            for name, handler, log_request in variants:
+                logger = logging.getLogger(f'bench_logging.{name}')
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                logger.addHandler(handler)
+
+                latencies = []
+                for _ in range(total):
+                    t0 = time.perf_counter()
+                    log_request(logger)
+                    latencies.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                handler.flush()
+                drain = time.perf_counter() - t0
+
+                stats = latency_stats(latencies)
+                self.stdout.write(
+                    f"{name:>8}: media {stats['mean_ms'] * 1000:.1f} µs | p50 {stats['p50_ms'] * 1000:.1f} µs | "
+                    f"p99 {stats['p99_ms'] * 1000:.1f} µs | max {stats['max_ms'] * 1000:.1f} µs "
+                    f"| vaciado de la cola {drain * 1000:.0f} ms"
+                )
+                logger.removeHandler(handler)
+                handler.close()
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
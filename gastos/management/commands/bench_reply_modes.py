@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from gastos.benchmarks import TwilioStandIn, latency_stats, rollback
+
+
+class Command(BaseCommand):
+    """
+    Compara la latencia del webhook según el modo de respuesta
+    """
+    help = 'Benchmark del webhook en modo TwiML, outbox y REST contra un stand-in local de Twilio'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Webhooks a enviar por modo')
+        parser.add_argument('--twilio-latency', type=float, default=150,
+                            help='Latencia simulada de la API de Twilio en milisegundos')
+        parser.add_argument('--modes', nargs='+', default=['twiml', 'outbox', 'rest'],
+                            choices=['twiml', 'outbox', 'rest'])
+        parser.add_argument('--phone', default='+5490000000000',
+                            help='Número de teléfono usado en los webhooks')
+
+    def handle(self, *args, **options):
+        phone = options['phone']
+        data = {'From': f'whatsapp:{phone}', 'Body': 'comida 200'}
+
+        with TwilioStandIn(latency=options['twilio_latency'] / 1000) as standin:
+            for mode in options['modes']:
+                latencies = []
+                requests_before = standin.requests
+                settings = standin.settings(
+                    WHATSAPP_REPLY_MODE=mode,
+                    AUTHORIZED_PHONES=[phone],
+                    ALLOWED_HOSTS=['*'],
+                )
+                with settings, rollback():
+                    client = Client()
+                    for _ in range(options['requests']):
+                        start = time.perf_counter()
+                        response = client.post('/webhook/whatsapp/', data)
+                        latencies.append(time.perf_counter() - start)
+                        if response.status_code != 200:
+                            self.stderr.write(f"⚠️ {mode}: HTTP {response.status_code}")
+
+                stats = latency_stats(latencies)
+                twilio_calls = standin.requests - requests_before
+                self.stdout.write(
+                    f"{mode:>7}: media {stats['mean_ms']} ms | p50 {stats['p50_ms']} ms | "
+                    f"p95 {stats['p95_ms']} ms | p99 {stats['p99_ms']} ms | "
+                    f"llamadas a Twilio: {twilio_calls}"
+                )
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
@@ -0,0 +1,99 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from gastos.benchmarks import rollback
+from gastos.dimensiones import categoria_cache, usuario_cache
+from gastos.models import Gasto
+from gastos.services import GastoService
+
+CATEGORIAS = ['Comida', 'Transporte', 'Super', 'Netflix', 'Farmacia', 'Nafta', 'Ropa', 'Regalos']
+
+
+def resumen_anterior(gastos):
+    """
+    Implementación previa: aggregate + iteración de filas completas + count
+    """
+    total = gastos.aggregate(total=Sum('monto'))['total'] or Decimal('0')
+    gastos_por_categoria = {}
+    for gasto in gastos:
+        gastos_por_categoria[gasto.categoria_id] = gastos_por_categoria.get(gasto.categoria_id, 0) + gasto.monto
+    return {
+        'total_gastado': total,
+        'gastos_por_categoria': gastos_por_categoria,
+        'cantidad_gastos': gastos.count(),
+    }
+
+
+class Command(BaseCommand):
+    """
+    Compara el resumen anterior con el resumen de una sola consulta agrupada
+    """
+    help = 'Benchmark de get_resumen_gastos sobre filas sintéticas (se descartan al final)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help='Gastos sintéticos a generar')
+        parser.add_argument('--phones', type=int, default=10,
+                            help='Cantidad de teléfonos entre los que se reparten los gastos')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Días de historia generados')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Repeticiones de cada variante')
+
+    def handle(self, *args, **options):
+        phones = [f'+54900000{i:05d}' for i in range(options['phones'])]
+        end = timezone.now()
+        start = end - timedelta(days=options['days'])
+
+        with rollback():
+            self._generate(phones, start, end, options['rows'])
+            gastos = Gasto.objects.filter(usuario_id=usuario_cache.id(phones[0]), fecha__range=[start, end])
+
+            variants = {
+                'anterior': lambda: resumen_anterior(gastos.all()),
+                'agrupado': lambda: GastoService.summarize(gastos.all()),
+            }
+            results = {}
+            for name, run in variants.items():
+                timings = []
+                for _ in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as ctx:
+                        t0 = time.perf_counter()
+                        results[name] = run()
+                        timings.append(time.perf_counter() - t0)
+                self.stdout.write(
+                    f"{name:>9}: {min(timings) * 1000:.1f} ms (mejor de {options['repeat']}) | "
+                    f"{len(ctx.captured_queries)} consultas"
+                )
+
+        anterior, agrupado = results['anterior'], results['agrupado']
+        if (anterior['total_gastado'], anterior['cantidad_gastos']) != \
+                (agrupado['total_gastado'], agrupado['cantidad_gastos']):
+            self.stderr.write('⚠️ Los resúmenes no coinciden')
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
+
+    def _generate(self, phones, start, end, rows, batch_size=10_000):
+        rng = random.Random(42)
+        span = (end - start).total_seconds()
+        usuarios = list(usuario_cache.ids(phones, crear=True).values())
+        categorias = list(categoria_cache.ids(CATEGORIAS, crear=True).values())
+        t0 = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            Gasto.objects.bulk_create([
+                Gasto(
+                    usuario_id=rng.choice(usuarios),
+                    categoria_id=rng.choice(categorias),
+                    monto=Decimal(rng.randint(100, 500_000)) / 100,
+                    fecha=start + timedelta(seconds=rng.random() * span),
+                    mensaje_original='gasto sintético de benchmark',
+                )
+                for _ in range(min(batch_size, rows - offset))
+            ])
+        self.stdout.write(f"Generadas {rows} filas en {time.perf_counter() - t0:.1f} s")
@@ -0,0 +1,97 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand
+from gastos.router import (
+    DELETE_ID_PATTERN, DELETE_LAST_PATTERN, GASTO_PATTERN, RESUMEN_RANGO_PATTERN, normalize, router
+)
+from gastos.services import GastoService
+
+MENSAJES = [
+    'comida 200', 'Netflix 1500', 'transporte 50.5', 'super 3000',
+    'resumen hoy', 'resumen semana', 'resumen 01-07 al 29-07',
+    'eliminar 3', 'borrar ultimo', 'mis gastos', 'hola',
+]
+
+
+def ruteo_anterior(message):
+    """
+    If-chain anterior: varias normalizaciones y patrones como texto
+    """
+    message = message.strip()
+    if message.lower().startswith('resumen'):
+        m = message.strip().lower()
+        if m in ('resumen hoy', 'resumen semana'):
+            return 'resumen'
+        re.match(r'resumen\s+(\d{1,2}-\d{1,2})\s+al\s+(\d{1,2}-\d{1,2})', m)
+        return 'resumen'
+    if message.lower().startswith(('eliminar', 'borrar')):
+        m = message.strip().lower()
+        re.match(r'^(eliminar|borrar)\s+(\d+)$', m) or re.match(r'^(eliminar|borrar)\s+(ultimo|último)$', m)
+        return 'eliminar'
+    if message.lower() in ['mis gastos', 'gastos', 'ver gastos']:
+        return 'listar'
+    re.match(r'^(.+?)\s+(\d+(?:\.\d+)?)$', message.strip().lower())
+    return 'gasto'
+
+
+def ruteo_actual(message):
+    """
+    Router con normalización única y patrones precompilados (mismo trabajo
+    que ruteo_anterior: detectar el intent y aplicar su patrón)
+    """
+    text = normalize(message)
+    intent = router.route(text)
+    if intent == 'resumen':
+        if text not in ('resumen hoy', 'resumen semana'):
+            RESUMEN_RANGO_PATTERN.match(text)
+    elif intent == 'eliminar':
+        DELETE_ID_PATTERN.match(text) or DELETE_LAST_PATTERN.match(text)
+    elif intent == 'gasto':
+        GASTO_PATTERN.match(text)
+    return intent
+
+
+def ruteo_con_parseo(message):
+    """
+    Router más el parseo completo (fechas, Decimal) que usa MessageProcessor
+    """
+    text = normalize(message)
+    intent = router.route(text)
+    if intent == 'resumen':
+        GastoService.parse_resumen_message(text, normalized=True)
+    elif intent == 'eliminar':
+        GastoService.parse_delete_message(text, normalized=True)
+    elif intent == 'gasto':
+        GastoService.parse_gasto_message(text, normalized=True)
+    return intent
+
+
+class Command(BaseCommand):
+    """
+    Micro-benchmark del ruteo y parseo de mensajes (sin base de datos)
+    """
+    help = 'Mide mensajes/segundo a través del router de comandos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200_000,
+                            help='Mensajes a rutear por variante')
+
+    def handle(self, *args, **options):
+        total = options['messages']
+        mensajes = (MENSAJES * (total // len(MENSAJES) + 1))[:total]
+        self.stdout.write(f"Intents registrados: {', '.join(router.intents)}")
+
+        variants = (
+            ('anterior', ruteo_anterior),
+            ('router', ruteo_actual),
+            ('router + parseo', ruteo_con_parseo),
+        )
+        for name, route in variants:
+            t0 = time.perf_counter()
+            for mensaje in mensajes:
+                route(mensaje)
+            elapsed = time.perf_counter() - t0
+            self.stdout.write(f"{name:>15}: {total / elapsed:,.0f} mensajes/s")
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
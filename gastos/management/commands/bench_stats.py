@@ -0,0 +1,67 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils import timezone
+from gastos.benchmarks import rollback
+from gastos.dimensiones import categoria_cache, usuario_cache
+from gastos.models import GastoDiario
+from gastos.queries import QueryCounter
+from gastos.services import EstadisticasService
+
+CATEGORIAS = ['Comida', 'Transporte', 'Super', 'Netflix', 'Farmacia', 'Nafta', 'Ropa', 'Regalos']
+
+
+class Command(BaseCommand):
+    """
+    Mide /api/stats/ sobre varios años de totales diarios sintéticos de un
+    teléfono (se descartan al final)
+    """
+    help = 'Benchmark de las estadísticas por período (/api/stats/)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=5, help='Años de historia generados')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones de cada medición')
+
+    def handle(self, *args, **options):
+        phone = '+5490000000000'
+        hoy = timezone.localdate()
+        rng = random.Random(42)
+
+        with rollback():
+            usuario_id = usuario_cache.id(phone, crear=True)
+            categoria_ids = categoria_cache.ids(CATEGORIAS, crear=True)
+            filas = GastoDiario.objects.bulk_create([
+                GastoDiario(
+                    usuario_id=usuario_id, dia=hoy - timedelta(days=dia), categoria_id=categoria_ids[categoria],
+                    total=Decimal(rng.randint(100, 90_000)) / 100, cantidad=rng.randint(1, 3),
+                )
+                for dia in range(options['years'] * 365)
+                for categoria in CATEGORIAS
+                if rng.random() < 0.3
+            ], batch_size=2000)
+            self.stdout.write(f"{len(filas)} filas diarias en {options['years']} años")
+
+            client = Client(HTTP_HOST='localhost')
+            for periodo in EstadisticasService.PERIODOS:
+                url = f'/api/stats/?numero_telefono=%2B{phone[1:]}&periodo={periodo}'
+                client.get(url)
+                servicio, http = [], []
+                for _ in range(options['repeat']):
+                    with QueryCounter() as counter:
+                        t0 = time.perf_counter()
+                        data = EstadisticasService.estadisticas(phone, periodo=periodo)
+                        servicio.append(time.perf_counter() - t0)
+                    t0 = time.perf_counter()
+                    client.get(url)
+                    http.append(time.perf_counter() - t0)
+                self.stdout.write(
+                    f"{periodo:>7}: {len(data['serie'])} puntos | servicio {min(servicio) * 1000:.1f} ms | "
+                    f"request {min(http) * 1000:.1f} ms (mejor de {options['repeat']}) | "
+                    f"{counter.count} consultas"
+                )
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
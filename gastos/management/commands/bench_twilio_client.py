@@ -0,0 +1,55 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from gastos.benchmarks import TwilioStandIn, latency_stats
+from gastos.services import WhatsAppService
+from gastos.twilio_client import build_client, pool_stats, registry
+
+
+class Command(BaseCommand):
+    """
+    Compara un cliente de Twilio nuevo por mensaje contra el cliente compartido
+    """
+    help = 'Benchmark de envíos con cliente nuevo por mensaje vs cliente compartido con pool keep-alive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500,
+                            help='Mensajes a enviar por variante')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Hilos enviando en paralelo')
+        parser.add_argument('--twilio-latency', type=float, default=0,
+                            help='Latencia simulada de la API de Twilio en milisegundos')
+
+    def handle(self, *args, **options):
+        with TwilioStandIn(latency=options['twilio_latency'] / 1000) as standin, \
+                standin.settings(TWILIO_POOL_MAXSIZE=options['concurrency']):
+            variants = {
+                'nuevo': lambda: WhatsAppService(client=build_client()),
+                'pool': lambda: WhatsAppService(),
+            }
+            for name, make_service in variants.items():
+                registry.reset()
+                latencies = self._run(make_service, options['messages'], options['concurrency'])
+                stats = latency_stats(latencies)
+                self.stdout.write(
+                    f"{name:>6}: media {stats['mean_ms']} ms | p50 {stats['p50_ms']} ms | "
+                    f"p95 {stats['p95_ms']} ms | p99 {stats['p99_ms']} ms"
+                )
+
+            pool = pool_stats().get('pool', {})
+            self.stdout.write(
+                f"Pool: {pool.get('requests_sent')} envíos sobre "
+                f"{pool.get('connections_opened')} conexiones"
+            )
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
+
+    def _run(self, make_service, messages, concurrency):
+        def send(i):
+            start = time.perf_counter()
+            make_service().deliver('+5490000000000', f'mensaje {i}')
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(send, range(messages)))
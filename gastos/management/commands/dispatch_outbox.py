@@ -0,0 +1,97 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from gastos.services import IdempotenciaService, OutboxService, WhatsAppService
+from gastos.twilio_client import StubTwilioClient
+
+# Segundos entre purgas de mensajes entrantes (con --loop)
+PURGA_CADA = 3600
+# Espera máxima entre reintentos después de errores seguidos (con --loop)
+ESPERA_MAXIMA = 60
+
+logger = logging.getLogger('gastos')
+
+
+class Command(BaseCommand):
+    """
+    Comando que envía las respuestas encoladas en el outbox
+    """
+    help = 'Envía por WhatsApp las respuestas pendientes del outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE,
+                            help='Mensajes a reservar por lote')
+        parser.add_argument('--concurrency', type=int, default=settings.OUTBOX_CONCURRENCY,
+                            help='Envíos simultáneos a Twilio')
+        parser.add_argument('--loop', action='store_true',
+                            help='Seguir ejecutando y consultar el outbox periódicamente')
+        parser.add_argument('--interval', type=float, default=settings.OUTBOX_POLL_INTERVAL,
+                            help='Segundos de espera cuando no hay mensajes (con --loop)')
+        parser.add_argument('--stub', action='store_true',
+                            help='Usar un cliente de Twilio simulado (sin red)')
+
+    def handle(self, *args, **options):
+        client = StubTwilioClient() if options['stub'] else None
+        whatsapp_service = WhatsAppService(client=client)
+
+        # Fuera del modo outbox no se encolan respuestas: el worker envía lo
+        # que haya quedado pendiente y después solo purga los MessageSid
+        outbox = settings.WHATSAPP_REPLY_MODE == 'outbox'
+        if options['loop'] and not outbox:
+            logger.info(
+                f"WHATSAPP_REPLY_MODE={settings.WHATSAPP_REPLY_MODE}: el outbox no se consulta "
+                "después de enviar los pendientes; solo se purgan los mensajes entrantes"
+            )
+
+        total_enviados = total_fallidos = 0
+        proxima_purga = time.monotonic()
+        errores = 0
+        pendientes = True
+        while True:
+            # Como al empezar un request: descarta la conexión si venció
+            # (CONN_MAX_AGE) o quedó inutilizable (ej: la base se reinició)
+            close_old_connections()
+            try:
+                enviados = fallidos = 0
+                if outbox or pendientes:
+                    enviados, fallidos = OutboxService.dispatch_batch(
+                        whatsapp_service,
+                        batch_size=options['batch_size'],
+                        concurrency=options['concurrency'],
+                    )
+                    pendientes = bool(enviados or fallidos)
+                if not (enviados or fallidos) and options['loop'] and time.monotonic() >= proxima_purga:
+                    # Sin envíos pendientes: aprovechar para purgar los MessageSid viejos
+                    IdempotenciaService.purgar()
+                    proxima_purga = time.monotonic() + PURGA_CADA
+            except Exception:
+                if not options['loop']:
+                    raise
+                # Un error de la base o de Twilio no detiene el worker:
+                # se reintenta con espera creciente
+                errores += 1
+                espera = min(ESPERA_MAXIMA, options['interval'] * 2 ** errores)
+                logger.exception(f"Error despachando el outbox (reintento en {espera:.0f} s)")
+                time.sleep(espera)
+                continue
+            errores = 0
+
+            total_enviados += enviados
+            total_fallidos += fallidos
+            if enviados or fallidos:
+                self.stdout.write(f"📤 Lote: {enviados} enviados, {fallidos} fallidos")
+                continue
+
+            if not options['loop']:
+                break
+            if outbox:
+                time.sleep(options['interval'])
+            else:
+                time.sleep(max(options['interval'], proxima_purga - time.monotonic()))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Outbox vacío: {total_enviados} enviados, {total_fallidos} fallidos"
+        ))
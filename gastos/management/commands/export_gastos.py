@@ -0,0 +1,58 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from gastos.export import FORMATS, iter_export
+from gastos.services import GastoService
+
+
+class Command(BaseCommand):
+    """
+    Comando para exportar gastos a CSV o NDJSON
+    """
+    help = 'Exporta gastos en streaming a un archivo o a la salida estándar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--phone', type=str, default=None, help='Número de teléfono')
+        parser.add_argument('--categoria', type=str, default=None)
+        parser.add_argument('--desde', type=str, default=None, help='Fecha inicial YYYY-MM-DD')
+        parser.add_argument('--hasta', type=str, default=None, help='Fecha final YYYY-MM-DD')
+        parser.add_argument('--output', '-o', type=str, default=None,
+                            help='Archivo de salida (por defecto, salida estándar)')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Filas por vuelta del cursor')
+
+    def handle(self, *args, **options):
+        gastos = GastoService.filter_gastos(
+            phone_number=options['phone'],
+            categoria=options['categoria'],
+            start_date=self._date(options['desde']),
+            end_date=self._date(options['hasta']),
+        )
+
+        t0 = time.perf_counter()
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for block in iter_export(gastos, options['formato'], options['chunk_size']):
+                output.write(block)
+        finally:
+            if options['output']:
+                output.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Exportado a {options['output']} en {time.perf_counter() - t0:.1f} s"
+            ))
+
+    def _date(self, value):
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f"Fecha inválida: {value} (usar YYYY-MM-DD)")
+        return parsed
@@ -0,0 +1,55 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from gastos.importer import GastoImporter, read_records
+
+
+class Command(BaseCommand):
+    """
+    Comando para importar gastos históricos desde CSV o NDJSON
+    """
+    help = 'Importa gastos en lotes (bulk_create) y permite retomar desde el último lote confirmado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Archivo CSV o NDJSON')
+        parser.add_argument('--formato', choices=['csv', 'ndjson'], default=None,
+                            help='Formato del archivo (por defecto, según la extensión)')
+        parser.add_argument('--phone', type=str, default=None,
+                            help='Teléfono para los registros sin numero_telefono')
+        parser.add_argument('--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE,
+                            help='Registros por lote y transacción')
+        parser.add_argument('--checkpoint', type=str, default=None,
+                            help='Clave del checkpoint (por defecto, la ruta absoluta del archivo)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignorar el checkpoint y empezar desde el principio')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"No existe el archivo: {path}")
+
+        importer = GastoImporter(
+            clave=options['checkpoint'] or os.path.abspath(path),
+            batch_size=options['batch_size'],
+            default_phone=options['phone'],
+            on_batch=self._report,
+        )
+        importacion = importer.run(read_records(path, options['formato']), restart=options['restart'])
+
+        for numero, error in importer.errores[:20]:
+            self.stderr.write(f"⚠️ Registro {numero}: {error}")
+        if len(importer.errores) > 20:
+            self.stderr.write(f"⚠️ ... y {len(importer.errores) - 20} registros rechazados más")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Importación completa: {importacion.importados} importados, "
+            f"{importacion.rechazados} rechazados"
+        ))
+
+    def _report(self, importacion, throughput):
+        self.stdout.write(
+            f"📥 {importacion.filas_procesadas} registros procesados "
+            f"({importacion.importados} importados, {importacion.rechazados} rechazados) | "
+            f"{throughput:.0f} registros/s"
+        )
@@ -0,0 +1,121 @@
+import json
+import subprocess
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from gastos.benchmarks import (
+    MIX_DEFAULT, AppServer, TwilioStandIn, load_stats, parse_mix, run_load, webhook_payloads,
+)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _diff(actual, anterior):
+    if not anterior:
+        return ''
+    cambio = (actual - anterior) / anterior * 100
+    return f' ({cambio:+.1f}%)'
+
+
+class Command(BaseCommand):
+    """
+    Prueba de carga del webhook con una mezcla realista de mensajes contra
+    la app en gunicorn y un stand-in local de la API de Twilio. Guarda los
+    resultados en JSON para comparar entre commits.
+    """
+    help = 'Prueba de carga de /webhook/whatsapp/ con mezcla de mensajes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', default=','.join(f'{k}={v}' for k, v in MIX_DEFAULT.items()),
+                            help='Proporción de cada tipo de mensaje (gasto, resumen, eliminar, listar)')
+        parser.add_argument('--requests', type=int, default=2000, help='Webhooks medidos')
+        parser.add_argument('--concurrency', type=int, default=50, help='Webhooks en vuelo al mismo tiempo')
+        parser.add_argument('--phones', type=int, default=20, help='Usuarios distintos que envían mensajes')
+        parser.add_argument('--warmup', type=int, default=200,
+                            help='Gastos enviados antes de medir, para que haya historial')
+        parser.add_argument('--server', default='wsgi', choices=['wsgi', 'asgi'])
+        parser.add_argument('--workers', type=int, default=1, help='Workers de gunicorn')
+        parser.add_argument('--mode', default='twiml', choices=['twiml', 'outbox', 'rest'],
+                            help='Modo de respuesta del webhook')
+        parser.add_argument('--twilio-latency', type=float, default=150,
+                            help='Latencia simulada de la API de Twilio en milisegundos')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla de la mezcla de mensajes')
+        parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument('--compare', help='Resultados JSON anteriores para comparar')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        anterior = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                anterior = json.load(f)
+
+        phones = [f'+549351{i:07d}' for i in range(options['phones'])]
+        warmup = webhook_payloads(options['warmup'], {'gasto': 1}, phones, options['seed'], prefix='SMWARM')
+        payloads = webhook_payloads(options['requests'], mix, phones, options['seed'])
+        self.stdout.write(
+            f"{options['requests']} webhooks ({options['mix']}), {options['concurrency']} en vuelo, "
+            f"{options['server']}, modo {options['mode']}, Twilio {options['twilio_latency']:.0f} ms"
+        )
+
+        with TwilioStandIn(latency=options['twilio_latency'] / 1000) as standin:
+            env = standin.environ(
+                AUTHORIZED_PHONES=','.join(phones), WHATSAPP_REPLY_MODE=options['mode'],
+                LOG_PAYLOAD_SAMPLE_RATE=0, DB_QUERY_COUNT_HEADER=True,
+            )
+            with AppServer(asgi=options['server'] == 'asgi', workers=options['workers'], env=env) as app:
+                url = f'{app.base_url}/webhook/whatsapp/'
+                if warmup:
+                    run_load(url, warmup, options['concurrency'])
+                results, elapsed = run_load(url, payloads, options['concurrency'])
+
+        report = {
+            'commit': _git_commit(),
+            'fecha': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+            'opciones': {k: options[k] for k in (
+                'mix', 'requests', 'concurrency', 'phones', 'warmup', 'server', 'workers',
+                'mode', 'twilio_latency', 'seed',
+            )},
+            **load_stats(results, elapsed),
+        }
+        self._print(report, anterior)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['output']}")
+        self.stdout.write(self.style.SUCCESS('✅ Prueba de carga completada'))
+
+    def _print(self, report, anterior):
+        if anterior:
+            self.stdout.write(f"Comparado con {anterior.get('commit')} ({anterior.get('fecha')})")
+        filas = [('total', report['total'], (anterior or {}).get('total'))]
+        filas += [
+            (kind, stats, (anterior or {}).get('por_tipo', {}).get(kind))
+            for kind, stats in report['por_tipo'].items()
+        ]
+        for name, stats, prev in filas:
+            prev = prev or {}
+            consultas = stats['consultas_media']
+            self.stdout.write(
+                f"{name:>9}: {stats['throughput_rps']:7.1f} req/s{_diff(stats['throughput_rps'], prev.get('throughput_rps'))}"
+                f" | p50 {stats['p50_ms']:.1f} ms{_diff(stats['p50_ms'], prev.get('p50_ms'))}"
+                f" | p95 {stats['p95_ms']:.1f} ms{_diff(stats['p95_ms'], prev.get('p95_ms'))}"
+                f" | p99 {stats['p99_ms']:.1f} ms{_diff(stats['p99_ms'], prev.get('p99_ms'))}"
+                f" | consultas {'-' if consultas is None else consultas} (max {stats['consultas_max']})"
+                f" | errores {sum(stats['errores'].values())}"
+            )
+            for error, cantidad in sorted(stats['errores'].items(), key=lambda e: -e[1])[:3]:
+                self.stdout.write(f"           {error}: {cantidad}")
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from gastos.services import IdempotenciaService
+
+
+class Command(BaseCommand):
+    """
+    Comando que elimina los MessageSid procesados más viejos que el TTL
+    """
+    help = 'Elimina los mensajes entrantes procesados hace más de WEBHOOK_IDEMPOTENCY_TTL_HOURS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.WEBHOOK_IDEMPOTENCY_TTL_HOURS,
+                            help='Conservar los mensajes de las últimas N horas')
+
+    def handle(self, *args, **options):
+        eliminados = IdempotenciaService.purgar(options['hours'])
+        self.stdout.write(self.style.SUCCESS(f"✅ {eliminados} mensajes entrantes eliminados"))
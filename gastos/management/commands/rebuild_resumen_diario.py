@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from gastos.services import ResumenDiarioService
+
+
+class Command(BaseCommand):
+    """
+    Comando para recalcular los totales diarios y mensuales desde los gastos
+    """
+    help = 'Recalcula los totales diarios (GastoDiario) y mensuales (GastoMensual) a partir de los gastos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--phone', type=str, default=None,
+                            help='Recalcular solo este número de teléfono')
+
+    def handle(self, *args, **options):
+        t0 = time.perf_counter()
+        filas = ResumenDiarioService.rebuild(options['phone'])
+        alcance = options['phone'] or 'todos los teléfonos'
+
+        self.stdout.write(f"📅 {filas} filas diarias para {alcance}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Totales diarios y mensuales recalculados en {time.perf_counter() - t0:.1f} s"
+        ))
@@ -0,0 +1,89 @@
+"""
+Métricas en formato Prometheus para /metrics.
+
+Con varios workers de gunicorn cada proceso tiene sus propios valores: para
+que /metrics los sume hay que definir la variable de entorno
+PROMETHEUS_MULTIPROC_DIR (un directorio vacío y escribible) antes de
+arrancar. Así cada proceso, incluido dispatch_outbox, escribe sus métricas
+en archivos mmap de ese directorio y el worker que atiende /metrics los
+combina. gunicorn.conf.py vacía el directorio al arrancar y descarta los
+archivos de los workers que terminan.
+"""
+
+import os
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+from .router import normalize, router
+
+WEBHOOK_LATENCY = Histogram(
+    'gastos_webhook_duration_seconds', 'Latencia del webhook de WhatsApp por comando', ['comando'],
+)
+TWILIO_LATENCY = Histogram(
+    'gastos_twilio_send_duration_seconds', 'Latencia de los envíos a la API de Twilio', ['cliente'],
+)
+TWILIO_FAILURES = Counter(
+    'gastos_twilio_send_failures_total', 'Envíos a la API de Twilio que fallaron', ['cliente', 'error'],
+)
+DB_QUERIES = Histogram(
+    'gastos_db_queries_per_request', 'Consultas SQL por request', ['vista'],
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50, 100, float('inf')),
+)
+DB_TIME = Histogram(
+    'gastos_db_duration_seconds_per_request', 'Tiempo en consultas SQL por request', ['vista'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, float('inf')),
+)
+CACHE_REQUESTS = Counter(
+    'gastos_cache_requests_total', 'Lecturas de cache por resultado (hit/miss)', ['cache', 'resultado'],
+)
+
+
+def webhook_command(message_body):
+    """
+    Comando de un mensaje, para la etiqueta de la latencia del webhook
+    (los mensajes de varias líneas son gastos)
+    """
+    text = normalize(message_body)
+    if not text:
+        return 'vacio'
+    if '\n' in text:
+        return 'gasto'
+    return router.route(text)
+
+
+@contextmanager
+def time_twilio(cliente):
+    """
+    Mide un envío a Twilio y cuenta los que fallan, por tipo de error
+    """
+    with TWILIO_LATENCY.labels(cliente).time():
+        try:
+            yield
+        except Exception as e:
+            TWILIO_FAILURES.labels(cliente, type(e).__name__).inc()
+            raise
+
+
+def count_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def observe_queries(vista, counter):
+    DB_QUERIES.labels(vista).observe(counter.count)
+    DB_TIME.labels(vista).observe(counter.elapsed)
+
+
+def render():
+    """
+    Retorna (contenido, content_type) con las métricas de todos los
+    procesos en modo multiproceso, o las del proceso actual
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,19 +1,174 @@
 """
-Middleware personalizado para el manejo de webhooks de Twilio
+Middleware personalizado para el manejo de webhooks de Twilio.
+
+Todos funcionan en modo sync (WSGI) y async (ASGI): un middleware solo
+sync obligaría a Django a correr las vistas async en un hilo por request.
 """
 
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .log import new_request_id, request_id_var
+from .metrics import observe_queries
+from .queries import QueryCounter
+
+_REQUEST_ID = re.compile(r'^[\w\-]{1,64}$')
 
-class DisableCSRFMiddleware:
+
+class SyncAsyncMiddleware:
     """
-    Desactiva la verificación CSRF para webhooks de Twilio
+    Base para middleware que se adapta al modo de la cadena (como
+    django.utils.deprecation.MiddlewareMixin, sin saltar a otro hilo)
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.call(request)
+
+    def call(self, request):
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+class DisableCSRFMiddleware(SyncAsyncMiddleware):
+    """
+    Desactiva la verificación CSRF para webhooks de Twilio
+    """
+
+    def _mark(self, request):
         # Desactivar CSRF para las rutas de webhook
         if request.path.startswith('/webhook/'):
             setattr(request, '_dont_enforce_csrf_checks', True)
-        
-        response = self.get_response(request)
+
+    def call(self, request):
+        self._mark(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._mark(request)
+        return await self.get_response(request)
+
+
+class RequestIdMiddleware(SyncAsyncMiddleware):
+    """
+    Asigna un request ID (el del header X-Request-ID si es válido) que se
+    agrega a todos los logs del request y se devuelve en la respuesta
+    """
+
+    def _request_id(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not _REQUEST_ID.match(request_id):
+            request_id = new_request_id()
+        return request_id
+
+    def call(self, request):
+        request_id = self._request_id(request)
+        token = request_id_var.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response['X-Request-ID'] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id = self._request_id(request)
+        token = request_id_var.set(request_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response['X-Request-ID'] = request_id
+        return response
+
+
+class StaticFilesMiddleware(SyncAsyncMiddleware):
+    """
+    WhiteNoise con soporte async: la búsqueda del archivo es en memoria y
+    solo servir un archivo estático pasa por un hilo
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.whitenoise = WhiteNoiseMiddleware(get_response)
+
+    def _static_file(self, request):
+        if self.whitenoise.autorefresh:
+            return self.whitenoise.find_file(request.path_info)
+        return self.whitenoise.files.get(request.path_info)
+
+    def call(self, request):
+        return self.whitenoise(request)
+
+    async def __acall__(self, request):
+        static_file = self._static_file(request)
+        if static_file is not None:
+            return await sync_to_async(self.whitenoise.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class QueryCountMiddleware(SyncAsyncMiddleware):
+    """
+    Agrega el header X-DB-Queries con las consultas SQL del request (para
+    las pruebas de carga; solo con DB_QUERY_COUNT_HEADER=True)
+    """
+
+    def __init__(self, get_response):
+        if not settings.DB_QUERY_COUNT_HEADER:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def call(self, request):
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        response['X-DB-Queries'] = str(counter.count)
+        return response
+
+    async def __acall__(self, request):
+        with QueryCounter() as counter:
+            response = await self.get_response(request)
+        response['X-DB-Queries'] = str(counter.count)
+        return response
+
+
+class MetricsMiddleware(SyncAsyncMiddleware):
+    """
+    Registra en /metrics las consultas SQL y su tiempo por request,
+    etiquetadas por nombre de vista (desactivado con METRICS_ENABLED=False)
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def _observe(self, request, counter):
+        match = request.resolver_match
+        observe_queries(match.url_name if match and match.url_name else 'otra', counter)
+
+    def call(self, request):
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        self._observe(request, counter)
+        return response
+
+    async def __acall__(self, request):
+        with QueryCounter() as counter:
+            response = await self.get_response(request)
+        self._observe(request, counter)
         return response
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:26
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gastos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MensajeSaliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_telefono', models.CharField(help_text='Número de teléfono destino', max_length=20)),
+                ('cuerpo', models.TextField(help_text='Texto de la respuesta a enviar')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviando', 'Enviando'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', help_text='Estado del envío', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0, help_text='Cantidad de intentos de envío realizados')),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now, help_text='Fecha y hora en que se encoló la respuesta')),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now, help_text='Momento a partir del cual el mensaje puede (re)intentarse')),
+                ('enviado', models.DateTimeField(blank=True, help_text='Fecha y hora del envío exitoso', null=True)),
+                ('message_sid', models.CharField(blank=True, help_text='SID devuelto por Twilio', max_length=64)),
+                ('ultimo_error', models.TextField(blank=True, help_text='Último error de envío')),
+            ],
+            options={
+                'verbose_name': 'Mensaje saliente',
+                'verbose_name_plural': 'Mensajes salientes',
+                'ordering': ['creado'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='outbox_estado_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gastos', '0002_mensajesaliente'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(fields=['numero_telefono', 'fecha'], name='gasto_tel_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(fields=['numero_telefono', 'categoria', 'fecha'], name='gasto_tel_cat_fecha_idx'),
+        ),
+    ]
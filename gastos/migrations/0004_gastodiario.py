@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:32
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_gasto_diario(apps, schema_editor):
+    """
+    Carga los totales diarios a partir de los gastos existentes
+    """
+    Gasto = apps.get_model('gastos', 'Gasto')
+    GastoDiario = apps.get_model('gastos', 'GastoDiario')
+    filas = (
+        Gasto.objects.using(schema_editor.connection.alias)
+        .order_by()
+        .values('numero_telefono', 'categoria', dia=TruncDate('fecha'))
+        .annotate(total=Sum('monto'), cantidad=Count('id'))
+    )
+    GastoDiario.objects.using(schema_editor.connection.alias).bulk_create(
+        (GastoDiario(**fila) for fila in filas.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gastos', '0003_gasto_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GastoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_telefono', models.CharField(help_text='Número de teléfono del usuario', max_length=20)),
+                ('dia', models.DateField(help_text='Día del gasto (hora local)')),
+                ('categoria', models.CharField(help_text='Categoría del gasto', max_length=100)),
+                ('total', models.DecimalField(decimal_places=2, default=0, help_text='Suma de los montos del día', max_digits=14)),
+                ('cantidad', models.PositiveIntegerField(default=0, help_text='Cantidad de gastos del día')),
+            ],
+            options={
+                'verbose_name': 'Gasto diario',
+                'verbose_name_plural': 'Gastos diarios',
+                'ordering': ['-dia'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='gastodiario',
+            constraint=models.UniqueConstraint(fields=('numero_telefono', 'dia', 'categoria'), name='gasto_diario_unico'),
+        ),
+        migrations.RunPython(backfill_gasto_diario, migrations.RunPython.noop),
+    ]
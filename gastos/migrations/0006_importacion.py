@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gastos', '0005_gasto_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Importacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(help_text='Identificador de la importación (por defecto, la ruta del archivo)', max_length=255, unique=True)),
+                ('filas_procesadas', models.PositiveIntegerField(default=0, help_text='Registros del archivo ya procesados')),
+                ('importados', models.PositiveIntegerField(default=0, help_text='Gastos creados')),
+                ('rechazados', models.PositiveIntegerField(default=0, help_text='Registros inválidos descartados')),
+                ('completada', models.BooleanField(default=False, help_text='La importación llegó al final del archivo')),
+                ('actualizado', models.DateTimeField(auto_now=True, help_text='Último lote confirmado')),
+            ],
+            options={
+                'verbose_name': 'Importación',
+                'verbose_name_plural': 'Importaciones',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:42
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gastos', '0006_importacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelefonoAutorizado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_telefono', models.CharField(help_text='Número autorizado (ej: +5403535123123)', max_length=20, unique=True)),
+                ('nombre', models.CharField(blank=True, help_text='Nombre de referencia del usuario', max_length=100)),
+                ('activo', models.BooleanField(default=True, help_text='Si está desactivado, los mensajes del número se rechazan')),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now, help_text='Fecha y hora de alta')),
+            ],
+            options={
+                'verbose_name': 'Teléfono autorizado',
+                'verbose_name_plural': 'Teléfonos autorizados',
+                'ordering': ['numero_telefono'],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gastos', '0007_telefonoautorizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MensajeEntrante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_sid', models.CharField(help_text='MessageSid del mensaje recibido', max_length=64, unique=True)),
+                ('numero_telefono', models.CharField(help_text='Número de teléfono del remitente', max_length=20)),
+                ('respuesta', models.TextField(blank=True, help_text='Respuesta generada para el mensaje')),
+                ('procesado', models.DateTimeField(db_index=True, default=django.utils.timezone.now, help_text='Fecha y hora en que se procesó el mensaje')),
+                ('mensaje_saliente', models.ForeignKey(blank=True, help_text='Respuesta encolada en el outbox (modo outbox)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gastos.mensajesaliente')),
+            ],
+            options={
+                'verbose_name': 'Mensaje entrante',
+                'verbose_name_plural': 'Mensajes entrantes',
+                'ordering': ['-procesado'],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:05
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_gasto_mensual(apps, schema_editor):
+    """
+    Carga los totales mensuales a partir de los totales diarios
+    """
+    GastoDiario = apps.get_model('gastos', 'GastoDiario')
+    GastoMensual = apps.get_model('gastos', 'GastoMensual')
+    filas = (
+        GastoDiario.objects.using(schema_editor.connection.alias)
+        .order_by()
+        .values('numero_telefono', 'categoria', mes=TruncMonth('dia'))
+        .annotate(total=Sum('total'), cantidad=Sum('cantidad'))
+    )
+    GastoMensual.objects.using(schema_editor.connection.alias).bulk_create(
+        (GastoMensual(**fila) for fila in filas.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gastos', '0008_mensajeentrante'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GastoMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_telefono', models.CharField(help_text='Número de teléfono del usuario', max_length=20)),
+                ('mes', models.DateField(help_text='Primer día del mes (hora local)')),
+                ('categoria', models.CharField(help_text='Categoría del gasto', max_length=100)),
+                ('total', models.DecimalField(decimal_places=2, default=0, help_text='Suma de los montos del mes', max_digits=14)),
+                ('cantidad', models.PositiveIntegerField(default=0, help_text='Cantidad de gastos del mes')),
+            ],
+            options={
+                'verbose_name': 'Gasto mensual',
+                'verbose_name_plural': 'Gastos mensuales',
+                'ordering': ['-mes'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Presupuesto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_telefono', models.CharField(help_text='Número de teléfono del usuario', max_length=20)),
+                ('categoria', models.CharField(help_text='Categoría (con el mismo formato que los gastos, ej: Comida)', max_length=100)),
+                ('monto', models.DecimalField(decimal_places=2, help_text='Monto máximo por mes', max_digits=14)),
+                ('actualizado', models.DateTimeField(auto_now=True, help_text='Última modificación')),
+            ],
+            options={
+                'verbose_name': 'Presupuesto',
+                'verbose_name_plural': 'Presupuestos',
+                'ordering': ['numero_telefono', 'categoria'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='presupuesto',
+            constraint=models.UniqueConstraint(fields=('numero_telefono', 'categoria'), name='presupuesto_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='gastomensual',
+            constraint=models.UniqueConstraint(fields=('numero_telefono', 'categoria', 'mes'), name='gasto_mensual_unico'),
+        ),
+        migrations.RunPython(backfill_gasto_mensual, migrations.RunPython.noop),
+    ]
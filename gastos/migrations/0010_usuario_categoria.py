@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Primer paso de la normalización de Gasto: tablas de dimensión y claves
+    foráneas nulas (la app anterior puede seguir escribiendo gastos)
+    """
+
+    dependencies = [
+        ('gastos', '0009_gastomensual_presupuesto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Usuario',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('numero_telefono', models.CharField(help_text='Número de teléfono del usuario (ej: +5403535123123)', max_length=20, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Usuario',
+                'verbose_name_plural': 'Usuarios',
+                'ordering': ['numero_telefono'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Categoria',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(help_text='Categoría del gasto (ej: Comida, Transporte, Netflix)', max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Categoría',
+                'verbose_name_plural': 'Categorías',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.AddField(
+            model_name='gasto',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, help_text='Usuario que registró el gasto', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='gastos', to='gastos.usuario'),
+        ),
+        migrations.AddField(
+            model_name='gasto',
+            name='categoria_ref',
+            field=models.ForeignKey(db_index=False, help_text='Categoría del gasto', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='gastos', to='gastos.categoria'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:10
+
+from django.db import migrations, transaction
+from django.db.models import Max, Min, OuterRef, Q, Subquery
+
+# Gastos actualizados por transacción
+CHUNK = 5000
+
+
+def backfill_dimensiones(apps, schema_editor):
+    """
+    Completa usuario y categoria_ref de los gastos que no los tienen.
+
+    Primero crea las filas de dimensión que falten y después actualiza los
+    gastos por rangos de CHUNK ids, con una transacción (y un UPDATE) por
+    rango: no bloquea la tabla mientras dura la migración y, si se corta,
+    se retoma desde los gastos que quedaron sin completar.
+    """
+    alias = schema_editor.connection.alias
+    Gasto = apps.get_model('gastos', 'Gasto')
+    Usuario = apps.get_model('gastos', 'Usuario')
+    Categoria = apps.get_model('gastos', 'Categoria')
+    pendientes = Gasto.objects.using(alias).filter(
+        Q(usuario__isnull=True) | Q(categoria_ref__isnull=True)
+    ).order_by()
+
+    Usuario.objects.using(alias).bulk_create(
+        [Usuario(numero_telefono=t) for t in pendientes.values_list('numero_telefono', flat=True).distinct()],
+        batch_size=1000, ignore_conflicts=True
+    )
+    Categoria.objects.using(alias).bulk_create(
+        [Categoria(nombre=c) for c in pendientes.values_list('categoria', flat=True).distinct()],
+        batch_size=1000, ignore_conflicts=True
+    )
+
+    rango = pendientes.aggregate(desde=Min('id'), hasta=Max('id'))
+    if rango['desde'] is None:
+        return
+    usuario = Subquery(Usuario.objects.filter(numero_telefono=OuterRef('numero_telefono')).values('id')[:1])
+    categoria = Subquery(Categoria.objects.filter(nombre=OuterRef('categoria')).values('id')[:1])
+    for inicio in range(rango['desde'], rango['hasta'] + 1, CHUNK):
+        with transaction.atomic(using=alias):
+            pendientes.filter(id__gte=inicio, id__lt=inicio + CHUNK).update(
+                usuario=usuario, categoria_ref=categoria
+            )
+
+
+class Migration(migrations.Migration):
+    """
+    Segundo paso: carga de las claves foráneas por lotes, fuera de una
+    transacción única. Se puede aplicar con la versión anterior de la app
+    todavía en servicio (``migrate gastos 0011``).
+    """
+    atomic = False
+
+    dependencies = [
+        ('gastos', '0010_usuario_categoria'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_dimensiones, migrations.RunPython.noop),
+    ]
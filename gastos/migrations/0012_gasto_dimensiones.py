@@ -0,0 +1,91 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:10
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+backfill_dimensiones = import_module('gastos.migrations.0011_gasto_dimensiones_backfill').backfill_dimensiones
+
+
+def restaurar_textos(apps, schema_editor):
+    """
+    Vuelve a cargar el teléfono y la categoría como texto (al revertir)
+    """
+    alias = schema_editor.connection.alias
+    Gasto = apps.get_model('gastos', 'Gasto')
+    Usuario = apps.get_model('gastos', 'Usuario')
+    Categoria = apps.get_model('gastos', 'Categoria')
+    Gasto.objects.using(alias).update(
+        numero_telefono=Subquery(Usuario.objects.filter(id=OuterRef('usuario_id')).values('numero_telefono')[:1]),
+        categoria=Subquery(Categoria.objects.filter(id=OuterRef('categoria_ref_id')).values('nombre')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Último paso (con la versión nueva de la app): completa los gastos
+    creados desde 0011, elimina las columnas de texto y sus índices y deja
+    las claves foráneas obligatorias e indexadas
+    """
+
+    dependencies = [
+        ('gastos', '0011_gasto_dimensiones_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_dimensiones, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='gasto',
+            name='gasto_tel_fecha_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='gasto',
+            name='gasto_tel_cat_fecha_idx',
+        ),
+        # Nulas antes de eliminarlas para que, al revertir, se puedan volver
+        # a agregar y completar desde las dimensiones
+        migrations.AlterField(
+            model_name='gasto',
+            name='numero_telefono',
+            field=models.CharField(help_text='Número de teléfono del usuario (ej: +5403535123123)', max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='gasto',
+            name='categoria',
+            field=models.CharField(help_text='Categoría del gasto (ej: comida, transporte, Netflix)', max_length=100, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restaurar_textos),
+        migrations.RemoveField(
+            model_name='gasto',
+            name='numero_telefono',
+        ),
+        migrations.RemoveField(
+            model_name='gasto',
+            name='categoria',
+        ),
+        migrations.RenameField(
+            model_name='gasto',
+            old_name='categoria_ref',
+            new_name='categoria',
+        ),
+        migrations.AlterField(
+            model_name='gasto',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, help_text='Usuario que registró el gasto', on_delete=django.db.models.deletion.PROTECT, related_name='gastos', to='gastos.usuario'),
+        ),
+        migrations.AlterField(
+            model_name='gasto',
+            name='categoria',
+            field=models.ForeignKey(db_index=False, help_text='Categoría del gasto', on_delete=django.db.models.deletion.PROTECT, related_name='gastos', to='gastos.categoria'),
+        ),
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(fields=['usuario', 'fecha'], name='gasto_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(fields=['usuario', 'categoria', 'fecha'], name='gasto_usuario_cat_fecha_idx'),
+        ),
+    ]
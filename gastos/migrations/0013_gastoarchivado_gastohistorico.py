@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# Vista de solo lectura con los gastos de las dos tablas (modelo
+# GastoHistorico). Con UNION ALL el planificador de SQLite y PostgreSQL
+# aplica los filtros en cada tabla, usa sus índices y mezcla los dos lados
+# ya ordenados para ORDER BY fecha DESC, id DESC ... LIMIT.
+COLUMNAS = 'id, usuario_id, categoria_id, monto, fecha, mensaje_original'
+CREAR_VISTA = f"""
+CREATE VIEW gastos_gastohistorico AS
+SELECT {COLUMNAS} FROM gastos_gasto
+UNION ALL
+SELECT {COLUMNAS} FROM gastos_gastoarchivado
+"""
+BORRAR_VISTA = 'DROP VIEW gastos_gastohistorico'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gastos', '0012_gasto_dimensiones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GastoHistorico',
+            fields=[
+                ('monto', models.DecimalField(decimal_places=2, help_text='Monto del gasto', max_digits=10)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, help_text='Fecha y hora del registro del gasto')),
+                ('mensaje_original', models.TextField(help_text='Mensaje original recibido por WhatsApp')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'verbose_name': 'Gasto (histórico)',
+                'verbose_name_plural': 'Gastos (histórico)',
+                'db_table': 'gastos_gastohistorico',
+                'ordering': ['-fecha'],
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CorteArchivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('corte', models.DateTimeField(help_text='Los gastos anteriores a esta fecha pueden estar archivados')),
+                ('actualizado', models.DateTimeField(auto_now=True, help_text='Última modificación')),
+            ],
+            options={
+                'verbose_name': 'Corte del archivo',
+                'verbose_name_plural': 'Corte del archivo',
+            },
+        ),
+        migrations.CreateModel(
+            name='GastoArchivado',
+            fields=[
+                ('monto', models.DecimalField(decimal_places=2, help_text='Monto del gasto', max_digits=10)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, help_text='Fecha y hora del registro del gasto')),
+                ('mensaje_original', models.TextField(help_text='Mensaje original recibido por WhatsApp')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('categoria', models.ForeignKey(db_index=False, help_text='Categoría del gasto', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.categoria')),
+                ('usuario', models.ForeignKey(db_index=False, help_text='Usuario que registró el gasto', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.usuario')),
+            ],
+            options={
+                'verbose_name': 'Gasto archivado',
+                'verbose_name_plural': 'Gastos archivados',
+                'ordering': ['-fecha'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['usuario', 'fecha'], name='archivado_usuario_fecha_idx'), models.Index(fields=['usuario', 'categoria', 'fecha'], name='archivado_usuario_cat_idx'), models.Index(fields=['-fecha', '-id'], name='archivado_fecha_id_idx')],
+            },
+        ),
+        migrations.RunSQL(CREAR_VISTA, BORRAR_VISTA),
+    ]
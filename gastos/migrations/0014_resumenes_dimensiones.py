@@ -0,0 +1,96 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:40
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+from django.db.models import Max, Min, OuterRef, Q, Subquery
+
+# Filas actualizadas por transacción
+CHUNK = 5000
+
+# Tablas que guardan teléfono y categoría como texto (además de Gasto)
+MODELOS = ('GastoDiario', 'GastoMensual', 'Presupuesto')
+
+
+def backfill_dimensiones(apps, schema_editor):
+    """
+    Completa usuario y categoria_ref de los totales y presupuestos que no
+    los tienen, igual que 0011 con los gastos: crea las filas de dimensión
+    que falten y actualiza por rangos de CHUNK ids, una transacción por rango
+    """
+    alias = schema_editor.connection.alias
+    Usuario = apps.get_model('gastos', 'Usuario')
+    Categoria = apps.get_model('gastos', 'Categoria')
+    usuario = Subquery(Usuario.objects.filter(numero_telefono=OuterRef('numero_telefono')).values('id')[:1])
+    categoria = Subquery(Categoria.objects.filter(nombre=OuterRef('categoria')).values('id')[:1])
+
+    for nombre in MODELOS:
+        modelo = apps.get_model('gastos', nombre)
+        pendientes = modelo.objects.using(alias).filter(
+            Q(usuario__isnull=True) | Q(categoria_ref__isnull=True)
+        ).order_by()
+
+        Usuario.objects.using(alias).bulk_create(
+            [Usuario(numero_telefono=t) for t in pendientes.values_list('numero_telefono', flat=True).distinct()],
+            batch_size=1000, ignore_conflicts=True
+        )
+        Categoria.objects.using(alias).bulk_create(
+            [Categoria(nombre=c) for c in pendientes.values_list('categoria', flat=True).distinct()],
+            batch_size=1000, ignore_conflicts=True
+        )
+
+        rango = pendientes.aggregate(desde=Min('id'), hasta=Max('id'))
+        if rango['desde'] is None:
+            continue
+        for inicio in range(rango['desde'], rango['hasta'] + 1, CHUNK):
+            with transaction.atomic(using=alias):
+                pendientes.filter(id__gte=inicio, id__lt=inicio + CHUNK).update(
+                    usuario=usuario, categoria_ref=categoria
+                )
+
+
+class Migration(migrations.Migration):
+    """
+    Primer paso de la normalización de los totales diarios y mensuales y de
+    los presupuestos: claves foráneas nulas y carga por lotes. Se puede
+    aplicar con la versión anterior de la app en servicio
+    (``migrate gastos 0014``); 0015 termina el cambio.
+    """
+    atomic = False
+
+    dependencies = [
+        ('gastos', '0013_gastoarchivado_gastohistorico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gastodiario',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, help_text='Usuario de los gastos', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.usuario'),
+        ),
+        migrations.AddField(
+            model_name='gastodiario',
+            name='categoria_ref',
+            field=models.ForeignKey(db_index=False, help_text='Categoría del gasto', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.categoria'),
+        ),
+        migrations.AddField(
+            model_name='gastomensual',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, help_text='Usuario de los gastos', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.usuario'),
+        ),
+        migrations.AddField(
+            model_name='gastomensual',
+            name='categoria_ref',
+            field=models.ForeignKey(db_index=False, help_text='Categoría del gasto', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.categoria'),
+        ),
+        migrations.AddField(
+            model_name='presupuesto',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, help_text='Usuario del presupuesto', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.usuario'),
+        ),
+        migrations.AddField(
+            model_name='presupuesto',
+            name='categoria_ref',
+            field=models.ForeignKey(db_index=False, help_text='Categoría (la misma fila que usan los gastos)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.categoria'),
+        ),
+        migrations.RunPython(backfill_dimensiones, migrations.RunPython.noop),
+    ]
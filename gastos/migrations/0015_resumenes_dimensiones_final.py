@@ -0,0 +1,170 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:40
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+paso_anterior = import_module('gastos.migrations.0014_resumenes_dimensiones')
+backfill_dimensiones = paso_anterior.backfill_dimensiones
+
+
+def restaurar_textos(apps, schema_editor):
+    """
+    Vuelve a cargar el teléfono y la categoría como texto (al revertir)
+    """
+    alias = schema_editor.connection.alias
+    Usuario = apps.get_model('gastos', 'Usuario')
+    Categoria = apps.get_model('gastos', 'Categoria')
+    for nombre in paso_anterior.MODELOS:
+        apps.get_model('gastos', nombre).objects.using(alias).update(
+            numero_telefono=Subquery(Usuario.objects.filter(id=OuterRef('usuario_id')).values('numero_telefono')[:1]),
+            categoria=Subquery(Categoria.objects.filter(id=OuterRef('categoria_ref_id')).values('nombre')[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+    """
+    Último paso (con la versión nueva de la app): completa las filas
+    creadas desde 0014, elimina las columnas de texto y deja las claves
+    foráneas obligatorias, con las restricciones únicas sobre ellas
+    """
+
+    dependencies = [
+        ('gastos', '0014_resumenes_dimensiones'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_dimensiones, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='gastodiario',
+            name='gasto_diario_unico',
+        ),
+        migrations.RemoveConstraint(
+            model_name='gastomensual',
+            name='gasto_mensual_unico',
+        ),
+        migrations.RemoveConstraint(
+            model_name='presupuesto',
+            name='presupuesto_unico',
+        ),
+        # Nulas antes de eliminarlas para que, al revertir, se puedan volver
+        # a agregar y completar desde las dimensiones
+        migrations.AlterField(
+            model_name='gastodiario',
+            name='numero_telefono',
+            field=models.CharField(help_text='Número de teléfono del usuario', max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='gastodiario',
+            name='categoria',
+            field=models.CharField(help_text='Categoría del gasto', max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='gastomensual',
+            name='numero_telefono',
+            field=models.CharField(help_text='Número de teléfono del usuario', max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='gastomensual',
+            name='categoria',
+            field=models.CharField(help_text='Categoría del gasto', max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='presupuesto',
+            name='numero_telefono',
+            field=models.CharField(help_text='Número de teléfono del usuario', max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='presupuesto',
+            name='categoria',
+            field=models.CharField(help_text='Categoría (con el mismo formato que los gastos, ej: Comida)', max_length=100, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restaurar_textos),
+        migrations.RemoveField(
+            model_name='gastodiario',
+            name='numero_telefono',
+        ),
+        migrations.RemoveField(
+            model_name='gastodiario',
+            name='categoria',
+        ),
+        migrations.RenameField(
+            model_name='gastodiario',
+            old_name='categoria_ref',
+            new_name='categoria',
+        ),
+        migrations.RemoveField(
+            model_name='gastomensual',
+            name='numero_telefono',
+        ),
+        migrations.RemoveField(
+            model_name='gastomensual',
+            name='categoria',
+        ),
+        migrations.RenameField(
+            model_name='gastomensual',
+            old_name='categoria_ref',
+            new_name='categoria',
+        ),
+        migrations.RemoveField(
+            model_name='presupuesto',
+            name='numero_telefono',
+        ),
+        migrations.RemoveField(
+            model_name='presupuesto',
+            name='categoria',
+        ),
+        migrations.RenameField(
+            model_name='presupuesto',
+            old_name='categoria_ref',
+            new_name='categoria',
+        ),
+        migrations.AlterField(
+            model_name='gastodiario',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, help_text='Usuario de los gastos', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.usuario'),
+        ),
+        migrations.AlterField(
+            model_name='gastodiario',
+            name='categoria',
+            field=models.ForeignKey(db_index=False, help_text='Categoría del gasto', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.categoria'),
+        ),
+        migrations.AlterField(
+            model_name='gastomensual',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, help_text='Usuario de los gastos', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.usuario'),
+        ),
+        migrations.AlterField(
+            model_name='gastomensual',
+            name='categoria',
+            field=models.ForeignKey(db_index=False, help_text='Categoría del gasto', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.categoria'),
+        ),
+        migrations.AlterField(
+            model_name='presupuesto',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, help_text='Usuario del presupuesto', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.usuario'),
+        ),
+        migrations.AlterField(
+            model_name='presupuesto',
+            name='categoria',
+            field=models.ForeignKey(db_index=False, help_text='Categoría (la misma fila que usan los gastos)', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='gastos.categoria'),
+        ),
+        migrations.AddConstraint(
+            model_name='gastodiario',
+            constraint=models.UniqueConstraint(fields=('usuario', 'dia', 'categoria'), name='gasto_diario_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='gastomensual',
+            constraint=models.UniqueConstraint(fields=('usuario', 'categoria', 'mes'), name='gasto_mensual_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='presupuesto',
+            constraint=models.UniqueConstraint(fields=('usuario', 'categoria'), name='presupuesto_unico'),
+        ),
+        migrations.AlterModelOptions(
+            name='presupuesto',
+            options={'ordering': ['usuario_id', 'categoria_id'], 'verbose_name': 'Presupuesto', 'verbose_name_plural': 'Presupuestos'},
+        ),
+    ]
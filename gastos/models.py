@@ -2,18 +2,71 @@ from django.db import models
 from django.utils import timezone
 
 
-class Gasto(models.Model):
+class Usuario(models.Model):
     """
-    Modelo para registrar gastos personales recibidos vía WhatsApp
+    Teléfono de un usuario. Gasto guarda el id entero en lugar de repetir
+    el número en cada fila (ver gastos/dimensiones.py).
     """
+    id = models.AutoField(primary_key=True)
     numero_telefono = models.CharField(
         max_length=20,
+        unique=True,
         help_text="Número de teléfono del usuario (ej: +5403535123123)"
     )
-    categoria = models.CharField(
+
+    class Meta:
+        ordering = ['numero_telefono']
+        verbose_name = "Usuario"
+        verbose_name_plural = "Usuarios"
+
+    def __str__(self):
+        return self.numero_telefono
+
+
+class Categoria(models.Model):
+    """
+    Nombre de una categoría de gastos, compartido entre usuarios. Gasto
+    guarda el id entero en lugar de repetir el nombre en cada fila.
+    """
+    id = models.AutoField(primary_key=True)
+    nombre = models.CharField(
         max_length=100,
-        help_text="Categoría del gasto (ej: comida, transporte, Netflix)"
+        unique=True,
+        help_text="Categoría del gasto (ej: Comida, Transporte, Netflix)"
     )
+
+    class Meta:
+        ordering = ['nombre']
+        verbose_name = "Categoría"
+        verbose_name_plural = "Categorías"
+
+    def __str__(self):
+        return self.nombre
+
+
+class DimensionesMixin:
+    """
+    Teléfono y nombre de categoría de los modelos con usuario y categoria
+    (gastos, totales y presupuestos)
+    """
+    
+    @property
+    def numero_telefono(self):
+        """Teléfono del usuario, desde la caché de dimensiones (sin join)"""
+        from .dimensiones import usuario_cache
+        return usuario_cache.valor(self.usuario_id)
+    
+    @property
+    def nombre_categoria(self):
+        """Nombre de la categoría, desde la caché de dimensiones (sin join)"""
+        from .dimensiones import categoria_cache
+        return categoria_cache.valor(self.categoria_id)
+
+
+class GastoBase(DimensionesMixin, models.Model):
+    """
+    Campos y propiedades comunes a Gasto, GastoArchivado y GastoHistorico
+    """
     monto = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -26,16 +79,476 @@ class Gasto(models.Model):
     mensaje_original = models.TextField(
         help_text="Mensaje original recibido por WhatsApp"
     )
-    
+
     class Meta:
+        abstract = True
         ordering = ['-fecha']
-        verbose_name = "Gasto"
-        verbose_name_plural = "Gastos"
-    
+
     def __str__(self):
-        return f"{self.categoria}: ${self.monto} - {self.fecha.strftime('%d/%m/%Y')}"
+        return f"{self.nombre_categoria}: ${self.monto} - {self.fecha.strftime('%d/%m/%Y')}"
     
     @property
     def fecha_str(self):
         """Retorna la fecha en formato legible"""
         return self.fecha.strftime('%d/%m/%Y %H:%M')
+
+
+class Gasto(GastoBase):
+    """
+    Modelo para registrar gastos personales recibidos vía WhatsApp.
+
+    Los gastos más viejos que el corte del archivo se mueven a
+    GastoArchivado (comando ``archive_gastos``).
+    """
+    # Sin índices propios: los compuestos de Meta.indexes empiezan por usuario
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name='gastos',
+        help_text="Usuario que registró el gasto"
+    )
+    categoria = models.ForeignKey(
+        Categoria,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name='gastos',
+        help_text="Categoría del gasto"
+    )
+    
+    class Meta(GastoBase.Meta):
+        verbose_name = "Gasto"
+        verbose_name_plural = "Gastos"
+        indexes = [
+            # Todas las consultas por usuario filtran por usuario y ordenan
+            # o filtran por rango de fecha
+            models.Index(fields=['usuario', 'fecha'], name='gasto_usuario_fecha_idx'),
+            models.Index(fields=['usuario', 'categoria', 'fecha'], name='gasto_usuario_cat_fecha_idx'),
+            # Paginación por cursor de la API sin filtro de teléfono
+            models.Index(fields=['-fecha', '-id'], name='gasto_fecha_id_idx'),
+        ]
+
+
+class GastoArchivado(GastoBase):
+    """
+    Gasto movido al archivo (conserva el id original). Tiene los mismos
+    índices que Gasto para que las lecturas de GastoHistorico los usen en
+    las dos tablas.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name='+',
+        help_text="Usuario que registró el gasto"
+    )
+    categoria = models.ForeignKey(
+        Categoria,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name='+',
+        help_text="Categoría del gasto"
+    )
+
+    class Meta(GastoBase.Meta):
+        verbose_name = "Gasto archivado"
+        verbose_name_plural = "Gastos archivados"
+        indexes = [
+            models.Index(fields=['usuario', 'fecha'], name='archivado_usuario_fecha_idx'),
+            models.Index(fields=['usuario', 'categoria', 'fecha'], name='archivado_usuario_cat_idx'),
+            models.Index(fields=['-fecha', '-id'], name='archivado_fecha_id_idx'),
+        ]
+
+
+class GastoHistorico(GastoBase):
+    """
+    Vista de solo lectura con todos los gastos (Gasto UNION ALL
+    GastoArchivado). Solo se consulta cuando el rango pedido empieza antes
+    del corte del archivo (ver gastos/archivo.py).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+    categoria = models.ForeignKey(
+        Categoria,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+
+    class Meta(GastoBase.Meta):
+        managed = False
+        db_table = 'gastos_gastohistorico'
+        verbose_name = "Gasto (histórico)"
+        verbose_name_plural = "Gastos (histórico)"
+
+
+class CorteArchivo(models.Model):
+    """
+    Fila única con el corte del archivo: los gastos anteriores pueden estar
+    en GastoArchivado. Solo avanza.
+    """
+    corte = models.DateTimeField(
+        help_text="Los gastos anteriores a esta fecha pueden estar archivados"
+    )
+    actualizado = models.DateTimeField(
+        auto_now=True,
+        help_text="Última modificación"
+    )
+
+    class Meta:
+        verbose_name = "Corte del archivo"
+        verbose_name_plural = "Corte del archivo"
+
+    def __str__(self):
+        return f"Archivo hasta {self.corte:%d/%m/%Y}"
+
+
+class GastoDiario(DimensionesMixin, models.Model):
+    """
+    Totales diarios de gastos por usuario y categoría.
+
+    Los mantiene GastoService en la misma transacción que crea o elimina
+    cada gasto; el comando ``rebuild_resumen_diario`` los recalcula.
+    """
+    # Sin índice propio: la restricción única empieza por usuario
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name='+',
+        help_text="Usuario de los gastos"
+    )
+    dia = models.DateField(
+        help_text="Día del gasto (hora local)"
+    )
+    categoria = models.ForeignKey(
+        Categoria,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name='+',
+        help_text="Categoría del gasto"
+    )
+    total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        help_text="Suma de los montos del día"
+    )
+    cantidad = models.PositiveIntegerField(
+        default=0,
+        help_text="Cantidad de gastos del día"
+    )
+
+    class Meta:
+        ordering = ['-dia']
+        verbose_name = "Gasto diario"
+        verbose_name_plural = "Gastos diarios"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'dia', 'categoria'],
+                name='gasto_diario_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.numero_telefono} {self.dia} {self.nombre_categoria}: ${self.total} ({self.cantidad})"
+
+
+class GastoMensual(DimensionesMixin, models.Model):
+    """
+    Totales mensuales de gastos por usuario y categoría.
+
+    Se mantienen igual que GastoDiario (en la transacción de cada gasto) y
+    permiten controlar un presupuesto leyendo una sola fila.
+    """
+    # Sin índice propio: la restricción única empieza por usuario
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name='+',
+        help_text="Usuario de los gastos"
+    )
+    mes = models.DateField(
+        help_text="Primer día del mes (hora local)"
+    )
+    categoria = models.ForeignKey(
+        Categoria,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name='+',
+        help_text="Categoría del gasto"
+    )
+    total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        help_text="Suma de los montos del mes"
+    )
+    cantidad = models.PositiveIntegerField(
+        default=0,
+        help_text="Cantidad de gastos del mes"
+    )
+
+    class Meta:
+        ordering = ['-mes']
+        verbose_name = "Gasto mensual"
+        verbose_name_plural = "Gastos mensuales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'categoria', 'mes'],
+                name='gasto_mensual_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.numero_telefono} {self.mes:%m/%Y} {self.nombre_categoria}: ${self.total} ({self.cantidad})"
+
+
+class Importacion(models.Model):
+    """
+    Progreso de una importación masiva (comando ``import_gastos``).
+
+    Se actualiza en la misma transacción que cada lote, por lo que una
+    importación interrumpida se retoma exactamente desde el último lote
+    confirmado.
+    """
+    clave = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="Identificador de la importación (por defecto, la ruta del archivo)"
+    )
+    filas_procesadas = models.PositiveIntegerField(
+        default=0,
+        help_text="Registros del archivo ya procesados"
+    )
+    importados = models.PositiveIntegerField(
+        default=0,
+        help_text="Gastos creados"
+    )
+    rechazados = models.PositiveIntegerField(
+        default=0,
+        help_text="Registros inválidos descartados"
+    )
+    completada = models.BooleanField(
+        default=False,
+        help_text="La importación llegó al final del archivo"
+    )
+    actualizado = models.DateTimeField(
+        auto_now=True,
+        help_text="Último lote confirmado"
+    )
+
+    class Meta:
+        verbose_name = "Importación"
+        verbose_name_plural = "Importaciones"
+
+    def __str__(self):
+        return f"{self.clave}: {self.importados} importados, {self.rechazados} rechazados"
+
+
+class MensajeSaliente(models.Model):
+    """
+    Respuesta de WhatsApp pendiente de envío (outbox).
+
+    Se escribe en la misma transacción que procesa el mensaje entrante y la
+    envía luego el comando ``dispatch_outbox``, fuera del ciclo del webhook.
+    """
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_ENVIANDO = 'enviando'
+    ESTADO_ENVIADO = 'enviado'
+    ESTADO_FALLIDO = 'fallido'
+    ESTADOS = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_ENVIANDO, 'Enviando'),
+        (ESTADO_ENVIADO, 'Enviado'),
+        (ESTADO_FALLIDO, 'Fallido'),
+    ]
+
+    numero_telefono = models.CharField(
+        max_length=20,
+        help_text="Número de teléfono destino"
+    )
+    cuerpo = models.TextField(
+        help_text="Texto de la respuesta a enviar"
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS,
+        default=ESTADO_PENDIENTE,
+        help_text="Estado del envío"
+    )
+    intentos = models.PositiveIntegerField(
+        default=0,
+        help_text="Cantidad de intentos de envío realizados"
+    )
+    creado = models.DateTimeField(
+        default=timezone.now,
+        help_text="Fecha y hora en que se encoló la respuesta"
+    )
+    proximo_intento = models.DateTimeField(
+        default=timezone.now,
+        help_text="Momento a partir del cual el mensaje puede (re)intentarse"
+    )
+    enviado = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Fecha y hora del envío exitoso"
+    )
+    message_sid = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="SID devuelto por Twilio"
+    )
+    ultimo_error = models.TextField(
+        blank=True,
+        help_text="Último error de envío"
+    )
+
+    class Meta:
+        ordering = ['creado']
+        verbose_name = "Mensaje saliente"
+        verbose_name_plural = "Mensajes salientes"
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='outbox_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.numero_telefono} [{self.estado}]: {self.cuerpo[:40]}"
+
+
+class TelefonoAutorizado(models.Model):
+    """
+    Número de teléfono habilitado para registrar gastos.
+
+    Se guarda normalizado (solo dígitos y '+'); los procesos lo leen desde
+    un conjunto en memoria (ver gastos/telefonos.py) que se recarga cuando
+    cambia la tabla.
+    """
+    numero_telefono = models.CharField(
+        max_length=20,
+        unique=True,
+        help_text="Número autorizado (ej: +5403535123123)"
+    )
+    nombre = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Nombre de referencia del usuario"
+    )
+    activo = models.BooleanField(
+        default=True,
+        help_text="Si está desactivado, los mensajes del número se rechazan"
+    )
+    creado = models.DateTimeField(
+        default=timezone.now,
+        help_text="Fecha y hora de alta"
+    )
+
+    class Meta:
+        ordering = ['numero_telefono']
+        verbose_name = "Teléfono autorizado"
+        verbose_name_plural = "Teléfonos autorizados"
+
+    def __str__(self):
+        estado = '' if self.activo else ' (inactivo)'
+        return f"{self.numero_telefono} {self.nombre}".strip() + estado
+
+    def save(self, *args, **kwargs):
+        from .telefonos import normalize_phone
+        self.numero_telefono = normalize_phone(self.numero_telefono)
+        super().save(*args, **kwargs)
+
+
+class MensajeEntrante(models.Model):
+    """
+    Mensaje de WhatsApp ya procesado, por MessageSid de Twilio.
+
+    Cuando Twilio reintenta un webhook se devuelve la respuesta guardada
+    en lugar de procesar el mensaje otra vez. Los registros viejos se
+    eliminan con ``purge_mensajes_entrantes``.
+    """
+    message_sid = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="MessageSid del mensaje recibido"
+    )
+    numero_telefono = models.CharField(
+        max_length=20,
+        help_text="Número de teléfono del remitente"
+    )
+    respuesta = models.TextField(
+        blank=True,
+        help_text="Respuesta generada para el mensaje"
+    )
+    mensaje_saliente = models.ForeignKey(
+        MensajeSaliente,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        help_text="Respuesta encolada en el outbox (modo outbox)"
+    )
+    procesado = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        help_text="Fecha y hora en que se procesó el mensaje"
+    )
+
+    class Meta:
+        ordering = ['-procesado']
+        verbose_name = "Mensaje entrante"
+        verbose_name_plural = "Mensajes entrantes"
+
+    def __str__(self):
+        return f"{self.message_sid} ({self.numero_telefono})"
+
+
+class Presupuesto(DimensionesMixin, models.Model):
+    """
+    Presupuesto mensual de un usuario para una categoría
+    ("presupuesto comida 50000" por WhatsApp)
+    """
+    # Sin índice propio: la restricción única empieza por usuario
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name='+',
+        help_text="Usuario del presupuesto"
+    )
+    categoria = models.ForeignKey(
+        Categoria,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name='+',
+        help_text="Categoría (la misma fila que usan los gastos)"
+    )
+    monto = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        help_text="Monto máximo por mes"
+    )
+    actualizado = models.DateTimeField(
+        auto_now=True,
+        help_text="Última modificación"
+    )
+
+    class Meta:
+        ordering = ['usuario_id', 'categoria_id']
+        verbose_name = "Presupuesto"
+        verbose_name_plural = "Presupuestos"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'categoria'],
+                name='presupuesto_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.numero_telefono} {self.nombre_categoria}: ${self.monto} por mes"
@@ -0,0 +1,95 @@
+"""
+Paginación por cursor (keyset) para la API de gastos
+"""
+
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class GastoCursorPagination(BasePagination):
+    """
+    Paginación por cursor sobre (fecha, id) descendente.
+
+    En lugar de OFFSET, cada página filtra "después de la última fila
+    vista", así una página profunda cuesta lo mismo que la primera y
+    los gastos nuevos no desplazan los resultados.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-fecha', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._set_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Igual que paginate_queryset, con el ORM async (vistas ASGI)
+        """
+        return self._set_page([gasto async for gasto in self._page_queryset(queryset, request)])
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            fecha, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=pk))
+
+        # Se pide una fila extra para saber si hay página siguiente
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, page):
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, settings.API_PAGE_SIZE))
+        except ValueError:
+            page_size = settings.API_PAGE_SIZE
+        return max(1, min(page_size, settings.API_MAX_PAGE_SIZE))
+
+    def encode_cursor(self, gasto):
+        data = json.dumps({'f': gasto.fecha.isoformat(), 'i': gasto.id}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            fecha = parse_datetime(data['f'])
+            pk = int(data['i'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound('Cursor inválido')
+        if fecha is None:
+            raise NotFound('Cursor inválido')
+        return fecha, pk
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'page_size': self.page_size,
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
@@ -0,0 +1,58 @@
+"""
+Conteo de consultas SQL por request, sin DEBUG.
+
+Cada conexión nueva recibe un execute_wrapper que suma en el contador del
+contexto actual. El contador es un objeto mutable en un ContextVar, así
+que también cuenta las consultas de las vistas async (que corren en otro
+hilo con una copia del contexto).
+"""
+
+import contextvars
+import time
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_counter = contextvars.ContextVar('query_counter', default=None)
+
+
+class QueryCounter:
+    """
+    Cuenta las consultas ejecutadas dentro del bloque ``with`` y el tiempo
+    que tardaron. Los contadores anidados suman también en el de afuera.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0.0
+        self._parent = None
+        self._token = None
+
+    def __enter__(self):
+        self._parent = _counter.get()
+        self._token = _counter.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _counter.reset(self._token)
+        if self._parent is not None:
+            self._parent.count += self.count
+            self._parent.elapsed += self.elapsed
+
+
+def count_queries(execute, sql, params, many, context):
+    counter = _counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter.count += 1
+        counter.elapsed += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def _install(connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
@@ -0,0 +1,97 @@
+"""
+Réplicas de lectura.
+
+Las escrituras y todo lo que no se marque explícitamente van a la base
+principal. Las lecturas que toleran unos segundos de atraso (listado,
+detalle y exportación de la API, estadísticas y resúmenes) se hacen dentro
+de ``lectura(phone_number)`` y ReplicaRouter las manda a una de
+DATABASE_REPLICAS, salvo que:
+
+- haya una transacción abierta en la base principal (se lee lo que la
+  transacción ya escribió), o
+- el teléfono haya registrado o eliminado un gasto en los últimos
+  REPLICA_STICKY_SECONDS (read-your-writes). La marca se guarda en el cache
+  default, que tiene que ser compartido entre procesos (gastos.E001 en
+  checks.py).
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+# Si las lecturas del contexto actual pueden ir a una réplica
+_lectura_replica = ContextVar('lectura_replica', default=False)
+
+_ESCRITURA_PREFIX = 'replicas:escritura:'
+
+stats_lecturas = {'replica': 0, 'sticky': 0}
+
+
+def escribio_hace_poco(phone_number):
+    return caches['default'].get(_ESCRITURA_PREFIX + phone_number) is not None
+
+
+def registrar_escritura(phone_number):
+    """
+    Lleva las lecturas del teléfono a la base principal durante
+    REPLICA_STICKY_SECONDS desde que se confirma la transacción actual
+    """
+    if settings.DATABASE_REPLICAS:
+        transaction.on_commit(lambda: caches['default'].set(
+            _ESCRITURA_PREFIX + phone_number, 1, settings.REPLICA_STICKY_SECONDS
+        ))
+
+
+@contextmanager
+def lectura(phone_number=None):
+    """
+    Las lecturas dentro del bloque pueden ir a una réplica
+    """
+    usar = bool(settings.DATABASE_REPLICAS)
+    if usar and phone_number and escribio_hace_poco(phone_number):
+        stats_lecturas['sticky'] += 1
+        usar = False
+    token = _lectura_replica.set(usar)
+    try:
+        yield
+    finally:
+        _lectura_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Router de Django: lecturas marcadas a una réplica al azar, el resto a
+    la base principal. No migra las réplicas (se replican desde la principal).
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _lectura_replica.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        stats_lecturas['replica'] += 1
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        # Un objeto leído de una réplica se guarda en la principal
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def replica_stats():
+    return {'replicas': list(settings.DATABASE_REPLICAS), 'lecturas': dict(stats_lecturas)}
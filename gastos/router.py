@@ -0,0 +1,63 @@
+"""
+Ruteo de mensajes de WhatsApp a comandos (intents)
+"""
+
+import re
+
+# Patrones compilados una sola vez; se aplican sobre el texto normalizado
+GASTO_PATTERN = re.compile(r'^(.+?)\s+(\d+(?:\.\d+)?)$')
+DELETE_ID_PATTERN = re.compile(r'^(eliminar|borrar)\s+(\d+)$')
+DELETE_LAST_PATTERN = re.compile(r'^(eliminar|borrar)\s+(ultimo|último)$')
+RESUMEN_RANGO_PATTERN = re.compile(r'resumen\s+(\d{1,2}-\d{1,2})\s+al\s+(\d{1,2}-\d{1,2})')
+
+
+def normalize(message):
+    """
+    Normalización única del mensaje: sin espacios en los extremos y en minúsculas
+    """
+    return message.strip().lower()
+
+
+class CommandRouter:
+    """
+    Registro de intents con despacho por frase exacta o primera palabra.
+
+    Recibe el mensaje ya normalizado (normalize, una vez por mensaje en
+    MessageProcessor) y lo resuelve con dos búsquedas en diccionarios, sin
+    importar cuántos comandos haya registrados; lo que no coincide va al
+    intent por defecto.
+    """
+
+    def __init__(self, default='gasto'):
+        self.default = default
+        self._phrases = {}
+        self._tokens = {}
+
+    def register(self, intent, tokens=(), phrases=()):
+        """
+        Registra un intent por sus primeras palabras y/o frases exactas
+        """
+        for token in tokens:
+            self._tokens[normalize(token)] = intent
+        for phrase in phrases:
+            self._phrases[normalize(phrase)] = intent
+
+    @property
+    def intents(self):
+        return sorted({self.default, *self._tokens.values(), *self._phrases.values()})
+
+    def route(self, text):
+        """
+        Retorna el intent del texto (ya pasado por normalize)
+        """
+        intent = self._phrases.get(text)
+        if intent is None:
+            intent = self._tokens.get(text.partition(' ')[0], self.default)
+        return intent
+
+
+router = CommandRouter()
+router.register('listar', phrases=['mis gastos', 'gastos', 'ver gastos'])
+router.register('resumen', tokens=['resumen'])
+router.register('eliminar', tokens=['eliminar', 'borrar'])
+router.register('presupuesto', tokens=['presupuesto', 'presupuestos'])
@@ -1,17 +1,36 @@
 from rest_framework import serializers
-from .models import Gasto
+from .dimensiones import categoria_cache, usuario_cache
+from .models import Gasto, TelefonoAutorizado
+from .telefonos import normalize_phone
+
+
+class GastoListSerializer(serializers.ListSerializer):
+    """
+    Carga en la caché de dimensiones, con una consulta por tabla, los
+    teléfonos y categorías de la página que falten
+    """
+    
+    def to_representation(self, data):
+        gastos = list(data.all() if hasattr(data, 'all') else data)
+        usuario_cache.valores({gasto.usuario_id for gasto in gastos})
+        categoria_cache.valores({gasto.categoria_id for gasto in gastos})
+        return super().to_representation(gastos)
 
 
 class GastoSerializer(serializers.ModelSerializer):
     """
-    Serializer para el modelo Gasto
+    Serializer para el modelo Gasto. El teléfono y la categoría se leen de
+    la caché de dimensiones en lugar de hacer un join.
     """
+    numero_telefono = serializers.ReadOnlyField()
+    categoria = serializers.ReadOnlyField(source='nombre_categoria')
     fecha_str = serializers.ReadOnlyField()
     
     class Meta:
         model = Gasto
         fields = ['id', 'numero_telefono', 'categoria', 'monto', 'fecha', 'fecha_str', 'mensaje_original']
         read_only_fields = ['id', 'fecha']
+        list_serializer_class = GastoListSerializer
 
 
 class ResumenGastosSerializer(serializers.Serializer):
@@ -21,4 +40,29 @@ class ResumenGastosSerializer(serializers.Serializer):
     total_gastado = serializers.DecimalField(max_digits=10, decimal_places=2)
     periodo = serializers.CharField()
     gastos_por_categoria = serializers.DictField()
+    cantidad_por_categoria = serializers.DictField()
     cantidad_gastos = serializers.IntegerField()
+
+
+class TelefonoAutorizadoSerializer(serializers.ModelSerializer):
+    """
+    Serializer para los teléfonos autorizados
+    """
+    
+    class Meta:
+        model = TelefonoAutorizado
+        fields = ['id', 'numero_telefono', 'nombre', 'activo', 'creado']
+        read_only_fields = ['id', 'creado']
+        # La unicidad se valida sobre el número ya normalizado
+        extra_kwargs = {'numero_telefono': {'validators': []}}
+    
+    def validate_numero_telefono(self, value):
+        numero = normalize_phone(value)
+        if len(numero.lstrip('+')) < 6:
+            raise serializers.ValidationError('Número de teléfono inválido')
+        existentes = TelefonoAutorizado.objects.filter(numero_telefono=numero)
+        if self.instance is not None:
+            existentes = existentes.exclude(pk=self.instance.pk)
+        if existentes.exists():
+            raise serializers.ValidationError('El número ya está registrado')
+        return numero
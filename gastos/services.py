@@ -2,16 +2,32 @@
 Servicios para procesar mensajes de WhatsApp y gestionar gastos
 """
 
-import re
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal, InvalidOperation
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from django.utils import timezone
-from django.db.models import Sum
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
 from django.conf import settings
-from twilio.rest import Client
 import logging
 
-from .models import Gasto
+from .archivo import archivo
+from .cache import resumen_cache
+from .categorias import categoria_resolver
+from .dimensiones import categoria_cache, usuario_cache
+from .metrics import count_cache, time_twilio
+from .replicas import lectura, registrar_escritura
+from .models import Gasto, GastoArchivado, GastoDiario, GastoHistorico, GastoMensual, MensajeEntrante, MensajeSaliente, Presupuesto
+from .router import (
+    DELETE_ID_PATTERN, DELETE_LAST_PATTERN, GASTO_PATTERN, RESUMEN_RANGO_PATTERN, normalize, router
+)
+from .telefonos import telefonos_autorizados
+from .twilio_client import get_async_client, get_client
 
 logger = logging.getLogger('gastos')
 
@@ -21,15 +37,12 @@ class WhatsAppService:
     Servicio para gestionar mensajes de WhatsApp via Twilio
     """
     
-    def __init__(self):
+    def __init__(self, client=None):
+        if client is not None:
+            self.client = client
+            return
         try:
-            # Verificar que las credenciales estén configuradas
-            if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
-                logger.error("Credenciales de Twilio no configuradas")
-                self.client = None
-            else:
-                self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-                logger.info("Cliente de Twilio inicializado correctamente")
+            self.client = get_client()
         except Exception as e:
             logger.error(f"Error inicializando cliente de Twilio: {str(e)}")
             self.client = None
@@ -43,16 +56,445 @@ class WhatsAppService:
             return False
             
         try:
+            self.deliver(to_number, message)
+            return True
+        except Exception as e:
+            logger.error(f"Error enviando mensaje a {to_number}: {str(e)}")
+            return False
+    
+    def deliver(self, to_number, message):
+        """
+        Envía un mensaje de WhatsApp y retorna el SID de Twilio.
+        A diferencia de send_message, propaga los errores.
+        """
+        if not self.client:
+            raise RuntimeError("Cliente de Twilio no disponible")
+        
+        with time_twilio('sync'):
             message_obj = self.client.messages.create(
                 body=message,
                 from_=settings.TWILIO_WHATSAPP_NUMBER,
                 to=f'whatsapp:{to_number}'
             )
-            logger.info(f"Mensaje enviado a {to_number}: {message_obj.sid}")
+        logger.info(f"Mensaje enviado a {to_number}: {message_obj.sid}")
+        return message_obj.sid
+
+
+class AsyncWhatsAppService:
+    """
+    Versión async de WhatsAppService para las vistas ASGI (aiohttp)
+    """
+    
+    def __init__(self, client=None):
+        self.client = client if client is not None else get_async_client()
+    
+    async def send_message(self, to_number, message):
+        """
+        Envía un mensaje de WhatsApp sin bloquear el event loop
+        """
+        if not self.client:
+            logger.error("Cliente de Twilio no disponible")
+            return False
+        
+        try:
+            await self.deliver(to_number, message)
             return True
         except Exception as e:
             logger.error(f"Error enviando mensaje a {to_number}: {str(e)}")
             return False
+    
+    async def deliver(self, to_number, message):
+        """
+        Envía un mensaje de WhatsApp y retorna el SID de Twilio (propaga los errores)
+        """
+        if not self.client:
+            raise RuntimeError("Cliente de Twilio no disponible")
+        
+        with time_twilio('async'):
+            message_obj = await self.client.messages.create_async(
+                body=message,
+                from_=settings.TWILIO_WHATSAPP_NUMBER,
+                to=f'whatsapp:{to_number}'
+            )
+        logger.info(f"Mensaje enviado a {to_number}: {message_obj.sid}")
+        return message_obj.sid
+
+
+class OutboxService:
+    """
+    Servicio para encolar respuestas y despacharlas en lotes
+    """
+    
+    @staticmethod
+    def enqueue(phone_number, message):
+        """
+        Encola una respuesta. Debe llamarse dentro de la misma transacción
+        que procesa el mensaje entrante.
+        """
+        return MensajeSaliente.objects.create(numero_telefono=phone_number, cuerpo=message)
+    
+    @staticmethod
+    def claim_batch(batch_size):
+        """
+        Reserva hasta batch_size mensajes listos para enviar.
+        Los mensajes reservados quedan en estado 'enviando' durante
+        OUTBOX_LEASE_SECONDS; si el despachador muere se vuelven a tomar.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            mensajes = list(
+                MensajeSaliente.objects
+                .select_for_update(skip_locked=True)
+                .filter(
+                    estado__in=[MensajeSaliente.ESTADO_PENDIENTE, MensajeSaliente.ESTADO_ENVIANDO],
+                    proximo_intento__lte=now
+                )
+                .order_by('proximo_intento')[:batch_size]
+            )
+            if mensajes:
+                MensajeSaliente.objects.filter(id__in=[m.id for m in mensajes]).update(
+                    estado=MensajeSaliente.ESTADO_ENVIANDO,
+                    proximo_intento=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+                    intentos=F('intentos') + 1
+                )
+        for mensaje in mensajes:
+            mensaje.intentos += 1
+        return mensajes
+    
+    @staticmethod
+    def dispatch_batch(whatsapp_service, batch_size=None, concurrency=None):
+        """
+        Envía un lote de mensajes pendientes usando un pool de hilos.
+        Los hilos solo hablan con Twilio; el estado se guarda desde el hilo
+        principal. Retorna la cantidad de (enviados, fallidos).
+        """
+        batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        concurrency = concurrency or settings.OUTBOX_CONCURRENCY
+        
+        mensajes = OutboxService.claim_batch(batch_size)
+        if not mensajes:
+            return 0, 0
+        
+        def send(mensaje):
+            try:
+                return whatsapp_service.deliver(mensaje.numero_telefono, mensaje.cuerpo), None
+            except Exception as e:
+                return None, str(e)
+        
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(mensajes))) as executor:
+            results = list(executor.map(send, mensajes))
+        
+        enviados = fallidos = 0
+        now = timezone.now()
+        for mensaje, (sid, error) in zip(mensajes, results):
+            if error is None:
+                MensajeSaliente.objects.filter(id=mensaje.id).update(
+                    estado=MensajeSaliente.ESTADO_ENVIADO,
+                    enviado=now,
+                    message_sid=sid or '',
+                    ultimo_error=''
+                )
+                enviados += 1
+                continue
+            
+            fallidos += 1
+            logger.error(f"Error enviando mensaje {mensaje.id}: {error}")
+            if mensaje.intentos >= settings.OUTBOX_MAX_INTENTOS:
+                estado = MensajeSaliente.ESTADO_FALLIDO
+                proximo_intento = now
+            else:
+                estado = MensajeSaliente.ESTADO_PENDIENTE
+                backoff = settings.OUTBOX_BACKOFF_SECONDS * 2 ** (mensaje.intentos - 1)
+                proximo_intento = now + timedelta(seconds=backoff)
+            MensajeSaliente.objects.filter(id=mensaje.id).update(
+                estado=estado,
+                proximo_intento=proximo_intento,
+                ultimo_error=error
+            )
+        
+        return enviados, fallidos
+
+
+class IdempotenciaService:
+    """
+    Procesa cada MessageSid de Twilio una sola vez; los reintentos
+    reciben la respuesta original
+    """
+    
+    CACHE_PREFIX = 'webhook:sid:'
+    
+    @staticmethod
+    def procesar_una_vez(message_sid, phone_number, procesar):
+        """
+        Ejecuta procesar() -> (respuesta, mensaje_saliente) si el MessageSid
+        es nuevo. Retorna (respuesta, outbox_id, duplicado).
+        
+        El registro se inserta antes de procesar y en la misma transacción:
+        un reintento concurrente espera en la restricción unique y, cuando
+        la primera confirma, lee su respuesta. Si el procesamiento falla se
+        deshace todo y el reintento vuelve a procesar.
+        """
+        cache = caches['default']
+        key = IdempotenciaService.CACHE_PREFIX + message_sid
+        resultado = cache.get(key)
+        count_cache('idempotencia', resultado is not None)
+        if resultado is not None:
+            return resultado[0], resultado[1], True
+        
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    registro = MensajeEntrante.objects.create(
+                        message_sid=message_sid, numero_telefono=phone_number
+                    )
+            except IntegrityError:
+                registro = MensajeEntrante.objects.get(message_sid=message_sid)
+                resultado = (registro.respuesta, registro.mensaje_saliente_id)
+                cache.set(key, resultado, settings.WEBHOOK_IDEMPOTENCY_CACHE_SECONDS)
+                return resultado[0], resultado[1], True
+            
+            respuesta, mensaje_saliente = procesar()
+            registro.respuesta = respuesta
+            registro.mensaje_saliente = mensaje_saliente
+            registro.save(update_fields=['respuesta', 'mensaje_saliente'])
+            
+            resultado = (respuesta, registro.mensaje_saliente_id)
+            transaction.on_commit(
+                lambda: cache.set(key, resultado, settings.WEBHOOK_IDEMPOTENCY_CACHE_SECONDS)
+            )
+        return resultado[0], resultado[1], False
+    
+    @staticmethod
+    def purgar(horas=None):
+        """
+        Elimina los mensajes procesados hace más de WEBHOOK_IDEMPOTENCY_TTL_HOURS.
+        Retorna la cantidad eliminada.
+        """
+        horas = settings.WEBHOOK_IDEMPOTENCY_TTL_HOURS if horas is None else horas
+        limite = timezone.now() - timedelta(hours=horas)
+        eliminados, _ = MensajeEntrante.objects.filter(procesado__lt=limite).delete()
+        return eliminados
+
+
+class ResumenDiarioService:
+    """
+    Mantiene los totales diarios (GastoDiario) usados por los resúmenes
+    """
+    
+    @staticmethod
+    def registrar(gasto, signo=1):
+        """
+        Suma (signo=1) o resta (signo=-1) un gasto en su fila diaria.
+        Debe llamarse dentro de la transacción que crea o elimina el gasto.
+        """
+        ResumenDiarioService._aplicar(
+            gasto.usuario_id,
+            timezone.localdate(gasto.fecha),
+            gasto.categoria_id,
+            signo * gasto.monto,
+            signo
+        )
+        resumen_cache.invalidate(gasto.numero_telefono)
+        registrar_escritura(gasto.numero_telefono)
+    
+    @staticmethod
+    def registrar_lote(gastos):
+        """
+        Suma un lote de gastos nuevos (ej: creados con bulk_create),
+        con una actualización por día y categoría en lugar de una por gasto
+        """
+        grupos = {}
+        for gasto in gastos:
+            clave = (gasto.usuario_id, timezone.localdate(gasto.fecha), gasto.categoria_id)
+            total, cantidad = grupos.get(clave, (Decimal('0'), 0))
+            grupos[clave] = (total + gasto.monto, cantidad + 1)
+        
+        for (usuario_id, dia, categoria_id), (total, cantidad) in grupos.items():
+            ResumenDiarioService._aplicar(usuario_id, dia, categoria_id, total, cantidad)
+        for phone_number in usuario_cache.valores({usuario_id for usuario_id, _, _ in grupos}).values():
+            resumen_cache.invalidate(phone_number)
+            registrar_escritura(phone_number)
+    
+    @staticmethod
+    def _aplicar(usuario_id, dia, categoria_id, monto, cantidad):
+        # El total diario y el mensual (presupuestos) se mueven juntos
+        ResumenDiarioService._sumar(
+            GastoDiario, {'usuario_id': usuario_id, 'dia': dia, 'categoria_id': categoria_id},
+            monto, cantidad
+        )
+        ResumenDiarioService._sumar(
+            GastoMensual, {'usuario_id': usuario_id, 'mes': dia.replace(day=1), 'categoria_id': categoria_id},
+            monto, cantidad
+        )
+    
+    @staticmethod
+    def _sumar(modelo, clave, monto, cantidad):
+        cambios = {'total': F('total') + monto, 'cantidad': F('cantidad') + cantidad}
+        if cantidad > 0 and not modelo.objects.filter(**clave).update(**cambios):
+            fila, creada = modelo.objects.get_or_create(
+                **clave, defaults={'total': monto, 'cantidad': cantidad}
+            )
+            if not creada:
+                modelo.objects.filter(pk=fila.pk).update(**cambios)
+        elif cantidad < 0:
+            modelo.objects.filter(**clave).update(**cambios)
+            modelo.objects.filter(**clave, cantidad=0).delete()
+    
+    @staticmethod
+    def descontar(gasto):
+        """
+        Resta un gasto eliminado de su fila diaria
+        """
+        ResumenDiarioService.registrar(gasto, signo=-1)
+    
+    @staticmethod
+    def rebuild(phone_number=None):
+        """
+        Recalcula los totales diarios y mensuales desde los gastos (de un
+        teléfono o de todos), incluidos los archivados. Retorna la cantidad
+        de filas diarias generadas.
+        """
+        gastos = archivo.modelo().objects.order_by()
+        diarios = GastoDiario.objects.all()
+        if phone_number:
+            usuario_id = usuario_cache.id(phone_number)
+            gastos = gastos.filter(usuario_id=usuario_id)
+            diarios = diarios.filter(usuario_id=usuario_id)
+        
+        filas = gastos.values('usuario_id', 'categoria_id', dia=TruncDate('fecha')).annotate(
+            total=Sum('monto'),
+            cantidad=Count('id')
+        )
+        with transaction.atomic():
+            diarios.delete()
+            creadas = GastoDiario.objects.bulk_create(
+                (
+                    GastoDiario(**fila) for fila in filas.iterator(chunk_size=2000)
+                ),
+                batch_size=1000
+            )
+            mensuales = GastoMensual.objects.all()
+            if phone_number:
+                mensuales = mensuales.filter(usuario_id=usuario_id)
+            mensuales.delete()
+            GastoMensual.objects.bulk_create(
+                (
+                    GastoMensual(**fila) for fila in
+                    diarios.values('usuario_id', 'categoria_id', mes=TruncMonth('dia')).annotate(
+                        total=Sum('total'), cantidad=Sum('cantidad')
+                    ).order_by().iterator(chunk_size=2000)
+                ),
+                batch_size=1000
+            )
+        if phone_number:
+            resumen_cache.invalidate(phone_number)
+        else:
+            resumen_cache.clear()
+        return len(creadas)
+    
+    @staticmethod
+    def summarize(phone_number, primer_dia, ultimo_dia):
+        """
+        Resumen de los días completos entre primer_dia y ultimo_dia
+        """
+        diarios = GastoDiario.objects.filter(
+            usuario_id=usuario_cache.id(phone_number),
+            dia__range=[primer_dia, ultimo_dia]
+        )
+        return GastoService.summarize(diarios, total=Sum('total'), cantidad=Sum('cantidad'))
+
+
+class PresupuestoService:
+    """
+    Presupuestos mensuales por categoría.
+    
+    Lo gastado en el mes sale de GastoMensual, que se actualiza en la misma
+    transacción que cada gasto: controlar un presupuesto es una consulta
+    por índice único, sin volver a sumar los gastos del mes.
+    """
+    
+    CENTAVOS = Decimal('0.01')
+    
+    @staticmethod
+    def definir(phone_number, categoria, monto):
+        """
+        Crea o actualiza el presupuesto; con monto 0 lo elimina.
+        Retorna el presupuesto (o None si se eliminó).
+        """
+        if not monto:
+            Presupuesto.objects.filter(
+                usuario_id=usuario_cache.id(phone_number), categoria_id=categoria_cache.id(categoria)
+            ).delete()
+            return None
+        presupuesto, _ = Presupuesto.objects.update_or_create(
+            usuario_id=usuario_cache.id(phone_number, crear=True),
+            categoria_id=categoria_cache.id(categoria, crear=True),
+            defaults={'monto': monto}
+        )
+        return presupuesto
+    
+    @staticmethod
+    def _con_gastado(presupuestos, dia=None):
+        mes = (dia or timezone.localdate()).replace(day=1)
+        gastado = GastoMensual.objects.filter(
+            usuario_id=OuterRef('usuario_id'), categoria_id=OuterRef('categoria_id'), mes=mes
+        ).values('total')[:1]
+        return presupuestos.annotate(
+            gastado=Coalesce(
+                Subquery(gastado), Value(Decimal('0')), output_field=DecimalField(max_digits=14, decimal_places=2)
+            )
+        )
+    
+    @staticmethod
+    def estado(phone_number, categoria, dia=None):
+        """
+        (monto, gastado) del presupuesto de la categoría en el mes de dia
+        (por defecto el actual), o None si no tiene presupuesto
+        """
+        # Dos lecturas simples por índice único en lugar de una con subconsulta:
+        # armar la subconsulta en el ORM cuesta más que la segunda consulta, y
+        # las categorías sin presupuesto (la mayoría) resuelven con la primera
+        clave = {'usuario_id': usuario_cache.id(phone_number), 'categoria_id': categoria_cache.id(categoria)}
+        if None in clave.values():
+            return None
+        monto = Presupuesto.objects.filter(**clave).values_list('monto', flat=True).first()
+        if monto is None:
+            return None
+        mes = (dia or timezone.localdate()).replace(day=1)
+        gastado = GastoMensual.objects.filter(**clave, mes=mes).values_list('total', flat=True).first()
+        return monto, (gastado or Decimal('0')).quantize(PresupuestoService.CENTAVOS)
+    
+    @staticmethod
+    def listar(phone_number, dia=None):
+        """
+        Lista de (categoria, monto, gastado) de los presupuestos del teléfono
+        """
+        presupuestos = PresupuestoService._con_gastado(
+            Presupuesto.objects.filter(usuario_id=usuario_cache.id(phone_number)), dia
+        ).values_list('categoria_id', 'monto', 'gastado')
+        nombres = categoria_cache.valores(categoria_id for categoria_id, _, _ in presupuestos)
+        return sorted(
+            (nombres[categoria_id], monto, gastado.quantize(PresupuestoService.CENTAVOS))
+            for categoria_id, monto, gastado in presupuestos
+        )
+    
+    @staticmethod
+    def describir(categoria, monto, gastado):
+        restante = monto - gastado
+        if restante < 0:
+            return f"Superaste el presupuesto de {categoria} (${monto}) por ${-restante}"
+        return f"Te quedan ${restante} de ${monto} en {categoria} este mes"
+    
+    @staticmethod
+    def aviso(phone_number, categoria, dia=None):
+        """
+        Texto con lo que queda del presupuesto de la categoría, o None si
+        la categoría no tiene presupuesto
+        """
+        estado = PresupuestoService.estado(phone_number, categoria, dia)
+        if estado is None:
+            return None
+        return PresupuestoService.describir(categoria, *estado)
 
 
 class GastoService:
@@ -65,27 +507,23 @@ class GastoService:
         """
         Verifica si el número de teléfono está autorizado
         """
-        # Limpiar el número (remover espacios, guiones, etc.)
-        clean_phone = re.sub(r'[^\d+]', '', phone_number)
-        authorized_phones = [re.sub(r'[^\d+]', '', phone) for phone in settings.AUTHORIZED_PHONES]
-        
-        return clean_phone in authorized_phones
+        return telefonos_autorizados.is_authorized(phone_number)
     
     @staticmethod
-    def parse_gasto_message(message):
+    def parse_gasto_message(message, normalized=False):
         """
         Parsea un mensaje para extraer categoría y monto
         Formatos soportados:
         - "comida 200"
         - "Netflix 1500"
         - "transporte 50.5"
+        Con normalized=True se asume que el mensaje ya pasó por router.normalize
         """
-        # Limpiar el mensaje
-        message = message.strip().lower()
+        if not normalized:
+            message = normalize(message)
         
-        # Patrón: palabra(s) seguida de número (entero o decimal)
-        pattern = r'^(.+?)\s+(\d+(?:\.\d+)?)$'
-        match = re.match(pattern, message)
+        # Palabra(s) seguida de número (entero o decimal)
+        match = GASTO_PATTERN.match(message)
         
         if match:
             categoria = match.group(1).strip().title()
@@ -103,30 +541,66 @@ class GastoService:
         Crea un nuevo gasto
         """
         try:
-            gasto = Gasto.objects.create(
-                numero_telefono=phone_number,
-                categoria=categoria,
-                monto=monto,
-                mensaje_original=original_message
-            )
+            with transaction.atomic():
+                gasto = Gasto.objects.create(
+                    usuario_id=usuario_cache.id(phone_number, crear=True),
+                    categoria_id=categoria_cache.id(categoria, crear=True),
+                    monto=monto,
+                    mensaje_original=original_message
+                )
+                ResumenDiarioService.registrar(gasto)
             logger.info(f"Gasto creado: {gasto}")
             return gasto
         except Exception as e:
             logger.error(f"Error creando gasto: {str(e)}")
             return None
     
+    @staticmethod
+    def create_gastos(phone_number, items):
+        """
+        Crea varios gastos con un único bulk_create en una transacción.
+        items: lista de (categoria, monto, mensaje_original)
+        """
+        try:
+            with transaction.atomic():
+                usuario_id = usuario_cache.id(phone_number, crear=True)
+                categoria_ids = categoria_cache.ids({categoria for categoria, _, _ in items}, crear=True)
+                gastos = Gasto.objects.bulk_create([
+                    Gasto(
+                        usuario_id=usuario_id,
+                        categoria_id=categoria_ids[categoria],
+                        monto=monto,
+                        mensaje_original=original_message
+                    )
+                    for categoria, monto, original_message in items
+                ])
+                ResumenDiarioService.registrar_lote(gastos)
+            logger.info(f"{len(gastos)} gastos creados para {phone_number}")
+            return gastos
+        except Exception as e:
+            logger.error(f"Error creando gastos: {str(e)}")
+            return None
+    
     @staticmethod
     def delete_gasto(phone_number, gasto_id):
         """
-        Elimina un gasto específico
+        Elimina un gasto específico (también si ya está archivado)
         """
         try:
-            gasto = Gasto.objects.get(id=gasto_id, numero_telefono=phone_number)
-            gasto_info = f"{gasto.categoria}: ${gasto.monto}"
-            gasto.delete()
+            with transaction.atomic():
+                usuario_id = usuario_cache.id(phone_number)
+                gasto = Gasto.objects.select_for_update().filter(id=gasto_id, usuario_id=usuario_id).first()
+                if gasto is None and archivo.modelo() is not Gasto:
+                    # Al archivar se conserva el id
+                    gasto = GastoArchivado.objects.select_for_update().get(id=gasto_id, usuario_id=usuario_id)
+                elif gasto is None:
+                    raise Gasto.DoesNotExist
+                gasto_info = f"{gasto.nombre_categoria}: ${gasto.monto}"
+                gasto.delete()
+                ResumenDiarioService.descontar(gasto)
             logger.info(f"Gasto eliminado: ID {gasto_id}")
             return gasto_info
-        except Gasto.DoesNotExist:
+        except (Gasto.DoesNotExist, GastoArchivado.DoesNotExist):
             logger.error(f"Gasto no encontrado: ID {gasto_id}")
             return None
         except Exception as e:
@@ -136,13 +610,33 @@ class GastoService:
     @staticmethod
     def delete_last_gasto(phone_number):
         """
-        Elimina el último gasto del usuario
+        Elimina el último gasto del usuario. Solo busca en el archivo si no
+        hay gastos sin archivar posteriores al corte.
         """
         try:
-            gasto = Gasto.objects.filter(numero_telefono=phone_number).order_by('-fecha').first()
+            with transaction.atomic():
+                usuario_id = usuario_cache.id(phone_number)
+                gasto = (
+                    Gasto.objects.select_for_update()
+                    .filter(usuario_id=usuario_id)
+                    .order_by('-fecha')
+                    .first()
+                )
+                corte = archivo.corte()
+                if corte is not None and (gasto is None or gasto.fecha < corte):
+                    archivado = (
+                        GastoArchivado.objects.select_for_update()
+                        .filter(usuario_id=usuario_id)
+                        .order_by('-fecha')
+                        .first()
+                    )
+                    if archivado and (gasto is None or archivado.fecha > gasto.fecha):
+                        gasto = archivado
+                if gasto:
+                    gasto.delete()
+                    ResumenDiarioService.descontar(gasto)
             if gasto:
-                gasto_info = f"{gasto.categoria}: ${gasto.monto}"
-                gasto.delete()
+                gasto_info = f"{gasto.nombre_categoria}: ${gasto.monto}"
                 logger.info(f"Ultimo gasto eliminado: {gasto_info}")
                 return gasto_info
             else:
@@ -154,17 +648,21 @@ class GastoService:
     @staticmethod
     def get_recent_gastos(phone_number, limit=5):
         """
-        Obtiene los gastos más recientes del usuario
+        Obtiene los gastos más recientes del usuario. Solo lee el archivo si
+        el usuario tiene menos de `limit` gastos sin archivar.
         """
         try:
-            gastos = Gasto.objects.filter(numero_telefono=phone_number).order_by('-fecha')[:limit]
-            return list(gastos)
+            usuario_id = usuario_cache.id(phone_number)
+            gastos = list(Gasto.objects.filter(usuario_id=usuario_id).order_by('-fecha')[:limit])
+            if len(gastos) < limit and archivo.modelo() is not Gasto:
+                gastos = list(GastoHistorico.objects.filter(usuario_id=usuario_id).order_by('-fecha')[:limit])
+            return gastos
         except Exception as e:
             logger.error(f"Error obteniendo gastos recientes: {str(e)}")
             return []
     
     @staticmethod
-    def parse_delete_message(message):
+    def parse_delete_message(message, normalized=False):
         """
         Parsea mensajes de eliminación
         Formatos soportados:
@@ -173,11 +671,11 @@ class GastoService:
         - "borrar 5"
         - "borrar ultimo"
         """
-        message = message.strip().lower()
+        if not normalized:
+            message = normalize(message)
         
-        # Patrón para eliminar por ID
-        pattern_id = r'^(eliminar|borrar)\s+(\d+)$'
-        match_id = re.match(pattern_id, message)
+        # Eliminar por ID
+        match_id = DELETE_ID_PATTERN.match(message)
         
         if match_id:
             try:
@@ -186,39 +684,46 @@ class GastoService:
             except ValueError:
                 return None, None
         
-        # Patrón para eliminar último
-        pattern_last = r'^(eliminar|borrar)\s+(ultimo|último)$'
-        match_last = re.match(pattern_last, message)
-        
-        if match_last:
+        # Eliminar último
+        if DELETE_LAST_PATTERN.match(message):
             return 'ultimo', None
         
         return None, None
     
     @staticmethod
-    def parse_resumen_message(message):
+    def parse_resumen_message(message, normalized=False):
         """
         Parsea mensajes de resumen
         Formatos soportados:
         - "resumen hoy"
         - "resumen semana"
+        - "resumen mes"
+        - "resumen año"
         - "resumen 01-07 al 29-07"
         """
-        message = message.strip().lower()
+        if not normalized:
+            message = normalize(message)
         
         if message == "resumen hoy":
-            today = timezone.now().date()
+            today = timezone.localdate()
             return today, today
         
         elif message == "resumen semana":
-            today = timezone.now().date()
+            today = timezone.localdate()
             start_week = today - timedelta(days=today.weekday())
             return start_week, today
         
+        elif message == "resumen mes":
+            today = timezone.localdate()
+            return today.replace(day=1), today
+        
+        elif message in ("resumen año", "resumen ano"):
+            today = timezone.localdate()
+            return today.replace(month=1, day=1), today
+        
         elif message.startswith("resumen "):
-            # Patrón para "resumen DD-MM al DD-MM"
-            pattern = r'resumen\s+(\d{1,2}-\d{1,2})\s+al\s+(\d{1,2}-\d{1,2})'
-            match = re.match(pattern, message)
+            # "resumen DD-MM al DD-MM"
+            match = RESUMEN_RANGO_PATTERN.match(message)
             
             if match:
                 try:
@@ -226,7 +731,7 @@ class GastoService:
                     end_str = match.group(2)
                     
                     # Asumir año actual
-                    current_year = timezone.now().year
+                    current_year = timezone.localdate().year
                     
                     # Parsear fechas
                     start_day, start_month = map(int, start_str.split('-'))
@@ -241,6 +746,25 @@ class GastoService:
         
         return None, None
     
+    @staticmethod
+    def filter_gastos(phone_number=None, categoria=None, start_date=None, end_date=None):
+        """
+        Gastos filtrados por teléfono, categoría y rango de días (locales).
+        Cada filtro es opcional. Incluye los gastos archivados solo si el
+        rango empieza antes del corte del archivo.
+        """
+        desde = GastoService._inicio_dia(start_date) if start_date else None
+        gastos = archivo.modelo(desde).objects.all()
+        if phone_number:
+            gastos = gastos.filter(usuario_id=usuario_cache.id(phone_number))
+        if categoria:
+            gastos = gastos.filter(categoria_id=categoria_cache.id(categoria))
+        if desde:
+            gastos = gastos.filter(fecha__gte=desde)
+        if end_date:
+            gastos = gastos.filter(fecha__lt=GastoService._inicio_dia(end_date + timedelta(days=1)))
+        return gastos
+    
     @staticmethod
     def get_resumen_gastos(phone_number, start_date, end_date):
         """
@@ -250,29 +774,237 @@ class GastoService:
         start_datetime = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
         end_datetime = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
         
-        # Filtrar gastos
-        gastos = Gasto.objects.filter(
-            numero_telefono=phone_number,
-            fecha__range=[start_datetime, end_datetime]
-        )
+        resumen = GastoService.get_resumen_periodo(phone_number, start_datetime, end_datetime)
+        resumen['periodo'] = f"{start_date.strftime('%d/%m')} al {end_date.strftime('%d/%m')}"
+        return resumen
+    
+    @staticmethod
+    def get_resumen_periodo(phone_number, desde, hasta):
+        """
+        Resumen entre dos datetimes (inclusive), cacheado por teléfono y
+        rango hasta que el teléfono registre o elimine un gasto. Se calcula
+        en una réplica de lectura si hay (ver gastos/replicas.py).
+        """
+        def calcular():
+            with lectura(phone_number):
+                return GastoService._calcular_resumen_periodo(phone_number, desde, hasta)
         
-        # Calcular total
-        total = gastos.aggregate(total=Sum('monto'))['total'] or Decimal('0')
+        return resumen_cache.get_or_compute(phone_number, desde, hasta, calcular)
+    
+    @staticmethod
+    def _calcular_resumen_periodo(phone_number, desde, hasta):
+        """
+        Los días completos se leen de GastoDiario; solo las puntas de días
+        parciales tocan Gasto (o GastoHistorico si empiezan antes del corte
+        del archivo).
+        """
+        desde_local, hasta_local = timezone.localtime(desde), timezone.localtime(hasta)
+        primer_dia = desde_local.date()
+        if desde_local.time() != time.min:
+            primer_dia += timedelta(days=1)
+        ultimo_dia = hasta_local.date()
+        if hasta_local.time() != time.max:
+            ultimo_dia -= timedelta(days=1)
         
-        # Agrupar por categoría
-        gastos_por_categoria = {}
-        for gasto in gastos:
-            categoria = gasto.categoria
-            if categoria in gastos_por_categoria:
-                gastos_por_categoria[categoria] += gasto.monto
+        # inicio_crudos: primer instante que se lee de los gastos
+        if primer_dia > ultimo_dia:
+            crudos = Q(fecha__range=[desde, hasta])
+            inicio_crudos = desde
+            resumenes = []
+        else:
+            crudos = Q()
+            inicio_crudos = GastoService._inicio_dia(ultimo_dia + timedelta(days=1))
+            if desde_local.time() != time.min:
+                crudos |= Q(fecha__gte=desde, fecha__lt=GastoService._inicio_dia(primer_dia))
+                inicio_crudos = desde
+            if hasta_local.time() != time.max:
+                crudos |= Q(fecha__gte=GastoService._inicio_dia(ultimo_dia + timedelta(days=1)), fecha__lte=hasta)
+            resumenes = [ResumenDiarioService.summarize(phone_number, primer_dia, ultimo_dia)]
+        
+        if crudos:
+            modelo = archivo.modelo(inicio_crudos)
+            gastos = modelo.objects.filter(crudos, usuario_id=usuario_cache.id(phone_number))
+            resumenes.append(GastoService.summarize(gastos))
+        
+        return GastoService.combine(resumenes)
+    
+    @staticmethod
+    def _inicio_dia(dia):
+        return timezone.make_aware(datetime.combine(dia, time.min))
+    
+    @staticmethod
+    def summarize(gastos, total=Sum('monto'), cantidad=Count('id')):
+        """
+        Resume un queryset en una sola consulta agrupada.
+        Cada fila trae solo (categoria, total, cantidad); una fila extra con
+        categoría NULL (UNION ALL sin GROUP BY) aporta el total general.
+        Las categorías quedan ordenadas por monto descendente.
+        Se agrupa por categoria_id y los nombres salen de la caché de
+        dimensiones.
+        """
+        gastos = gastos.order_by()
+        por_categoria = gastos.values(grupo=F('categoria')).annotate(total=total, cantidad=cantidad)
+        general = gastos.annotate(grupo=Value(None, output_field=IntegerField())).values('grupo').annotate(
+            total=total,
+            cantidad=cantidad
+        )
+        
+        resumen = {
+            'total_gastado': Decimal('0'),
+            'gastos_por_categoria': {},
+            'cantidad_por_categoria': {},
+            'cantidad_gastos': 0,
+        }
+        filas = []
+        for fila in por_categoria.union(general, all=True):
+            if fila['grupo'] is None:
+                resumen['total_gastado'] = fila['total'] or Decimal('0')
+                resumen['cantidad_gastos'] = fila['cantidad']
             else:
-                gastos_por_categoria[categoria] = gasto.monto
+                filas.append(fila)
+        nombres = categoria_cache.valores(fila['grupo'] for fila in filas)
+        for fila in filas:
+            fila['grupo'] = nombres[fila['grupo']]
+        for fila in sorted(filas, key=lambda fila: (-fila['total'], fila['grupo'])):
+            resumen['gastos_por_categoria'][fila['grupo']] = fila['total']
+            resumen['cantidad_por_categoria'][fila['grupo']] = fila['cantidad']
+        resumen['cantidad_gastos'] = resumen['cantidad_gastos'] or 0
+        return resumen
+    
+    @staticmethod
+    def combine(resumenes):
+        """
+        Combina varios resúmenes parciales en uno, ordenado por monto
+        """
+        if len(resumenes) == 1:
+            return resumenes[0]
         
+        total = Decimal('0')
+        cantidad = 0
+        montos, cantidades = {}, {}
+        for resumen in resumenes:
+            total += resumen['total_gastado']
+            cantidad += resumen['cantidad_gastos']
+            for categoria, monto in resumen['gastos_por_categoria'].items():
+                montos[categoria] = montos.get(categoria, Decimal('0')) + monto
+                cantidades[categoria] = cantidades.get(categoria, 0) + resumen['cantidad_por_categoria'][categoria]
+        
+        orden = sorted(montos, key=lambda categoria: (-montos[categoria], categoria))
         return {
             'total_gastado': total,
-            'gastos_por_categoria': gastos_por_categoria,
-            'cantidad_gastos': gastos.count(),
-            'periodo': f"{start_date.strftime('%d/%m')} al {end_date.strftime('%d/%m')}"
+            'gastos_por_categoria': {categoria: montos[categoria] for categoria in orden},
+            'cantidad_por_categoria': {categoria: cantidades[categoria] for categoria in orden},
+            'cantidad_gastos': cantidad,
+        }
+
+
+class EstadisticasService:
+    """
+    Series de gastos por período para /api/stats/.
+    
+    Todo sale de los totales diarios (GastoDiario): la base agrupa por día
+    y por categoría en dos consultas, y en Python solo se recorre la serie
+    ya agrupada (a lo sumo un punto por día) con sumas acumuladas. Las
+    semanas y meses se arman desde los días y no con TruncWeek/TruncMonth,
+    que en SQLite llaman a una función Python por cada fila.
+    """
+    
+    PERIODOS = ('dia', 'semana', 'mes')
+    VENTANAS = {'dia': 7, 'semana': 4, 'mes': 3}
+    
+    @staticmethod
+    def inicio_periodo(dia, periodo):
+        if periodo == 'semana':
+            return dia - timedelta(days=dia.weekday())
+        if periodo == 'mes':
+            return dia.replace(day=1)
+        return dia
+    
+    @staticmethod
+    def siguiente_periodo(inicio, periodo):
+        if periodo == 'dia':
+            return inicio + timedelta(days=1)
+        if periodo == 'semana':
+            return inicio + timedelta(days=7)
+        return (inicio + timedelta(days=32)).replace(day=1)
+    
+    @staticmethod
+    def estadisticas(phone_number, desde=None, hasta=None, periodo='mes', ventana=None):
+        """
+        Totales por período (con los períodos sin gastos en cero), media
+        móvil de los últimos `ventana` períodos, variación contra el período
+        anterior y participación de cada categoría en el rango.
+        Sin desde, el rango empieza en el primer gasto del teléfono.
+        """
+        ventana = ventana or EstadisticasService.VENTANAS[periodo]
+        hasta = hasta or timezone.localdate()
+        diarios = GastoDiario.objects.filter(usuario_id=usuario_cache.id(phone_number), dia__lte=hasta).order_by()
+        if desde is not None:
+            diarios = diarios.filter(dia__gte=desde)
+        
+        # Montos en centavos enteros: sumas exactas y sin el costo de Decimal
+        dias = diarios.values_list('dia').annotate(total=Sum('total'), cantidad=Sum('cantidad')).order_by('dia')
+        por_periodo = {}
+        for dia, total, cantidad in dias:
+            if desde is None:
+                desde = dia
+            inicio = EstadisticasService.inicio_periodo(dia, periodo)
+            centavos, gastos = por_periodo.get(inicio, (0, 0))
+            por_periodo[inicio] = (centavos + int(total * 100), gastos + cantidad)
+        if desde is None:
+            desde = hasta
+        resumen = GastoService.summarize(diarios, total=Sum('total'), cantidad=Sum('cantidad'))
+        
+        inicios = []
+        inicio = EstadisticasService.inicio_periodo(desde, periodo)
+        while inicio <= hasta:
+            inicios.append(inicio)
+            inicio = EstadisticasService.siguiente_periodo(inicio, periodo)
+        filas = [por_periodo.get(inicio, (0, 0)) for inicio in inicios]
+        totales = [centavos for centavos, _ in filas]
+        acumulados = [0, *itertools.accumulate(totales)]
+        
+        # La serie va directo a JSON: float e ISO ahorran la conversión de
+        # cada valor en el encoder de DRF
+        serie = []
+        for i, (inicio, (total, cantidad)) in enumerate(zip(inicios, filas)):
+            media_movil = variacion = variacion_pct = None
+            if i + 1 >= ventana:
+                media_movil = round((acumulados[i + 1] - acumulados[i + 1 - ventana]) / ventana / 100, 2)
+            if i > 0:
+                anterior = totales[i - 1]
+                variacion = (total - anterior) / 100
+                if anterior:
+                    variacion_pct = round((total - anterior) / anterior * 100, 1)
+            serie.append({
+                'inicio': inicio.isoformat(),
+                'total': total / 100,
+                'cantidad': cantidad,
+                'media_movil': media_movil,
+                'variacion': variacion,
+                'variacion_pct': variacion_pct,
+            })
+        
+        total_gastado = resumen['total_gastado']
+        categorias = [
+            {
+                'categoria': categoria,
+                'total': monto,
+                'cantidad': resumen['cantidad_por_categoria'][categoria],
+                'porcentaje': round(float(monto / total_gastado) * 100, 1) if total_gastado else 0.0,
+            }
+            for categoria, monto in resumen['gastos_por_categoria'].items()
+        ]
+        return {
+            'numero_telefono': phone_number,
+            'periodo': periodo,
+            'ventana': ventana,
+            'desde': desde,
+            'hasta': hasta,
+            'total_gastado': total_gastado,
+            'cantidad_gastos': resumen['cantidad_gastos'],
+            'categorias': categorias,
+            'serie': serie,
         }
 
 
@@ -281,8 +1013,17 @@ class MessageProcessor:
     Procesador principal de mensajes de WhatsApp
     """
     
-    def __init__(self):
-        self.whatsapp_service = WhatsAppService()
+    def __init__(self, whatsapp_service=None):
+        self._whatsapp_service = whatsapp_service
+    
+    @property
+    def whatsapp_service(self):
+        """
+        Servicio de WhatsApp, creado solo si hace falta enviar por REST
+        """
+        if self._whatsapp_service is None:
+            self._whatsapp_service = WhatsAppService()
+        return self._whatsapp_service
     
     def process_message(self, phone_number, message_body):
         """
@@ -294,46 +1035,98 @@ class MessageProcessor:
         
         message_body = message_body.strip()
         
-        # Verificar si es un mensaje de resumen
-        if message_body.lower().startswith('resumen'):
-            return self._process_resumen_message(phone_number, message_body)
+        # Varios gastos en un mismo mensaje, uno por línea
+        lines = [line.strip() for line in message_body.splitlines() if line.strip()]
+        if len(lines) > 1:
+            return self._process_multi_gasto_message(phone_number, lines)
+        
+        text = normalize(message_body)
+        intent = router.route(text)
         
-        # Verificar si es un mensaje de eliminación
-        if message_body.lower().startswith(('eliminar', 'borrar')):
-            return self._process_delete_message(phone_number, message_body)
+        if intent == 'resumen':
+            return self._process_resumen_message(phone_number, text)
         
-        # Verificar si quiere ver sus gastos recientes
-        if message_body.lower() in ['mis gastos', 'gastos', 'ver gastos']:
+        if intent == 'eliminar':
+            return self._process_delete_message(phone_number, text)
+        
+        if intent == 'listar':
             return self._process_list_gastos_message(phone_number)
         
+        if intent == 'presupuesto':
+            return self._process_presupuesto_message(phone_number, text)
+        
         # Intentar parsear como gasto
-        categoria, monto = GastoService.parse_gasto_message(message_body)
+        categoria, monto = GastoService.parse_gasto_message(text, normalized=True)
         
         if categoria and monto:
+            categoria = categoria_resolver.resolve(phone_number, categoria)
             return self._process_gasto_message(phone_number, categoria, monto, message_body)
         
         # Mensaje no entendido
         return self._get_help_message()
-    
+
     def _process_gasto_message(self, phone_number, categoria, monto, original_message):
         """
         Procesa un mensaje de gasto
         """
         gasto = GastoService.create_gasto(phone_number, categoria, monto, original_message)
-        
+
         if gasto:
-            return f"Gasto registrado: {categoria}: ${monto} - {gasto.fecha_str}"
+            categoria_resolver.learn(phone_number, categoria)
+            response = f"Gasto registrado: {categoria}: ${monto} - {gasto.fecha_str}"
+            aviso = PresupuestoService.aviso(phone_number, categoria, timezone.localdate(gasto.fecha))
+            if aviso:
+                response += f"\n{aviso}"
+            return response
         else:
             return "Error al registrar el gasto. Intenta nuevamente."
+
+    def _process_multi_gasto_message(self, phone_number, lines):
+        """
+        Procesa un mensaje con un gasto por línea: registra todos los
+        válidos juntos y responde con un único resumen
+        """
+        items, rejected = [], []
+        for line in lines:
+            categoria, monto = GastoService.parse_gasto_message(normalize(line), normalized=True)
+            if categoria and monto:
+                items.append((categoria_resolver.resolve(phone_number, categoria), monto, line))
+            else:
+                rejected.append(line)
+        
+        if not items:
+            response = "No se registro ningun gasto.\n"
+        else:
+            gastos = GastoService.create_gastos(phone_number, items)
+            if gastos is None:
+                return "Error al registrar los gastos. Intenta nuevamente."
+            
+            response = f"Gastos registrados: {len(gastos)}\n"
+            for gasto in gastos:
+                categoria_resolver.learn(phone_number, gasto.nombre_categoria)
+                response += f"- ID {gasto.id}: {gasto.nombre_categoria}: ${gasto.monto}\n"
+            dia = timezone.localdate(gastos[0].fecha)
+            for categoria in dict.fromkeys(gasto.nombre_categoria for gasto in gastos):
+                aviso = PresupuestoService.aviso(phone_number, categoria, dia)
+                if aviso:
+                    response += f"{aviso}\n"
+        
+        if rejected:
+            response += "\nLineas no reconocidas:\n"
+            for line in rejected:
+                response += f"- {line}\n"
+            response += "\nFormato por linea: 'comida 200'"
+        
+        return response
     
     def _process_resumen_message(self, phone_number, message):
         """
         Procesa un mensaje de resumen
         """
-        start_date, end_date = GastoService.parse_resumen_message(message)
+        start_date, end_date = GastoService.parse_resumen_message(message, normalized=True)
         
         if not start_date or not end_date:
-            return "Formato de resumen no valido. Usa: 'resumen hoy', 'resumen semana' o 'resumen 01-07 al 29-07'"
+            return "Formato de resumen no valido. Usa: 'resumen hoy', 'resumen semana', 'resumen mes', 'resumen año' o 'resumen 01-07 al 29-07'"
         
         resumen = GastoService.get_resumen_gastos(phone_number, start_date, end_date)
         
@@ -355,7 +1148,7 @@ class MessageProcessor:
         """
         Procesa un mensaje de eliminación de gasto
         """
-        delete_type, gasto_id = GastoService.parse_delete_message(message)
+        delete_type, gasto_id = GastoService.parse_delete_message(message, normalized=True)
         
         if not delete_type:
             return "Formato incorrecto. Usa: 'eliminar 3' o 'eliminar ultimo'"
@@ -387,12 +1180,35 @@ class MessageProcessor:
         
         response = "Tus ultimos gastos:\n\n"
         for gasto in gastos:
-            response += f"ID {gasto.id}: {gasto.categoria} - ${gasto.monto}\n"
+            response += f"ID {gasto.id}: {gasto.nombre_categoria} - ${gasto.monto}\n"
             response += f"   Fecha: {gasto.fecha.strftime('%d/%m %H:%M')}\n\n"
         
         response += "Para eliminar: 'eliminar 3' o 'eliminar ultimo'"
         return response
     
+    def _process_presupuesto_message(self, phone_number, message):
+        """
+        Procesa "presupuesto comida 50000" (0 lo elimina) o "presupuestos"
+        """
+        _, _, resto = message.partition(' ')
+        if not resto:
+            presupuestos = PresupuestoService.listar(phone_number)
+            if not presupuestos:
+                return "No tienes presupuestos. Para crear uno: 'presupuesto comida 50000'"
+            response = "Tus presupuestos del mes:\n\n"
+            for categoria, monto, gastado in presupuestos:
+                response += f"- {PresupuestoService.describir(categoria, monto, gastado)} (llevas ${gastado})\n"
+            return response
+        
+        categoria, monto = GastoService.parse_gasto_message(resto, normalized=True)
+        if categoria is None:
+            return "Formato incorrecto. Usa: 'presupuesto comida 50000' o 'presupuestos'"
+        categoria = categoria_resolver.resolve(phone_number, categoria)
+        
+        if not PresupuestoService.definir(phone_number, categoria, monto):
+            return f"Presupuesto de {categoria} eliminado"
+        return f"Presupuesto de {categoria}: ${monto} por mes\n{PresupuestoService.aviso(phone_number, categoria)}"
+    
     def _get_help_message(self):
         """
         Retorna el mensaje de ayuda
@@ -402,15 +1218,21 @@ class MessageProcessor:
             "Para registrar gastos:\n"
             "- Comida 300\n"
             "- Netflix 1500\n"
-            "- Transporte 50\n\n"
+            "- Transporte 50\n"
+            "- Varios a la vez, uno por linea\n\n"
             "Para ver resumenes:\n"
             "- resumen hoy\n"
             "- resumen semana\n"
+            "- resumen mes\n"
+            "- resumen año\n"
             "- resumen 01-07 al 29-07\n\n"
             "Para gestionar gastos:\n"
             "- mis gastos\n"
             "- eliminar 3\n"
-            "- eliminar ultimo"
+            "- eliminar ultimo\n\n"
+            "Presupuestos mensuales:\n"
+            "- presupuesto comida 50000\n"
+            "- presupuestos"
         )
     
     def send_response(self, phone_number, message):
@@ -418,3 +1240,35 @@ class MessageProcessor:
         Envía una respuesta por WhatsApp
         """
         return self.whatsapp_service.send_message(phone_number, message)
+    
+    async def asend_response(self, phone_number, message):
+        """
+        Envía una respuesta por WhatsApp desde una vista async
+        """
+        return await AsyncWhatsAppService().send_message(phone_number, message)
+    
+    def process_once(self, phone_number, message_body, message_sid, enqueue=False):
+        """
+        Procesa el mensaje una sola vez por MessageSid (sin MessageSid se
+        procesa siempre). Con enqueue=True la respuesta se encola en el
+        outbox. Retorna (respuesta, outbox_id, duplicado).
+        """
+        def procesar():
+            if enqueue:
+                return self.process_and_enqueue(phone_number, message_body)
+            return self.process_message(phone_number, message_body), None
+        
+        if not message_sid:
+            respuesta, mensaje = procesar()
+            return respuesta, mensaje.id if mensaje else None, False
+        return IdempotenciaService.procesar_una_vez(message_sid, phone_number, procesar)
+    
+    def process_and_enqueue(self, phone_number, message_body):
+        """
+        Procesa un mensaje y encola la respuesta en una única transacción,
+        de modo que el gasto y su respuesta se guardan (o no) juntos.
+        """
+        with transaction.atomic():
+            response_message = self.process_message(phone_number, message_body)
+            mensaje = OutboxService.enqueue(phone_number, response_message)
+        return response_message, mensaje
@@ -0,0 +1,135 @@
+"""
+Registro en memoria de los teléfonos autorizados
+"""
+
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import TelefonoAutorizado
+
+_NO_TELEFONO = re.compile(r'[^\d+]')
+
+
+def normalize_phone(phone_number):
+    """
+    Deja solo dígitos y '+' (remueve espacios, guiones, paréntesis, etc.)
+    """
+    return _NO_TELEFONO.sub('', phone_number or '')
+
+
+class TelefonosAutorizados:
+    """
+    Conjunto normalizado de teléfonos autorizados, cargado una vez por
+    proceso desde TelefonoAutorizado y settings.AUTHORIZED_PHONES.
+
+    Cada cambio en la tabla incrementa un número de versión en el cache
+    compartido; los procesos lo consultan como mucho cada
+    AUTHORIZED_PHONES_REFRESH_SECONDS y recargan el conjunto si cambió.
+    Con un cache por proceso (locmem) la recarga queda garantizada por
+    AUTHORIZED_PHONES_MAX_AGE.
+    """
+    VERSION_KEY = 'telefonos_autorizados:version'
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._phones = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self.loads = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def is_authorized(self, phone_number):
+        """
+        Verifica si el número está autorizado. Twilio envía los números en
+        E.164, así que normalmente no hace falta normalizar.
+        """
+        phones = self.phones()
+        return phone_number in phones or normalize_phone(phone_number) in phones
+
+    def phones(self):
+        """
+        Retorna el conjunto vigente, recargándolo si cambió la versión
+        """
+        now = time.monotonic()
+        phones = self._phones
+        if phones is not None and now - self._checked_at < settings.AUTHORIZED_PHONES_REFRESH_SECONDS:
+            return phones
+
+        version = self._current_version()
+        with self._lock:
+            expired = now - self._loaded_at >= settings.AUTHORIZED_PHONES_MAX_AGE
+            if self._phones is None or version != self._version or expired:
+                self._load(version, now)
+            self._checked_at = now
+            return self._phones
+
+    def _load(self, version, now):
+        numeros = TelefonoAutorizado.objects.filter(activo=True).values_list('numero_telefono', flat=True)
+        phones = {normalize_phone(phone) for phone in settings.AUTHORIZED_PHONES}
+        phones.update(numeros)
+        phones.discard('')
+        self._phones = frozenset(phones)
+        self._version = version
+        self._loaded_at = now
+        self.loads += 1
+
+    def _current_version(self):
+        version = self.cache.get(self.VERSION_KEY)
+        if version is None:
+            # Versión inicial desde el reloj para no coincidir con una vieja
+            self.cache.add(self.VERSION_KEY, time.time_ns(), timeout=None)
+            version = self.cache.get(self.VERSION_KEY)
+        return version
+
+    def invalidate(self):
+        """
+        Publica una nueva versión cuando confirma la transacción actual
+        """
+        transaction.on_commit(self._bump)
+
+    def reset(self):
+        """
+        Descarta el conjunto del proceso actual
+        """
+        with self._lock:
+            self._phones = None
+
+    def _bump(self):
+        try:
+            self.cache.incr(self.VERSION_KEY)
+        except ValueError:
+            self.cache.set(self.VERSION_KEY, time.time_ns(), timeout=None)
+        self.reset()
+
+    def stats(self):
+        return {
+            'telefonos': len(self._phones) if self._phones is not None else None,
+            'recargas': self.loads,
+        }
+
+
+telefonos_autorizados = TelefonosAutorizados()
+
+
+@receiver([post_save, post_delete], sender=TelefonoAutorizado)
+def _invalidate_on_change(**kwargs):
+    telefonos_autorizados.invalidate()
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting.startswith('AUTHORIZED_PHONES'):
+        telefonos_autorizados.reset()
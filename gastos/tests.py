@@ -1,3 +1,1851 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.utils import load_backend
+from django.utils.module_loading import import_string
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from .archivo import archivo
+from .asgi import con_lifespan
+from .benchmarks import TwilioStandIn, load_stats, parse_mix, webhook_payloads
+from .cache import resumen_cache
+from .categorias import CategoriaIndex, categoria_resolver, normalizar
+from .dimensiones import categoria_cache, usuario_cache
+from .export import iter_export
+from .importer import GastoImporter
+from .log import JsonFormatter, QueuedHandler, RequestIdFilter, redact_phones
+from .models import (
+    Categoria, CorteArchivo, Gasto, GastoArchivado, GastoDiario, GastoHistorico, GastoMensual, Importacion, MensajeEntrante, MensajeSaliente, Presupuesto,
+    TelefonoAutorizado, Usuario,
+)
+from .queries import QueryCounter
+from .checks import cache_de_replicas, cache_de_resumenes, cache_de_telefonos
+from .replicas import ReplicaRouter, escribio_hace_poco, lectura, registrar_escritura
+from .router import normalize, router
+from .services import (
+    GastoService, IdempotenciaService, MessageProcessor, OutboxService, PresupuestoService, ResumenDiarioService,
+    WhatsAppService,
+)
+from .telefonos import TelefonosAutorizados, telefonos_autorizados
+from .views import AsyncGastoDetailView, AsyncGastoExportView, AsyncGastoListView, AsyncTwilioWebhookView
+from .twilio_client import StubTwilioClient, async_registry, get_async_client, pool_stats, registry
+
+
+PHONE = '+5493531234567'
+
+
+def nuevo_gasto(numero_telefono, categoria, **campos):
+    """
+    Gasto sin guardar, con el teléfono y la categoría como texto
+    """
+    return Gasto(
+        usuario_id=usuario_cache.id(numero_telefono, crear=True),
+        categoria_id=categoria_cache.id(categoria, crear=True),
+        **campos
+    )
+
+
+def nuevo_diario(numero_telefono, categoria, **campos):
+    """
+    Total diario sin guardar, con el teléfono y la categoría como texto
+    """
+    return GastoDiario(
+        usuario_id=usuario_cache.id(numero_telefono, crear=True),
+        categoria_id=categoria_cache.id(categoria, crear=True),
+        **campos
+    )
+
+
+def reset_caches():
+    """
+    Vacía los caches y los registros en memoria del proceso
+    """
+    resumen_cache.clear()
+    caches['default'].clear()
+    telefonos_autorizados.reset()
+    categoria_resolver.reset()
+    usuario_cache.reset()
+    categoria_cache.reset()
+    archivo.reset()
+
+
+class GastosTestCase(TestCase):
+    """
+    TestCase base: arranca cada prueba con la cache de resúmenes vacía
+    """
+
+    def setUp(self):
+        super().setUp()
+        reset_caches()
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE], WHATSAPP_REPLY_MODE='outbox')
+class OutboxTests(GastosTestCase):
+    """
+    Pruebas del outbox de respuestas y su despachador
+    """
+
+    def post_webhook(self, body):
+        return self.client.post('/webhook/whatsapp/', {'From': f'whatsapp:{PHONE}', 'Body': body})
+
+    def test_webhook_encola_respuesta_sin_enviar(self):
+        response = self.post_webhook('comida 200')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Gasto.objects.count(), 1)
+        mensaje = MensajeSaliente.objects.get()
+        self.assertEqual(mensaje.estado, MensajeSaliente.ESTADO_PENDIENTE)
+        self.assertEqual(mensaje.numero_telefono, PHONE)
+        self.assertIn('Gasto registrado', mensaje.cuerpo)
+
+    def test_dispatch_envia_pendientes(self):
+        for i in range(5):
+            OutboxService.enqueue(PHONE, f'respuesta {i}')
+        stub = StubTwilioClient()
+
+        enviados, fallidos = OutboxService.dispatch_batch(
+            WhatsAppService(client=stub), batch_size=10, concurrency=3
+        )
+
+        self.assertEqual((enviados, fallidos), (5, 0))
+        self.assertEqual(len(stub.sent), 5)
+        self.assertFalse(MensajeSaliente.objects.exclude(estado=MensajeSaliente.ESTADO_ENVIADO).exists())
+        self.assertTrue(MensajeSaliente.objects.get(cuerpo='respuesta 0').message_sid.startswith('SMSTUB'))
+
+    @override_settings(OUTBOX_MAX_INTENTOS=2, OUTBOX_BACKOFF_SECONDS=0)
+    def test_dispatch_reintenta_y_marca_fallido(self):
+        mensaje = OutboxService.enqueue(PHONE, 'hola')
+        service = WhatsAppService(client=StubTwilioClient(fail_for=[f'whatsapp:{PHONE}']))
+
+        self.assertEqual(OutboxService.dispatch_batch(service), (0, 1))
+        mensaje.refresh_from_db()
+        self.assertEqual(mensaje.estado, MensajeSaliente.ESTADO_PENDIENTE)
+
+        self.assertEqual(OutboxService.dispatch_batch(service), (0, 1))
+        mensaje.refresh_from_db()
+        self.assertEqual(mensaje.estado, MensajeSaliente.ESTADO_FALLIDO)
+        self.assertEqual(mensaje.intentos, 2)
+
+    def test_dispatch_retoma_mensajes_con_reserva_vencida(self):
+        mensaje = OutboxService.enqueue(PHONE, 'hola')
+        MensajeSaliente.objects.filter(id=mensaje.id).update(
+            estado=MensajeSaliente.ESTADO_ENVIANDO,
+            proximo_intento=timezone.now() - timedelta(seconds=1)
+        )
+
+        enviados, _ = OutboxService.dispatch_batch(WhatsAppService(client=StubTwilioClient()))
+
+        self.assertEqual(enviados, 1)
+
+    def test_worker_sobrevive_errores_y_recicla_conexiones(self):
+        comando = 'gastos.management.commands.dispatch_outbox'
+        lotes = [OperationalError('server closed the connection'), OperationalError('idem'), (1, 0), KeyboardInterrupt]
+        with mock.patch(f'{comando}.OutboxService.dispatch_batch', side_effect=lotes), \
+                mock.patch(f'{comando}.close_old_connections') as close_old_connections, \
+                mock.patch(f'{comando}.time.sleep') as sleep, \
+                self.assertLogs('gastos', 'ERROR') as logs, \
+                self.assertRaises(KeyboardInterrupt):
+            call_command('dispatch_outbox', loop=True, interval=1, stub=True, stdout=io.StringIO())
+
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [2, 4])
+        self.assertEqual(close_old_connections.call_count, 4)
+        self.assertEqual(len(logs.records), 2)
+
+    @override_settings(WHATSAPP_REPLY_MODE='twiml')
+    def test_worker_fuera_del_modo_outbox_solo_purga(self):
+        comando = 'gastos.management.commands.dispatch_outbox'
+        OutboxService.enqueue(PHONE, 'pendiente de antes')
+        with mock.patch(f'{comando}.IdempotenciaService.purgar') as purgar, \
+                mock.patch(f'{comando}.time.sleep', side_effect=[None, None, KeyboardInterrupt]) as sleep, \
+                CaptureQueriesContext(connection) as ctx, \
+                self.assertRaises(KeyboardInterrupt):
+            call_command('dispatch_outbox', loop=True, interval=1, stub=True, stdout=io.StringIO())
+
+        self.assertEqual(MensajeSaliente.objects.get().estado, MensajeSaliente.ESTADO_ENVIADO)
+        consultas = [q['sql'] for q in ctx.captured_queries if 'gastos_mensajesaliente' in q['sql']]
+        # Envía el pendiente, comprueba que no queda otro y deja de consultar
+        self.assertEqual(len([sql for sql in consultas if sql.startswith('SELECT')]), 2)
+        self.assertEqual(purgar.call_count, 1)
+        self.assertGreater(sleep.call_args_list[-1].args[0], 3000)
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE])
+class ReplyModeTests(GastosTestCase):
+    """
+    Pruebas de los modos de respuesta del webhook
+    """
+
+    def post_webhook(self, body):
+        return self.client.post('/webhook/whatsapp/', {'From': f'whatsapp:{PHONE}', 'Body': body})
+
+    @override_settings(WHATSAPP_REPLY_MODE='twiml')
+    def test_twiml_responde_en_el_webhook(self):
+        response = self.post_webhook('comida 200')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/xml')
+        self.assertIn(b'<Message>Gasto registrado: Comida: $200', response.content)
+        self.assertFalse(MensajeSaliente.objects.exists())
+
+    def test_rest_envia_por_la_api(self):
+        with TwilioStandIn() as standin, standin.settings(WHATSAPP_REPLY_MODE='rest'):
+            response = self.post_webhook('comida 200')
+
+        self.assertEqual(response.json(), {'status': 'success'})
+        self.assertEqual(standin.requests, 1)
+
+
+class TwilioClientRegistryTests(GastosTestCase):
+    """
+    Pruebas del cliente de Twilio compartido por proceso
+    """
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    def test_reutiliza_cliente_y_conexiones(self):
+        builds = pool_stats()['builds']
+        with TwilioStandIn() as standin, standin.settings():
+            first, second = WhatsAppService(), WhatsAppService()
+            for i in range(3):
+                first.deliver(PHONE, f'hola {i}')
+                second.deliver(PHONE, f'chau {i}')
+            stats = pool_stats()
+
+        self.assertIs(first.client, second.client)
+        self.assertEqual(stats['builds'], builds + 1)
+        self.assertEqual(stats['pool']['requests_sent'], 6)
+        self.assertEqual(stats['pool']['connections_opened'], 1)
+
+    def test_recrea_cliente_en_otro_proceso(self):
+        with TwilioStandIn() as standin, standin.settings():
+            client = WhatsAppService().client
+            registry._pid = -1  # simula el hijo después de un fork
+            self.assertIsNot(WhatsAppService().client, client)
+
+
+@override_settings(TWILIO_STUB=False, TWILIO_ACCOUNT_SID='AC' + '0' * 32, TWILIO_AUTH_TOKEN='token')
+class AsyncClientRegistryTests(GastosTestCase):
+    """
+    Pruebas del cierre de las sesiones aiohttp del cliente async de Twilio
+    """
+
+    async def crear_cliente(self):
+        return get_async_client()
+
+    def test_reset_cierra_la_sesion_en_su_loop(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        client = loop.run_until_complete(self.crear_cliente())
+
+        async_registry.reset()
+
+        self.assertTrue(client.http_client.session.closed)
+
+    def test_lifespan_cierra_el_cliente_al_apagar(self):
+        mensajes = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        enviados = []
+
+        async def receive():
+            return mensajes.pop(0)
+
+        async def send(mensaje):
+            enviados.append(mensaje['type'])
+
+        async def servir():
+            client = await self.crear_cliente()
+            await con_lifespan(None)({'type': 'lifespan'}, receive, send)
+            return client
+
+        client = async_to_sync(servir)()
+
+        self.assertTrue(client.http_client.session.closed)
+        self.assertEqual(enviados, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+class GastoQueryPlanTests(GastosTestCase):
+    """
+    Verifica con EXPLAIN que las consultas por teléfono usan los índices
+    compuestos (SQLite y PostgreSQL)
+    """
+    # Índices aceptados para las consultas por teléfono de cada tabla
+    # (nombres de PostgreSQL y SQLite)
+    INDEXES = {
+        'gastos_gasto': ('gasto_usuario_fecha_idx', 'gasto_usuario_cat_fecha_idx'),
+        'gastos_gastodiario': ('gasto_diario_unico', 'sqlite_autoindex_gastos_gastodiario'),
+        'gastos_usuario': ('gastos_usuario_numero_telefono_key', 'sqlite_autoindex_gastos_usuario'),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        Gasto.objects.bulk_create([
+            nuevo_gasto(
+                f'+54900000000{i % 10}',
+                f'Categoria {i % 7}',
+                monto=Decimal(i),
+                fecha=now - timedelta(hours=i),
+                mensaje_original=f'categoria {i}',
+            )
+            for i in range(500)
+        ])
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Con pocas filas el planificador prefiere un seq scan
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            return '\n'.join(str(row) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, func, *args, tablas=('gastos_gasto',)):
+        """
+        Cada SELECT por teléfono usa un índice de su tabla (sin scan
+        completo) y se consultan todas las tablas indicadas
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            func(*args)
+        selects = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and ('numero_telefono' in q['sql'] or '"usuario_id" =' in q['sql'])
+        ]
+        consultadas = set()
+        for sql in selects:
+            tabla = re.search(r' FROM "(\w+)"', sql).group(1)
+            consultadas.add(tabla)
+            plan = self.explain(sql)
+            self.assertNotIn(f'SCAN {tabla}\n', plan + '\n', f'{sql}\n{plan}')
+            self.assertNotIn('Seq Scan', plan, f'{sql}\n{plan}')
+            if re.search(rf'"{tabla}"\."id" (=|IN) ', sql):
+                # Búsqueda por clave primaria
+                continue
+            self.assertIn(tabla, self.INDEXES, f'Consulta por teléfono sin verificar: {sql}')
+            self.assertTrue(any(index in plan for index in self.INDEXES[tabla]), f'{sql}\n{plan}')
+        self.assertTrue(set(tablas) <= consultadas, f'{func.__name__} no consultó {set(tablas) - consultadas}')
+
+    def test_resumen_usa_indice(self):
+        today = timezone.now().date()
+        self.assertUsesIndex(
+            GastoService.get_resumen_gastos, '+549000000001', today - timedelta(days=3), today,
+            tablas=['gastos_gastodiario']
+        )
+
+    def test_resumen_con_dias_parciales_usa_indice(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            GastoService.get_resumen_periodo, '+549000000001', now - timedelta(days=3, hours=5), now,
+            tablas=['gastos_gasto', 'gastos_gastodiario']
+        )
+
+    def test_gastos_recientes_usa_indice(self):
+        self.assertUsesIndex(GastoService.get_recent_gastos, '+549000000001')
+
+    def test_eliminar_ultimo_usa_indice(self):
+        self.assertUsesIndex(GastoService.delete_last_gasto, '+549000000001')
+
+    def test_eliminar_por_id_usa_clave_primaria(self):
+        gasto = Gasto.objects.filter(usuario__numero_telefono='+549000000001').first()
+        self.assertUsesIndex(GastoService.delete_gasto, '+549000000001', gasto.id)
+
+
+class ResumenTests(GastosTestCase):
+    """
+    Pruebas del resumen agrupado de gastos
+    """
+
+    def test_resumen_agrupa_en_una_consulta(self):
+        # Confirmadas, las filas de dimensión quedan en la caché
+        with self.captureOnCommitCallbacks(execute=True):
+            for categoria, monto in [('Comida', 200), ('Taxi', 50), ('Comida', 300), ('Super', 1000)]:
+                GastoService.create_gasto(PHONE, categoria, Decimal(monto), f'{categoria} {monto}')
+            GastoService.create_gasto('+5490000000000', 'Comida', Decimal(999), 'otro usuario')
+        today = timezone.localdate()
+
+        with self.assertNumQueries(1):
+            resumen = GastoService.get_resumen_gastos(PHONE, today, today)
+
+        self.assertEqual(resumen['total_gastado'], Decimal('1550'))
+        self.assertEqual(resumen['cantidad_gastos'], 4)
+        self.assertEqual(list(resumen['gastos_por_categoria'].items()), [
+            ('Super', Decimal('1000')), ('Comida', Decimal('500')), ('Taxi', Decimal('50')),
+        ])
+        self.assertEqual(resumen['cantidad_por_categoria']['Comida'], 2)
+
+    def test_resumen_sin_gastos(self):
+        today = timezone.localdate()
+        resumen = GastoService.get_resumen_gastos(PHONE, today, today)
+
+        self.assertEqual(resumen['total_gastado'], Decimal('0'))
+        self.assertEqual(resumen['cantidad_gastos'], 0)
+        self.assertEqual(resumen['gastos_por_categoria'], {})
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE])
+class GastoDiarioTests(GastosTestCase):
+    """
+    Pruebas de los totales diarios mantenidos por GastoService
+    """
+
+    def crear(self, categoria, monto, fecha):
+        gasto = GastoService.create_gasto(PHONE, categoria, Decimal(monto), f'{categoria} {monto}')
+        Gasto.objects.filter(pk=gasto.pk).update(fecha=fecha)
+        GastoDiario.objects.all().delete()
+        ResumenDiarioService.rebuild()
+        gasto.refresh_from_db()
+        return gasto
+
+    def test_crear_y_eliminar_actualizan_el_dia(self):
+        GastoService.create_gasto(PHONE, 'Comida', Decimal('200'), 'comida 200')
+        ultimo = GastoService.create_gasto(PHONE, 'Comida', Decimal('50'), 'comida 50')
+
+        fila = GastoDiario.objects.get()
+        self.assertEqual((fila.total, fila.cantidad), (Decimal('250'), 2))
+
+        GastoService.delete_gasto(PHONE, ultimo.id)
+        fila.refresh_from_db()
+        self.assertEqual((fila.total, fila.cantidad), (Decimal('200'), 1))
+
+        GastoService.delete_last_gasto(PHONE)
+        self.assertFalse(GastoDiario.objects.exists())
+
+    def test_dias_parciales_combinan_totales_y_gastos(self):
+        hoy = timezone.localdate()
+        inicio = GastoService._inicio_dia(hoy - timedelta(days=2))
+        self.crear('Comida', 100, inicio + timedelta(hours=1))   # parcial: antes del rango
+        self.crear('Comida', 200, inicio + timedelta(hours=20))  # parcial: dentro
+        self.crear('Taxi', 300, inicio + timedelta(days=1, hours=12))  # día completo
+        self.crear('Taxi', 400, inicio + timedelta(days=2, hours=1))   # parcial: dentro
+        self.crear('Taxi', 500, inicio + timedelta(days=2, hours=23))  # parcial: después
+
+        resumen = GastoService.get_resumen_periodo(
+            PHONE, inicio + timedelta(hours=12), inicio + timedelta(days=2, hours=12)
+        )
+
+        self.assertEqual(resumen['total_gastado'], Decimal('900'))
+        self.assertEqual(resumen['cantidad_gastos'], 3)
+        self.assertEqual(resumen['gastos_por_categoria'], {'Taxi': Decimal('700'), 'Comida': Decimal('200')})
+
+    def test_rebuild_recalcula_desde_gastos(self):
+        GastoService.create_gasto(PHONE, 'Comida', Decimal('200'), 'comida 200')
+        GastoDiario.objects.update(total=0, cantidad=99)
+
+        self.assertEqual(ResumenDiarioService.rebuild(PHONE), 1)
+        fila = GastoDiario.objects.get()
+        self.assertEqual((fila.total, fila.cantidad), (Decimal('200'), 1))
+
+    def test_resumen_mes(self):
+        GastoService.create_gasto(PHONE, 'Comida', Decimal('200'), 'comida 200')
+
+        respuesta = MessageProcessor().process_message(PHONE, 'resumen mes')
+
+        self.assertIn('Total gastado: $200', respuesta)
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE])
+class ResumenCacheTests(GastosTestCase):
+    """
+    Pruebas de la cache de resúmenes y su invalidación
+    """
+
+    def resumen_hoy(self, phone=PHONE):
+        today = timezone.localdate()
+        return GastoService.get_resumen_gastos(phone, today, today)
+
+    def crear(self, phone, monto):
+        with self.captureOnCommitCallbacks(execute=True):
+            return GastoService.create_gasto(phone, 'Comida', Decimal(monto), f'comida {monto}')
+
+    def test_aviso_con_varios_workers_y_cache_en_memoria(self):
+        compartida = {**settings.CACHES, 'resumenes': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379',
+        }}
+
+        self.assertEqual(cache_de_resumenes(None), [])
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([aviso.id for aviso in cache_de_resumenes(None)], ['gastos.W001'])
+            with override_settings(CACHES=compartida):
+                self.assertEqual(cache_de_resumenes(None), [])
+
+    def test_segunda_consulta_sale_de_cache(self):
+        self.crear(PHONE, 200)
+        self.resumen_hoy()
+        hits = resumen_cache.hits
+
+        with self.assertNumQueries(0):
+            resumen = self.resumen_hoy()
+
+        self.assertEqual(resumen['total_gastado'], Decimal('200'))
+        self.assertEqual(resumen_cache.hits, hits + 1)
+
+    def test_crear_y_eliminar_invalidan_solo_ese_telefono(self):
+        otro = '+5490000000000'
+        self.crear(PHONE, 200)
+        self.crear(otro, 10)
+        self.resumen_hoy()
+        self.resumen_hoy(otro)
+
+        self.crear(PHONE, 50)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resumen_hoy(otro)['total_gastado'], Decimal('10'))
+        self.assertEqual(self.resumen_hoy()['total_gastado'], Decimal('250'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GastoService.delete_last_gasto(PHONE)
+        self.assertEqual(self.resumen_hoy()['total_gastado'], Decimal('200'))
+
+
+class GastoListPaginationTests(GastosTestCase):
+    """
+    Pruebas de la paginación por cursor de /api/gastos/
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        base = timezone.now().replace(microsecond=0)
+        Gasto.objects.bulk_create([
+            nuevo_gasto(
+                PHONE if i % 2 else '+5490000000000',
+                'Comida' if i % 3 else 'Taxi',
+                monto=Decimal(i),
+                # Fechas repetidas de a pares para probar el desempate por id
+                fecha=base - timedelta(minutes=i // 2),
+                mensaje_original=f'gasto {i}',
+            )
+            for i in range(25)
+        ])
+
+    def fetch_all(self, params):
+        ids, url = [], '/api/gastos/'
+        while True:
+            data = self.client.get(url, params).json()
+            ids += [gasto['id'] for gasto in data['results']]
+            if not data['next_cursor']:
+                return ids
+            params = {**params, 'cursor': data['next_cursor']}
+
+    def test_recorre_todas_las_filas_en_orden(self):
+        ids = self.fetch_all({'page_size': 4})
+
+        esperado = list(Gasto.objects.order_by('-fecha', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, esperado)
+
+    def test_filtros(self):
+        ids = self.fetch_all({'page_size': 3, 'numero_telefono': PHONE, 'categoria': 'Comida'})
+
+        esperado = Gasto.objects.filter(usuario__numero_telefono=PHONE, categoria__nombre='Comida').order_by('-fecha', '-id')
+        self.assertEqual(ids, list(esperado.values_list('id', flat=True)))
+
+    @override_settings(API_MAX_PAGE_SIZE=10)
+    def test_limita_el_tamano_de_pagina(self):
+        data = self.client.get('/api/gastos/', {'page_size': 1000}).json()
+
+        self.assertEqual(len(data['results']), 10)
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/gastos/', {'cursor': 'basura'}).status_code, 404)
+        self.assertEqual(self.client.get('/api/gastos/', {'desde': '2025-13-01'}).status_code, 400)
+
+
+class GastoExportTests(GastosTestCase):
+    """
+    Pruebas de la exportación en streaming
+    """
+
+    def crear_gastos(self, cantidad, phone=PHONE):
+        base = timezone.now()
+        usuario_id = usuario_cache.id(phone, crear=True)
+        categoria_id = categoria_cache.id('Comida', crear=True)
+        for offset in range(0, cantidad, 10_000):
+            Gasto.objects.bulk_create([
+                Gasto(
+                    usuario_id=usuario_id,
+                    categoria_id=categoria_id,
+                    monto=Decimal('12.50'),
+                    fecha=base - timedelta(seconds=i),
+                    mensaje_original='comida, con "comillas"',
+                )
+                for i in range(offset, min(offset + 10_000, cantidad))
+            ])
+
+    def test_export_csv_filtrado(self):
+        self.crear_gastos(3)
+        self.crear_gastos(2, phone='+5490000000000')
+
+        response = self.client.get('/api/gastos/export/', {'numero_telefono': PHONE})
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        filas = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(filas[0], ['id', 'numero_telefono', 'categoria', 'monto', 'fecha', 'mensaje_original'])
+        self.assertEqual(len(filas), 4)
+        self.assertEqual(filas[1][3:4] + filas[1][5:], ['12.50', 'comida, con "comillas"'])
+
+    def test_export_ndjson(self):
+        self.crear_gastos(3)
+
+        response = self.client.get('/api/gastos/export/', {'formato': 'ndjson'})
+
+        lineas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lineas), 3)
+        self.assertEqual(json.loads(lineas[0])['monto'], '12.50')
+
+    def test_export_con_memoria_acotada(self):
+        """
+        La memoria usada al exportar no depende de la cantidad de filas.
+        GASTOS_EXPORT_TEST_ROWS permite correrla con millones de filas.
+        """
+        rows = int(os.environ.get('GASTOS_EXPORT_TEST_ROWS', '20000'))
+        self.crear_gastos(rows)
+
+        tracemalloc.start()
+        try:
+            total = sum(len(block) for block in iter_export(Gasto.objects.all(), 'csv', chunk_size=1000))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertGreater(total, rows * 50)
+        self.assertLess(peak, 4 * 1024 * 1024)
+
+
+class ImportGastosTests(GastosTestCase):
+    """
+    Pruebas de la importación masiva por lotes
+    """
+
+    def records(self, cantidad, falla_en=None):
+        for i in range(1, cantidad + 1):
+            if i == falla_en:
+                raise RuntimeError('archivo cortado')
+            yield {'numero_telefono': PHONE, 'categoria': 'comida', 'monto': str(i), 'fecha': '2025-03-01'}
+
+    def test_importa_en_lotes_y_actualiza_totales(self):
+        registros = list(self.records(5)) + [{'numero_telefono': PHONE, 'categoria': 'taxi', 'monto': 'x'}]
+
+        importacion = GastoImporter('prueba', batch_size=2).run(registros)
+
+        self.assertEqual((importacion.importados, importacion.rechazados), (5, 1))
+        self.assertTrue(importacion.completada)
+        self.assertEqual(Gasto.objects.filter(categoria__nombre='Comida').count(), 5)
+        fila = GastoDiario.objects.get()
+        self.assertEqual((fila.total, fila.cantidad), (Decimal('15'), 5))
+
+    def test_rechaza_valores_que_no_entran_en_las_columnas(self):
+        registros = [
+            {'numero_telefono': PHONE, 'categoria': 'x' * 101, 'monto': '10'},
+            {'numero_telefono': '+' + '1' * 25, 'categoria': 'comida', 'monto': '10'},
+            {'numero_telefono': PHONE, 'categoria': 'comida', 'monto': '100000000'},
+            {'numero_telefono': PHONE, 'categoria': 'comida', 'monto': '10'},
+        ]
+
+        importer = GastoImporter('prueba')
+        importacion = importer.run(registros)
+
+        self.assertEqual((importacion.importados, importacion.rechazados), (1, 3))
+        self.assertEqual([numero for numero, _ in importer.errores], [1, 2, 3])
+        self.assertEqual(list(Categoria.objects.values_list('nombre', flat=True)), ['Comida'])
+        self.assertEqual(list(Usuario.objects.values_list('numero_telefono', flat=True)), [PHONE])
+
+    def test_lote_fallido_no_deja_dimensiones(self):
+        registros = [{'numero_telefono': '+5491100000000', 'categoria': 'taxi', 'monto': '10'}]
+
+        with mock.patch.object(ResumenDiarioService, 'registrar_lote', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                GastoImporter('prueba').run(registros)
+
+        self.assertFalse(Usuario.objects.exists())
+        self.assertFalse(Categoria.objects.exists())
+
+    def test_retoma_desde_el_ultimo_lote(self):
+        with self.assertRaises(RuntimeError):
+            GastoImporter('prueba', batch_size=2).run(self.records(7, falla_en=6))
+        self.assertEqual(Importacion.objects.get(clave='prueba').filas_procesadas, 4)
+
+        importacion = GastoImporter('prueba', batch_size=2).run(self.records(7))
+
+        self.assertEqual(importacion.importados, 7)
+        self.assertEqual(
+            sorted(Gasto.objects.values_list('monto', flat=True)),
+            [Decimal(i) for i in range(1, 8)]
+        )
+
+    def test_resuelve_categorias_parecidas(self):
+        GastoService.create_gasto(PHONE, 'Supermercado', Decimal('100'), 'supermercado 100')
+        lotes = [('supermercad', 'comida'), ('comidas', 'cmida')]
+
+        # Cada lote confirmado agrega sus categorías al índice del teléfono
+        for numero, categorias in enumerate(lotes):
+            with self.captureOnCommitCallbacks(execute=True):
+                GastoImporter(f'prueba-{numero}').run(
+                    {'numero_telefono': PHONE, 'categoria': categoria, 'monto': '10'} for categoria in categorias
+                )
+
+        self.assertEqual(
+            sorted(Gasto.objects.values_list('categoria__nombre', flat=True)),
+            ['Comida', 'Comida', 'Comida', 'Supermercado', 'Supermercado']
+        )
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE])
+class MultiGastoMessageTests(GastosTestCase):
+    """
+    Pruebas de mensajes con varios gastos, uno por línea
+    """
+
+    def test_registra_todas_las_lineas_en_un_insert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = MessageProcessor().process_message(PHONE, 'comida 200\ntaxi 50\n\nsuper 3000')
+
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "gastos_gasto"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Gasto.objects.count(), 3)
+        self.assertTrue(respuesta.startswith('Gastos registrados: 3'))
+        for gasto in Gasto.objects.all():
+            self.assertIn(f'ID {gasto.id}: {gasto.nombre_categoria}: $', respuesta)
+        self.assertEqual(GastoDiario.objects.get(categoria__nombre='Super').total, Decimal('3000'))
+
+    def test_informa_lineas_rechazadas(self):
+        respuesta = MessageProcessor().process_message(PHONE, 'comida 200\nhola\ntaxi')
+
+        self.assertEqual(Gasto.objects.count(), 1)
+        self.assertIn('Gastos registrados: 1', respuesta)
+        self.assertIn('- hola', respuesta)
+        self.assertIn('- taxi', respuesta)
+
+    def test_sin_lineas_validas(self):
+        respuesta = MessageProcessor().process_message(PHONE, 'hola\nchau')
+
+        self.assertFalse(Gasto.objects.exists())
+        self.assertTrue(respuesta.startswith('No se registro ningun gasto.'))
+
+
+class CommandRouterTests(GastosTestCase):
+    """
+    Pruebas del ruteo de mensajes a intents
+    """
+
+    def test_intents(self):
+        casos = {
+            '  Mis Gastos ': 'listar',
+            'GASTOS': 'listar',
+            'Resumen hoy': 'resumen',
+            'resumen 01-07 al 29-07': 'resumen',
+            'Borrar ultimo': 'eliminar',
+            'eliminar 3': 'eliminar',
+            'comida 200': 'gasto',
+            'gastos varios 300': 'gasto',
+            '': 'gasto',
+        }
+        for mensaje, intent in casos.items():
+            with self.subTest(mensaje=mensaje):
+                self.assertEqual(router.route(normalize(mensaje)), intent)
+
+    def test_texto_normalizado_se_parsea_igual(self):
+        text = normalize('  Eliminar 7 ')
+        self.assertEqual((text, router.route(text)), ('eliminar 7', 'eliminar'))
+        self.assertEqual(GastoService.parse_delete_message(text, normalized=True), ('id', 7))
+        self.assertEqual(GastoService.parse_delete_message('  Eliminar 7 '), ('id', 7))
+
+        categoria, monto = GastoService.parse_gasto_message(normalize('Netflix 1500'), normalized=True)
+        self.assertEqual((categoria, monto), ('Netflix', Decimal('1500')))
+
+
+@override_settings(AUTHORIZED_PHONES=[''], AUTHORIZED_PHONES_REFRESH_SECONDS=0)
+class TelefonoAutorizadoTests(GastosTestCase):
+    """
+    Pruebas del registro de teléfonos autorizados
+    """
+
+    def test_alta_y_baja_sin_redeploy(self):
+        self.assertFalse(GastoService.is_authorized_phone(PHONE))
+        self.assertFalse(GastoService.is_authorized_phone(''))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            telefono = TelefonoAutorizado.objects.create(numero_telefono='+54 9 353 123-4567')
+        self.assertEqual(telefono.numero_telefono, PHONE)
+        self.assertTrue(GastoService.is_authorized_phone(PHONE))
+        self.assertTrue(GastoService.is_authorized_phone('+54 (9) 353 123 4567'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            telefono.activo = False
+            telefono.save()
+        self.assertFalse(GastoService.is_authorized_phone(PHONE))
+
+    def test_consulta_sin_queries(self):
+        TelefonoAutorizado.objects.bulk_create(
+            TelefonoAutorizado(numero_telefono=f'+54935{i:07d}') for i in range(2000)
+        )
+        telefonos_autorizados.phones()
+        with self.assertNumQueries(0):
+            for i in range(2000):
+                self.assertTrue(GastoService.is_authorized_phone(f'+54935{i:07d}'))
+
+    def test_otro_proceso_recarga_por_version(self):
+        otro_proceso = TelefonosAutorizados()
+        self.assertNotIn(PHONE, otro_proceso.phones())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TelefonoAutorizado.objects.create(numero_telefono=PHONE)
+        self.assertIn(PHONE, otro_proceso.phones())
+        self.assertEqual(otro_proceso.loads, 2)
+
+    def test_api_solo_staff_y_normaliza(self):
+        url = '/api/telefonos/'
+        self.assertEqual(self.client.post(url, {'numero_telefono': PHONE}).status_code, 403)
+
+        admin = User.objects.create_user('admin', password='x', is_staff=True)
+        self.client.force_login(admin)
+        response = self.client.post(url, {'numero_telefono': '+54 9 353 123-4567', 'nombre': 'Lautaro'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['numero_telefono'], PHONE)
+
+        response = self.client.post(url, {'numero_telefono': PHONE})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.client.get(url).json()), 1)
+
+    def test_aviso_con_varios_workers_y_cache_en_memoria(self):
+        compartido = {**settings.CACHES, 'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379',
+        }}
+
+        self.assertEqual(cache_de_telefonos(None), [])
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([aviso.id for aviso in cache_de_telefonos(None)], ['gastos.W002'])
+            with override_settings(CACHES=compartido):
+                self.assertEqual(cache_de_telefonos(None), [])
+
+
+class StructuredLoggingTests(GastosTestCase):
+    """
+    Pruebas del logging encolado en JSON
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.stream = io.StringIO()
+        self.handler = QueuedHandler(queue_size=10)
+        self.handler.target.setStream(self.stream)
+        self.handler.addFilter(RequestIdFilter())
+        self.handler.setFormatter(JsonFormatter())
+        self.logger = logging.getLogger('gastos')
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+        super().tearDown()
+
+    def records(self):
+        self.handler.flush()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_redacta_telefonos(self):
+        self.assertEqual(redact_phones('de whatsapp:+54 9 353 123-4567'), 'de whatsapp:***4567')
+        self.assertEqual(redact_phones('SM00000000000000000001 monto 200'), 'SM00000000000000000001 monto 200')
+
+    @override_settings(AUTHORIZED_PHONES=[PHONE], LOG_PAYLOAD_SAMPLE_RATE=0)
+    def test_webhook_json_con_request_id(self):
+        response = self.client.post(
+            '/webhook/whatsapp/', {'From': f'whatsapp:{PHONE}', 'Body': 'comida 200'},
+            HTTP_X_REQUEST_ID='req-123'
+        )
+        self.assertEqual(response['X-Request-ID'], 'req-123')
+
+        records = self.records()
+        self.assertTrue(records)
+        self.assertTrue(all(r['request_id'] == 'req-123' for r in records))
+        self.assertNotIn('Payload del webhook', [r['message'] for r in records])
+        recibido = next(r for r in records if r['message'] == 'Webhook recibido')
+        self.assertEqual(recibido['datos']['from'], '***4567')
+        self.assertNotIn(PHONE, self.stream.getvalue())
+
+    @override_settings(AUTHORIZED_PHONES=[PHONE], LOG_PAYLOAD_SAMPLE_RATE=1)
+    def test_payload_muestreado_sin_headers_privados(self):
+        self.client.post(
+            '/webhook/whatsapp/', {'From': f'whatsapp:{PHONE}', 'Body': 'comida 200'},
+            HTTP_X_TWILIO_SIGNATURE='firma'
+        )
+        payload = next(r for r in self.records() if r['message'] == 'Payload del webhook')
+        self.assertEqual(payload['datos']['post']['Body'], ['comida 200'])
+        self.assertNotIn('X-Twilio-Signature', payload['datos']['headers'])
+
+    def test_cola_llena_descarta_sin_bloquear(self):
+        self.handler.listener.stop()
+        for i in range(15):
+            self.logger.info(f"registro {i}")
+        self.assertEqual(self.handler.dropped, 5)
+        self.handler.listener.start()
+        self.assertEqual(len(self.records()), 10)
+
+    def test_flush_no_reinicia_el_listener(self):
+        hilo = self.handler.listener._thread
+        self.logger.info('registro')
+
+        self.assertEqual([r['message'] for r in self.records()], ['registro'])
+        self.assertIs(self.handler.listener._thread, hilo)
+
+    @skipUnless(hasattr(os, 'fork'), 'requiere os.fork')
+    def test_listener_sigue_despues_del_fork(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            path = os.path.join(directorio, 'log.json')
+            handler = QueuedHandler(filename=path)
+            handler.setFormatter(JsonFormatter())
+            self.logger.addHandler(handler)
+            try:
+                pid = os.fork()
+                if pid == 0:
+                    # Proceso hijo (como un worker de gunicorn --preload)
+                    try:
+                        self.logger.info('desde el hijo')
+                        handler.flush()
+                    finally:
+                        os._exit(0)
+                os.waitpid(pid, 0)
+            finally:
+                self.logger.removeHandler(handler)
+                handler.close()
+            with open(path, encoding='utf-8') as f:
+                mensajes = [json.loads(line)['message'] for line in f]
+
+        self.assertEqual(mensajes, ['desde el hijo'])
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE])
+class WebhookIdempotenciaTests(GastosTestCase):
+    """
+    Pruebas de los reintentos de Twilio con el mismo MessageSid
+    """
+
+    def post(self, sid='SM0001', body='comida 200'):
+        return self.client.post('/webhook/whatsapp/', {
+            'From': f'whatsapp:{PHONE}', 'Body': body, 'MessageSid': sid,
+        })
+
+    @override_settings(WHATSAPP_REPLY_MODE='twiml')
+    def test_reintento_devuelve_la_respuesta_original(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            primera = self.post()
+        with self.assertNumQueries(0):
+            segunda = self.post()
+
+        self.assertEqual(primera.content, segunda.content)
+        self.assertEqual(Gasto.objects.count(), 1)
+        self.assertEqual(GastoDiario.objects.get().cantidad, 1)
+
+        # Sin el cache (otro worker) se resuelve con la tabla
+        caches['default'].clear()
+        self.assertEqual(self.post().content, primera.content)
+        self.assertEqual(Gasto.objects.count(), 1)
+
+        self.post(sid='SM0002')
+        self.assertEqual(Gasto.objects.count(), 2)
+
+    @override_settings(WHATSAPP_REPLY_MODE='outbox')
+    def test_outbox_encola_una_sola_respuesta(self):
+        primera = self.post().json()
+        segunda = self.post().json()
+
+        self.assertEqual(primera['outbox_id'], segunda['outbox_id'])
+        self.assertEqual(MensajeSaliente.objects.count(), 1)
+        self.assertEqual(Gasto.objects.count(), 1)
+
+    def test_rest_no_reenvia(self):
+        with TwilioStandIn() as standin, standin.settings(WHATSAPP_REPLY_MODE='rest'):
+            self.post()
+            self.assertEqual(self.post().json(), {'status': 'success'})
+
+        self.assertEqual(standin.requests, 1)
+
+    def test_error_no_queda_registrado(self):
+        def procesar():
+            raise RuntimeError('falla')
+
+        with self.assertRaises(RuntimeError):
+            IdempotenciaService.procesar_una_vez('SM0003', PHONE, procesar)
+        self.assertFalse(MensajeEntrante.objects.exists())
+
+    def test_purga_por_ttl(self):
+        MensajeEntrante.objects.create(message_sid='SMviejo', numero_telefono=PHONE,
+                                       procesado=timezone.now() - timedelta(hours=49))
+        MensajeEntrante.objects.create(message_sid='SMnuevo', numero_telefono=PHONE)
+
+        call_command('purge_mensajes_entrantes', hours=48, stdout=io.StringIO())
+        self.assertEqual(list(MensajeEntrante.objects.values_list('message_sid', flat=True)), ['SMnuevo'])
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE])
+class AsyncViewsTests(GastosTestCase):
+    """
+    Pruebas de las vistas async (ASGI)
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+        base = timezone.now().replace(microsecond=0)
+        Gasto.objects.bulk_create([
+            nuevo_gasto(PHONE, 'Comida', monto=Decimal(i),
+                  fecha=base - timedelta(minutes=i), mensaje_original=f'comida {i}')
+            for i in range(1, 8)
+        ])
+
+    def webhook(self, sid='SM0001', body='taxi 50'):
+        request = self.factory.post('/webhook/whatsapp/', {
+            'From': f'whatsapp:{PHONE}', 'Body': body, 'MessageSid': sid,
+        })
+        return AsyncTwilioWebhookView.as_view()(request)
+
+    @override_settings(WHATSAPP_REPLY_MODE='twiml')
+    async def test_webhook_twiml_idempotente(self):
+        primera = await self.webhook()
+        segunda = await self.webhook()
+
+        self.assertEqual(primera['Content-Type'], 'text/xml')
+        self.assertIn(b'<Message>Gasto registrado: Taxi: $50', primera.content)
+        self.assertEqual(primera.content, segunda.content)
+        self.assertEqual(await Gasto.objects.filter(categoria__nombre='Taxi').acount(), 1)
+
+    @override_settings(WHATSAPP_REPLY_MODE='rest', TWILIO_STUB=True)
+    async def test_webhook_rest_envia_con_cliente_async(self):
+        response = await self.webhook()
+
+        self.assertEqual(json.loads(response.content), {'status': 'success'})
+        client = get_async_client()
+        self.assertEqual([m.to for m in client.sent], [f'whatsapp:{PHONE}'])
+
+    async def test_listado_igual_al_sincronico(self):
+        params = {'numero_telefono': PHONE, 'page_size': 3}
+        response = await AsyncGastoListView.as_view()(self.factory.get('/api/gastos/', params))
+        data = json.loads(response.content)
+        esperado = await sync_to_async(lambda: self.client.get('/api/gastos/', params).json())()
+
+        self.assertEqual(data['results'], esperado['results'])
+        self.assertEqual(data['next_cursor'], esperado['next_cursor'])
+
+        response = await AsyncGastoListView.as_view()(self.factory.get('/api/gastos/', {'desde': 'ayer'}))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_detalle_y_export(self):
+        gasto = await Gasto.objects.afirst()
+        response = await AsyncGastoDetailView.as_view()(self.factory.get('/'), pk=gasto.pk)
+        self.assertEqual(json.loads(response.content)['id'], gasto.pk)
+        response = await AsyncGastoDetailView.as_view()(self.factory.get('/'), pk=0)
+        self.assertEqual(response.status_code, 404)
+
+        response = await AsyncGastoExportView.as_view()(
+            self.factory.get('/api/gastos/export/', {'formato': 'ndjson'})
+        )
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response]).decode().splitlines()
+        self.assertEqual(len(lines), 7)
+
+
+class LoadTestTests(GastosTestCase):
+    """
+    Pruebas del conteo de consultas y de la mezcla de la prueba de carga
+    """
+
+    def test_query_counter(self):
+        with QueryCounter() as counter:
+            Gasto.objects.count()
+            Gasto.objects.filter(usuario__numero_telefono=PHONE).exists()
+        self.assertEqual(counter.count, 2)
+
+    @override_settings(DB_QUERY_COUNT_HEADER=True)
+    def test_header_x_db_queries(self):
+        response = self.client.get('/api/gastos/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+
+    def test_sin_header_por_defecto(self):
+        response = self.client.get('/api/gastos/')
+
+        self.assertNotIn('X-DB-Queries', response)
+
+    def test_mezcla_de_mensajes(self):
+        mix = parse_mix('gasto=70,resumen=20,listar=10')
+        payloads = webhook_payloads(1000, mix, [PHONE], seed=1)
+
+        kinds = [kind for kind, _ in payloads]
+        self.assertEqual(set(kinds), {'gasto', 'resumen', 'listar'})
+        self.assertAlmostEqual(kinds.count('gasto') / 1000, 0.7, delta=0.05)
+        self.assertEqual(len({datos['MessageSid'] for _, datos in payloads}), 1000)
+        self.assertEqual(payloads, webhook_payloads(1000, mix, [PHONE], seed=1))
+        for kind, datos in payloads[:50]:
+            self.assertEqual(router.route(normalize(datos['Body'])), kind)
+        with self.assertRaises(ValueError):
+            parse_mix('gasto=50,otro=50')
+
+    def test_load_stats(self):
+        results = [
+            {'tipo': 'gasto', 'ok': True, 'latencia': 0.010, 'consultas': 8, 'error': None},
+            {'tipo': 'gasto', 'ok': True, 'latencia': 0.030, 'consultas': 10, 'error': None},
+            {'tipo': 'resumen', 'ok': False, 'latencia': 0.5, 'consultas': None, 'error': 'HTTP 500'},
+        ]
+        stats = load_stats(results, elapsed=2.0)
+
+        self.assertEqual(stats['total']['requests'], 2)
+        self.assertEqual(stats['total']['throughput_rps'], 1.0)
+        self.assertEqual(stats['total']['errores'], {'HTTP 500': 1})
+        self.assertEqual(stats['por_tipo']['gasto']['consultas_media'], 9)
+        self.assertEqual(stats['por_tipo']['gasto']['consultas_max'], 10)
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE], WHATSAPP_REPLY_MODE='twiml')
+class MetricsTests(GastosTestCase):
+    """
+    Pruebas de las métricas de Prometheus
+    """
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def post_webhook(self, body, sid):
+        return self.client.post('/webhook/whatsapp/', {
+            'From': f'whatsapp:{PHONE}', 'Body': body, 'MessageSid': sid,
+        })
+
+    def test_latencia_del_webhook_por_comando(self):
+        gastos = self.sample('gastos_webhook_duration_seconds_count', comando='gasto')
+        resumenes = self.sample('gastos_webhook_duration_seconds_count', comando='resumen')
+        listados = self.sample('gastos_webhook_duration_seconds_count', comando='listar')
+
+        self.post_webhook('comida 200', 'SM0001')
+        self.post_webhook('taxi 50\nsuper 300', 'SM0002')
+        self.post_webhook('Resumen hoy', 'SM0003')
+        self.post_webhook('mis gastos', 'SM0004')
+
+        self.assertEqual(self.sample('gastos_webhook_duration_seconds_count', comando='gasto') - gastos, 2)
+        self.assertEqual(self.sample('gastos_webhook_duration_seconds_count', comando='resumen') - resumenes, 1)
+        self.assertEqual(self.sample('gastos_webhook_duration_seconds_count', comando='listar') - listados, 1)
+
+    def test_consultas_por_vista(self):
+        antes = self.sample('gastos_db_queries_per_request_count', vista='twilio-webhook')
+        consultas = self.sample('gastos_db_queries_per_request_sum', vista='twilio-webhook')
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.post_webhook('comida 200', 'SM0001')
+
+        self.assertEqual(self.sample('gastos_db_queries_per_request_count', vista='twilio-webhook') - antes, 1)
+        self.assertEqual(
+            self.sample('gastos_db_queries_per_request_sum', vista='twilio-webhook') - consultas, len(ctx)
+        )
+
+    def test_envios_y_fallos_de_twilio(self):
+        envios = self.sample('gastos_twilio_send_duration_seconds_count', cliente='sync')
+        fallos = self.sample('gastos_twilio_send_failures_total', cliente='sync', error='RuntimeError')
+        service = WhatsAppService(client=StubTwilioClient(fail_for=['whatsapp:+5490000000000']))
+
+        self.assertTrue(service.send_message(PHONE, 'hola'))
+        self.assertFalse(service.send_message('+5490000000000', 'hola'))
+
+        self.assertEqual(self.sample('gastos_twilio_send_duration_seconds_count', cliente='sync') - envios, 2)
+        self.assertEqual(
+            self.sample('gastos_twilio_send_failures_total', cliente='sync', error='RuntimeError') - fallos, 1
+        )
+
+    def test_aciertos_de_cache(self):
+        hits = self.sample('gastos_cache_requests_total', cache='resumenes', resultado='hit')
+        misses = self.sample('gastos_cache_requests_total', cache='resumenes', resultado='miss')
+
+        self.post_webhook('resumen hoy', 'SM0001')
+        self.post_webhook('resumen hoy', 'SM0002')
+
+        self.assertEqual(self.sample('gastos_cache_requests_total', cache='resumenes', resultado='miss') - misses, 1)
+        self.assertEqual(self.sample('gastos_cache_requests_total', cache='resumenes', resultado='hit') - hits, 1)
+
+    def test_endpoint_metrics(self):
+        self.post_webhook('comida 200', 'SM0001')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'gastos_webhook_duration_seconds_bucket{comando="gasto"', response.content)
+        self.assertIn(b'gastos_db_queries_per_request_count{vista="twilio-webhook"}', response.content)
+
+
+class EstadisticasTests(GastosTestCase):
+    """
+    Pruebas de /api/stats/
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Confirmadas, las filas de dimensión quedan en la caché
+        with self.captureOnCommitCallbacks(execute=True):
+            GastoDiario.objects.bulk_create([
+                nuevo_diario(PHONE, 'Comida', dia=date(2026, 1, 5), total=Decimal('100.50'), cantidad=2),
+                nuevo_diario(PHONE, 'Taxi', dia=date(2026, 1, 20), total=Decimal('50'), cantidad=1),
+                nuevo_diario(PHONE, 'Comida', dia=date(2026, 3, 2), total=Decimal('300'), cantidad=3),
+                nuevo_diario(PHONE, 'Comida', dia=date(2026, 4, 30), total=Decimal('150'), cantidad=1),
+                nuevo_diario('+5490000000000', 'Comida', dia=date(2026, 1, 5), total=Decimal('999'), cantidad=1),
+            ])
+
+    def stats(self, **params):
+        return self.client.get('/api/stats/', {'numero_telefono': PHONE, **params})
+
+    def test_serie_mensual(self):
+        with self.assertNumQueries(2):
+            data = self.stats(periodo='mes', ventana=2, hasta='2026-04-30').json()
+
+        self.assertEqual(data['desde'], '2026-01-05')
+        self.assertEqual(data['total_gastado'], 600.5)
+        self.assertEqual(data['cantidad_gastos'], 7)
+        self.assertEqual([p['inicio'] for p in data['serie']], ['2026-01-01', '2026-02-01', '2026-03-01', '2026-04-01'])
+        self.assertEqual([p['total'] for p in data['serie']], [150.5, 0, 300, 150])
+        self.assertEqual([p['media_movil'] for p in data['serie']], [None, 75.25, 150, 225])
+        self.assertEqual([p['variacion'] for p in data['serie']], [None, -150.5, 300, -150])
+        self.assertEqual([p['variacion_pct'] for p in data['serie']], [None, -100.0, None, -50.0])
+
+    def test_participacion_por_categoria(self):
+        data = self.stats(desde='2026-01-01', hasta='2026-01-31').json()
+
+        self.assertEqual(data['categorias'], [
+            {'categoria': 'Comida', 'total': 100.5, 'cantidad': 2, 'porcentaje': 66.8},
+            {'categoria': 'Taxi', 'total': 50.0, 'cantidad': 1, 'porcentaje': 33.2},
+        ])
+
+    def test_series_diaria_y_semanal(self):
+        diaria = self.stats(periodo='dia', desde='2026-01-04', hasta='2026-01-06').json()
+        semanal = self.stats(periodo='semana', desde='2026-01-01', hasta='2026-01-31').json()
+
+        self.assertEqual([p['total'] for p in diaria['serie']], [0, 100.5, 0])
+        self.assertEqual(diaria['ventana'], 7)
+        self.assertEqual(semanal['serie'][0]['inicio'], '2025-12-29')
+        self.assertEqual(sum(p['total'] for p in semanal['serie']), 150.5)
+        self.assertEqual(semanal['serie'][1]['total'], 100.5)
+
+    def test_sin_gastos(self):
+        data = self.client.get('/api/stats/', {'numero_telefono': '+5491100000000', 'periodo': 'dia'}).json()
+
+        self.assertEqual(data['total_gastado'], 0)
+        self.assertEqual(len(data['serie']), 1)
+        self.assertEqual(data['categorias'], [])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/stats/').status_code, 400)
+        self.assertEqual(self.stats(periodo='anio').status_code, 400)
+        self.assertEqual(self.stats(ventana='0').status_code, 400)
+        self.assertEqual(self.stats(desde='2026-05-01', hasta='2026-04-01').status_code, 400)
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE])
+class PresupuestoTests(GastosTestCase):
+    """
+    Pruebas de los presupuestos mensuales y sus totales incrementales
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.processor = MessageProcessor()
+
+    def mensaje(self, body):
+        return self.processor.process_message(PHONE, body)
+
+    def test_definir_y_avisar_en_cada_gasto(self):
+        self.assertEqual(
+            self.mensaje('presupuesto comida 500'),
+            "Presupuesto de Comida: $500 por mes\nTe quedan $500.00 de $500.00 en Comida este mes"
+        )
+
+        self.assertIn("Te quedan $300.00 de $500.00 en Comida este mes", self.mensaje('comida 200'))
+        self.assertIn("Superaste el presupuesto de Comida ($500.00) por $100.00", self.mensaje('comida 400'))
+        self.assertNotIn("presupuesto", self.mensaje('taxi 50'))
+
+    def test_gastos_de_varias_lineas(self):
+        PresupuestoService.definir(PHONE, 'Comida', Decimal('500'))
+
+        response = self.mensaje('comida 100\ntaxi 30\ncomida 50')
+
+        self.assertIn("Te quedan $350.00 de $500.00 en Comida este mes", response)
+        self.assertEqual(response.count('Te quedan'), 1)
+
+    def test_control_sin_sumar_el_mes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            PresupuestoService.definir(PHONE, 'Comida', Decimal('500'))
+            GastoService.create_gasto(PHONE, 'Comida', Decimal('120.5'), 'comida 120.5')
+
+        with CaptureQueriesContext(connection) as ctx:
+            estado = PresupuestoService.estado(PHONE, 'Comida')
+        with self.assertNumQueries(1):
+            self.assertIsNone(PresupuestoService.estado(PHONE, 'Taxi'))
+
+        self.assertEqual(estado, (Decimal('500'), Decimal('120.50')))
+        self.assertEqual(len(ctx), 2)
+        self.assertFalse(any('gastos_gasto"' in q['sql'] for q in ctx.captured_queries))
+
+    def test_totales_mensuales_incrementales(self):
+        GastoService.create_gasto(PHONE, 'Comida', Decimal('200'), 'comida 200')
+        GastoService.create_gastos(PHONE, [('Comida', Decimal('50'), 'comida 50'), ('Taxi', Decimal('30'), 'taxi 30')])
+        mes = timezone.localdate().replace(day=1)
+
+        fila = GastoMensual.objects.get(categoria__nombre='Comida')
+        self.assertEqual((fila.mes, fila.total, fila.cantidad), (mes, Decimal('250'), 2))
+
+        GastoService.delete_last_gasto(PHONE)
+        GastoService.delete_last_gasto(PHONE)
+        self.assertEqual(GastoMensual.objects.get(categoria__nombre='Comida').total, Decimal('200'))
+        self.assertFalse(GastoMensual.objects.filter(categoria__nombre='Taxi').exists())
+
+        esperado = list(GastoMensual.objects.values_list('mes', 'categoria_id', 'total', 'cantidad'))
+        GastoMensual.objects.all().delete()
+        ResumenDiarioService.rebuild()
+        self.assertEqual(list(GastoMensual.objects.values_list('mes', 'categoria_id', 'total', 'cantidad')), esperado)
+
+    def test_el_mes_anterior_no_cuenta(self):
+        PresupuestoService.definir(PHONE, 'Comida', Decimal('500'))
+        gasto = GastoService.create_gasto(PHONE, 'Comida', Decimal('400'), 'comida 400')
+        Gasto.objects.filter(pk=gasto.pk).update(fecha=gasto.fecha - timedelta(days=40))
+        ResumenDiarioService.rebuild()
+
+        self.assertEqual(PresupuestoService.estado(PHONE, 'Comida'), (Decimal('500'), Decimal('0')))
+
+    def test_listar_y_eliminar(self):
+        self.assertIn("No tienes presupuestos", self.mensaje('presupuestos'))
+        self.mensaje('presupuesto comida 500')
+        self.mensaje('presupuesto super mercado 20000')
+        self.mensaje('super mercado 1500')
+
+        response = self.mensaje('presupuestos')
+        self.assertIn("- Te quedan $500.00 de $500.00 en Comida este mes (llevas $0.00)", response)
+        self.assertIn("- Te quedan $18500.00 de $20000.00 en Super Mercado este mes (llevas $1500.00)", response)
+
+        self.assertEqual(self.mensaje('presupuesto comida 0'), "Presupuesto de Comida eliminado")
+        self.assertEqual(list(Presupuesto.objects.values_list('categoria__nombre', flat=True)), ['Super Mercado'])
+        self.assertIn("Formato incorrecto", self.mensaje('presupuesto comida'))
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE])
+class CategoriaTests(GastosTestCase):
+    """
+    Pruebas de la canonicalización de categorías
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.processor = MessageProcessor()
+
+    def categorias(self):
+        return sorted(set(Gasto.objects.values_list('categoria__nombre', flat=True)))
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar('  Comidas  '), 'comida')
+        self.assertEqual(normalizar('Farmacía'), 'farmacia')
+        self.assertEqual(normalizar('Gas'), 'gas')
+
+    def test_index_tolera_errores_segun_largo(self):
+        index = CategoriaIndex()
+        for categoria in ['Comida', 'Transporte', 'Gas', 'Gym']:
+            index.add(categoria)
+
+        self.assertEqual(index.lookup('COMIDAS'), 'Comida')
+        self.assertEqual(index.lookup('Cmida'), 'Comida')
+        self.assertEqual(index.lookup('tarnsporte'), 'Transporte')
+        self.assertEqual(index.lookup('trasnprote'), 'Transporte')
+        self.assertIsNone(index.lookup('Gys'))
+        self.assertIsNone(index.lookup('Bebida'))
+
+    def test_no_junta_categorias_cortas_distintas(self):
+        index = CategoriaIndex()
+        for categoria in ['Ropa', 'Casa', 'Vino', 'Gas', 'Comida']:
+            index.add(categoria)
+
+        for texto in ['Sopa', 'Caja', 'Cine', 'Vno', 'Gasa', 'Comoda']:
+            self.assertIsNone(index.lookup(texto), texto)
+        self.assertEqual(index.lookup('Rpoa'), 'Ropa')
+        self.assertEqual(index.lookup('Cassa'), 'Casa')
+        self.assertEqual(index.lookup('Comid'), 'Comida')
+
+    def test_sopa_y_ropa_quedan_separadas(self):
+        self.processor.process_message(PHONE, 'ropa 100')
+        self.processor.process_message(PHONE, 'sopa 50')
+
+        self.assertEqual(self.categorias(), ['Ropa', 'Sopa'])
+
+    def test_desempata_por_uso(self):
+        index = CategoriaIndex()
+        index.add('Mate', 1)
+        index.add('Mote', 10)
+
+        self.assertEqual(index.lookup('Mate'), 'Mate')
+        self.assertEqual(index.lookup('Maote'), 'Mote')
+
+    def test_variantes_se_registran_como_la_categoria_existente(self):
+        self.processor.process_message(PHONE, 'comida 100')
+        respuesta = self.processor.process_message(PHONE, 'comidas 200')
+        self.processor.process_message(PHONE, 'Cmida 50\ncomdia 10')
+
+        self.assertIn("Comida", respuesta)
+        self.assertEqual(self.categorias(), ['Comida'])
+        self.assertIn("Total gastado: $360", self.processor.process_message(PHONE, 'resumen hoy'))
+
+    def test_aprende_categorias_nuevas_sin_recargar(self):
+        self.processor.process_message(PHONE, 'farmacia 100')
+        cargas = categoria_resolver.stats()['cargas']
+
+        self.processor.process_message(PHONE, 'veterinaria 300')
+        self.processor.process_message(PHONE, 'veterinara 200')
+
+        self.assertEqual(self.categorias(), ['Farmacia', 'Veterinaria'])
+        self.assertEqual(categoria_resolver.stats()['cargas'], cargas)
+
+    def test_usa_categorias_de_otros_procesos_al_cargar(self):
+        GastoService.create_gasto(PHONE, 'Supermercado', Decimal('100'), 'supermercado 100')
+
+        self.assertEqual(categoria_resolver.resolve(PHONE, 'Supermercados'), 'Supermercado')
+        self.assertEqual(categoria_resolver.resolve('+5491100000000', 'Supermercados'), 'Supermercados')
+
+    @override_settings(CATEGORIA_ALIASES={'super': 'Supermercado', 'uber': 'Transporte'})
+    def test_alias(self):
+        self.processor.process_message(PHONE, 'super 1000')
+        self.processor.process_message(PHONE, 'ubers 300')
+
+        self.assertEqual(self.categorias(), ['Supermercado', 'Transporte'])
+
+    def test_presupuesto_usa_la_categoria_existente(self):
+        self.processor.process_message(PHONE, 'comida 100')
+
+        self.assertIn("Presupuesto de Comida", self.processor.process_message(PHONE, 'presupuesto comidas 500'))
+
+    @override_settings(CATEGORIAS_FUZZY=False)
+    def test_desactivado(self):
+        self.processor.process_message(PHONE, 'comida 100')
+        self.processor.process_message(PHONE, 'comidas 200')
+
+        self.assertEqual(self.categorias(), ['Comida', 'Comidas'])
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE])
+class DimensionTests(GastosTestCase):
+    """
+    Pruebas de las tablas de dimensión (Usuario, Categoria) y su caché
+    """
+
+    def test_gasto_guarda_claves_enteras(self):
+        MessageProcessor().process_message(PHONE, 'comida 200\ntaxi 50\ncomida 10')
+        MessageProcessor().process_message(PHONE, 'comida 30')
+
+        self.assertEqual(Usuario.objects.get().numero_telefono, PHONE)
+        self.assertEqual(sorted(Categoria.objects.values_list('nombre', flat=True)), ['Comida', 'Taxi'])
+        gasto = Gasto.objects.first()
+        self.assertEqual((gasto.numero_telefono, gasto.nombre_categoria, str(gasto)[:13]),
+                         (PHONE, 'Comida', 'Comida: $30.0'))
+
+    def test_cachea_al_confirmar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pk = usuario_cache.id(PHONE, crear=True)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(usuario_cache.id(PHONE), pk)
+            self.assertEqual(usuario_cache.valor(pk), PHONE)
+
+    def test_no_cachea_filas_sin_confirmar(self):
+        pk = categoria_cache.id('Comida', crear=True)
+
+        # Creada en la transacción actual: se sigue consultando a la base
+        with self.assertNumQueries(1):
+            self.assertEqual(categoria_cache.id('Comida'), pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(categoria_cache.valor(pk), 'Comida')
+
+    def test_transaccion_revertida_no_deja_ids(self):
+        try:
+            with transaction.atomic():
+                categoria_cache.id('Taxi', crear=True)
+                categoria_cache.id('Taxi')
+                raise IntegrityError
+        except IntegrityError:
+            pass
+
+        self.assertIsNone(categoria_cache.id('Taxi'))
+        pk = categoria_cache.id('Taxi', crear=True)
+        self.assertEqual(Categoria.objects.get(pk=pk).nombre, 'Taxi')
+
+    def test_transaccion_revertida_no_deja_pendientes(self):
+        try:
+            with transaction.atomic():
+                categoria_cache.ids(['Comida', 'Taxi'], crear=True)
+                raise IntegrityError
+        except IntegrityError:
+            pass
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pk = categoria_cache.id('Taxi', crear=True)
+        with self.assertNumQueries(0):
+            self.assertEqual(categoria_cache.id('Taxi'), pk)
+        self.assertEqual(categoria_cache.stats()['valores'], 1)
+
+    def test_crear_cachea_tambien_los_existentes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            comida = categoria_cache.id('Comida', crear=True)
+        categoria_cache.reset()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ids = categoria_cache.ids(['Comida', 'Taxi'], crear=True)
+        with self.assertNumQueries(0):
+            self.assertEqual(categoria_cache.ids(['Comida', 'Taxi']), ids)
+        self.assertEqual(ids['Comida'], comida)
+
+    def test_resumen_agrupa_por_id(self):
+        GastoService.create_gasto(PHONE, 'Comida', Decimal('200'), 'comida 200')
+        GastoService.create_gasto(PHONE, 'Taxi', Decimal('50'), 'taxi 50')
+        GastoService.create_gasto(PHONE, 'Comida', Decimal('10'), 'comida 10')
+
+        with CaptureQueriesContext(connection) as ctx:
+            resumen = GastoService.summarize(GastoService.filter_gastos(phone_number=PHONE))
+
+        sql = next(q['sql'] for q in ctx.captured_queries if 'AS "grupo"' in q['sql'])
+        self.assertIn('SELECT "gastos_gasto"."categoria_id" AS "grupo"', sql)
+        self.assertNotIn('JOIN', sql)
+        self.assertEqual(resumen['gastos_por_categoria'], {'Comida': Decimal('210'), 'Taxi': Decimal('50')})
+        self.assertEqual(resumen['cantidad_gastos'], 3)
+
+    def test_api_con_filtros_por_texto(self):
+        GastoService.create_gasto(PHONE, 'Comida', Decimal('200'), 'comida 200')
+        GastoService.create_gasto('+5490000000000', 'Taxi', Decimal('50'), 'taxi 50')
+
+        data = self.client.get('/api/gastos/', {'numero_telefono': PHONE}).json()['results']
+        vacio = self.client.get('/api/gastos/', {'categoria': 'Inexistente'}).json()['results']
+
+        self.assertEqual([(g['numero_telefono'], g['categoria']) for g in data], [(PHONE, 'Comida')])
+        self.assertEqual(vacio, [])
+
+    def test_admin_no_elimina_dimensiones(self):
+        # Cada proceso guarda los ids sin invalidarlos: una fila sin usar
+        # tampoco se puede borrar desde el admin
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.client.force_login(admin_user)
+        pk = categoria_cache.id('Comida', crear=True)
+
+        respuesta = self.client.post(f'/admin/gastos/categoria/{pk}/delete/', {'post': 'yes'})
+
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertTrue(Categoria.objects.filter(pk=pk).exists())
+
+
+@override_settings(AUTHORIZED_PHONES=[PHONE])
+class ArchivoTests(GastosTestCase):
+    """
+    Pruebas del archivo de gastos viejos (GastoArchivado / GastoHistorico)
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.ahora = timezone.now()
+        viejos = [
+            nuevo_gasto(PHONE, 'Comida', monto=Decimal(100 + n), fecha=self.ahora - timedelta(days=400 + n),
+                        mensaje_original=f'comida {100 + n}')
+            for n in range(3)
+        ]
+        recientes = [
+            nuevo_gasto(PHONE, 'Taxi', monto=Decimal('50'), fecha=self.ahora - timedelta(days=n),
+                        mensaje_original='taxi 50')
+            for n in range(2)
+        ]
+        Gasto.objects.bulk_create(viejos + recientes)
+        ResumenDiarioService.rebuild()
+        self.viejos = sorted(g.id for g in Gasto.objects.filter(categoria__nombre='Comida'))
+
+    def archivar(self, **opciones):
+        out = io.StringIO()
+        call_command('archive_gastos', espera=0, stdout=out, **opciones)
+        return out.getvalue()
+
+    def test_mueve_gastos_viejos_en_tandas(self):
+        out = self.archivar(chunk_size=2)
+
+        self.assertIn('3 gastos archivados', out)
+        self.assertEqual(Gasto.objects.count(), 2)
+        self.assertEqual(sorted(GastoArchivado.objects.values_list('id', flat=True)), self.viejos)
+        self.assertEqual(GastoHistorico.objects.count(), 5)
+        self.assertEqual(CorteArchivo.objects.get().corte, archivo.corte())
+
+    def test_dry_run_no_mueve(self):
+        out = self.archivar(dry_run=True)
+
+        self.assertIn('3 gastos para archivar', out)
+        self.assertEqual(Gasto.objects.count(), 5)
+        self.assertFalse(CorteArchivo.objects.exists())
+
+    def test_corte_solo_avanza(self):
+        self.archivar(dias=200)
+        corte = archivo.corte()
+        self.archivar(dias=500)
+
+        self.assertEqual(CorteArchivo.objects.get().corte, corte)
+
+    def test_rangos_recientes_no_leen_el_archivo(self):
+        self.archivar()
+        hoy = timezone.localdate()
+
+        with CaptureQueriesContext(connection) as ctx:
+            recientes = list(GastoService.filter_gastos(PHONE, start_date=hoy - timedelta(days=7)))
+            GastoService.get_resumen_periodo(PHONE, self.ahora - timedelta(hours=30), self.ahora)
+
+        self.assertEqual(len(recientes), 2)
+        self.assertFalse(any('gastohistorico' in q['sql'] for q in ctx.captured_queries))
+
+    def test_rangos_viejos_incluyen_archivados(self):
+        self.archivar()
+        hoy = timezone.localdate()
+
+        todos = GastoService.filter_gastos(PHONE)
+        viejos = GastoService.filter_gastos(PHONE, start_date=hoy - timedelta(days=500),
+                                            end_date=hoy - timedelta(days=300))
+        resumen = GastoService.get_resumen_periodo(PHONE, self.ahora - timedelta(days=401, hours=1), self.ahora)
+
+        self.assertIs(todos.model, GastoHistorico)
+        self.assertEqual(todos.count(), 5)
+        self.assertEqual(sorted(g.id for g in viejos), self.viejos)
+        self.assertEqual(resumen['gastos_por_categoria'], {'Comida': Decimal('201'), 'Taxi': Decimal('100')})
+
+    def test_recientes_completa_con_archivados(self):
+        self.archivar()
+
+        self.assertEqual([g.nombre_categoria for g in GastoService.get_recent_gastos(PHONE, limit=2)],
+                         ['Taxi', 'Taxi'])
+        recientes = GastoService.get_recent_gastos(PHONE, limit=4)
+        self.assertEqual([g.id for g in recientes[2:]], self.viejos[:2])
+
+    def test_api_lista_y_detalle_de_archivados(self):
+        self.archivar()
+
+        data = self.client.get('/api/gastos/', {'numero_telefono': PHONE}).json()['results']
+        detalle = self.client.get(f'/api/gastos/{self.viejos[0]}/')
+
+        self.assertEqual(len(data), 5)
+        self.assertEqual(detalle.status_code, 200)
+        self.assertEqual(detalle.json()['categoria'], 'Comida')
+
+    def test_rebuild_incluye_archivados(self):
+        self.archivar()
+        ResumenDiarioService.rebuild(PHONE)
+
+        self.assertEqual(GastoDiario.objects.filter(usuario__numero_telefono=PHONE).count(), 5)
+
+    def test_elimina_archivado_por_id(self):
+        self.archivar()
+        gasto_id = self.viejos[0]
+        dia = timezone.localdate(GastoArchivado.objects.get(id=gasto_id).fecha)
+
+        info = GastoService.delete_gasto(PHONE, gasto_id)
+
+        self.assertEqual(info, 'Comida: $100.00')
+        self.assertFalse(GastoArchivado.objects.filter(id=gasto_id).exists())
+        self.assertFalse(GastoDiario.objects.filter(usuario__numero_telefono=PHONE, dia=dia).exists())
+        self.assertIsNone(GastoService.delete_gasto('+5490000000000', self.viejos[1]))
+
+    def test_elimina_ultimo_archivado(self):
+        self.archivar()
+        Gasto.objects.all().delete()
+
+        info = GastoService.delete_last_gasto(PHONE)
+
+        self.assertEqual(info, 'Comida: $100.00')
+        self.assertEqual(sorted(GastoArchivado.objects.values_list('id', flat=True)), self.viejos[1:])
+
+    def test_elimina_ultimo_prefiere_gastos_sin_archivar(self):
+        self.archivar()
+
+        GastoService.delete_last_gasto(PHONE)
+
+        self.assertEqual(Gasto.objects.count(), 1)
+        self.assertEqual(GastoArchivado.objects.count(), 3)
+
+    def test_corte_cacheado_por_proceso(self):
+        archivo.corte()
+
+        with self.assertNumQueries(0):
+            self.assertIs(GastoService.filter_gastos().model, Gasto)
+
+
+class ReplicaTests(TransactionTestCase):
+    """
+    Pruebas del router de réplicas con dos archivos SQLite (principal de
+    prueba y réplica). Sin la transacción de TestCase: con una transacción
+    abierta las lecturas siempre van a la principal.
+    """
+    REPLICA = 'replica_prueba'
+
+    def setUp(self):
+        super().setUp()
+        reset_caches()
+        self.directorio = tempfile.TemporaryDirectory()
+        connections.settings[self.REPLICA] = {
+            **connections.settings['default'],
+            'NAME': os.path.join(self.directorio.name, 'replica.sqlite3'),
+        }
+        call_command('migrate', database=self.REPLICA, verbosity=0)
+        # Las mismas filas de dimensión en las dos bases
+        for alias in ('default', self.REPLICA):
+            Usuario.objects.using(alias).bulk_create([
+                Usuario(id=1, numero_telefono=PHONE), Usuario(id=2, numero_telefono='+5490000000000')
+            ])
+            Categoria.objects.using(alias).create(id=1, nombre='Comida')
+        # Un gasto que solo está en la réplica
+        Gasto.objects.using(self.REPLICA).create(
+            id=1000, usuario_id=1, categoria_id=1, monto=Decimal('999'), mensaje_original='comida 999'
+        )
+        replicas = override_settings(DATABASE_REPLICAS=[self.REPLICA])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+    def tearDown(self):
+        connections[self.REPLICA].close()
+        del connections[self.REPLICA]
+        del connections.settings[self.REPLICA]
+        self.directorio.cleanup()
+        super().tearDown()
+
+    def montos(self, phone_number):
+        data = self.client.get('/api/gastos/', {'numero_telefono': phone_number}).json()['results']
+        return [g['monto'] for g in data]
+
+    def test_lecturas_van_a_la_replica(self):
+        ahora = timezone.now()
+        resumen = GastoService.get_resumen_periodo(PHONE, ahora - timedelta(hours=1), ahora)
+
+        self.assertEqual(self.montos(PHONE), ['999.00'])
+        self.assertEqual(resumen['total_gastado'], Decimal('999'))
+
+    def test_read_your_writes(self):
+        GastoService.create_gasto(PHONE, 'Comida', Decimal('10'), 'comida 10')
+        Gasto.objects.using(self.REPLICA).create(
+            usuario_id=2, categoria_id=1, monto=Decimal('5'), mensaje_original='comida 5'
+        )
+
+        # El teléfono que escribió lee de la principal; los demás, de la réplica
+        self.assertEqual(self.montos(PHONE), ['10.00'])
+        self.assertEqual(self.montos('+5490000000000'), ['5.00'])
+
+        caches['default'].clear()
+        self.assertEqual(self.montos(PHONE), ['999.00'])
+
+    def test_detalle_busca_en_la_principal_si_falta_en_la_replica(self):
+        gasto = Gasto.objects.create(usuario_id=2, categoria_id=1, monto=Decimal('7'), mensaje_original='comida 7')
+
+        response = self.client.get(f'/api/gastos/{gasto.pk}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['monto'], '7.00')
+
+    def test_transaccion_abierta_lee_de_la_principal(self):
+        with lectura():
+            self.assertEqual(Gasto.objects.all().db, self.REPLICA)
+            with transaction.atomic():
+                self.assertEqual(Gasto.objects.all().db, 'default')
+        self.assertEqual(Gasto.objects.all().db, 'default')
+
+    def test_router_no_migra_ni_escribe_en_replicas(self):
+        router = ReplicaRouter()
+        gasto = Gasto.objects.using(self.REPLICA).get()
+
+        self.assertFalse(router.allow_migrate(self.REPLICA, 'gastos'))
+        self.assertIsNone(router.allow_migrate('bench_dimensiones', 'gastos'))
+        self.assertEqual(router.db_for_write(Gasto, instance=gasto), 'default')
+
+    def test_marca_de_escritura_entre_procesos(self):
+        # Una instancia de cache por proceso: LocMemCache con nombres
+        # distintos no comparte memoria; FileBasedCache sí (mismo directorio)
+        for backend, location, compartida in (
+            ('django.core.cache.backends.locmem.LocMemCache', None, False),
+            ('django.core.cache.backends.filebased.FileBasedCache', self.directorio.name, True),
+        ):
+            with self.subTest(backend=backend):
+                escritor, lector = (import_string(backend)(location or f'proceso-{n}', {}) for n in (1, 2))
+                with mock.patch('gastos.replicas.caches', {'default': escritor}):
+                    registrar_escritura(PHONE)
+                    self.assertTrue(escribio_hace_poco(PHONE))
+                with mock.patch('gastos.replicas.caches', {'default': lector}):
+                    self.assertEqual(escribio_hace_poco(PHONE), compartida)
+
+    def test_check_exige_cache_compartido(self):
+        compartido = {**settings.CACHES, 'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.directorio.name,
+        }}
+
+        self.assertEqual([error.id for error in cache_de_replicas(None)], ['gastos.E001'])
+        with override_settings(CACHES=compartido):
+            self.assertEqual(cache_de_replicas(None), [])
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(cache_de_replicas(None), [])
+
+
+class ConexionesTests(GastosTestCase):
+    """
+    Pruebas de los backends con manejo de conexiones (gastos/db)
+    """
+
+    def test_sqlite_aplica_pragmas_al_conectar(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout = cursor.fetchone()[0]
+            cursor.execute('PRAGMA synchronous')
+            synchronous = cursor.fetchone()[0]
+
+        self.assertEqual(connection.settings_dict['ENGINE'], 'gastos.db.sqlite3')
+        self.assertEqual(busy_timeout, settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(synchronous, 1)  # NORMAL
+
+    def test_sqlite_transacciones_toman_el_lock_al_empezar(self):
+        alias = 'sqlite_prueba'
+        with tempfile.TemporaryDirectory() as directorio:
+            connections.settings[alias] = {
+                **connections.settings['default'], 'NAME': os.path.join(directorio, 'prueba.sqlite3'),
+            }
+            try:
+                with CaptureQueriesContext(connections[alias]) as ctx:
+                    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                        cursor.execute('PRAGMA journal_mode')
+                        journal_mode = cursor.fetchone()[0]
+            finally:
+                connections[alias].close()
+                del connections[alias]
+                del connections.settings[alias]
+
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(ctx.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+    def test_pool_postgresql(self):
+        backend = load_backend('gastos.db.postgresql')
+        config = {
+            **connections.settings['default'],
+            'ENGINE': 'gastos.db.postgresql', 'NAME': 'gastos', 'CONN_MAX_AGE': 0,
+            'OPTIONS': {'pool': {'min_size': 1, 'max_size': 3}},
+        }
+        wrapper = backend.DatabaseWrapper(config, 'pool_prueba')
+        pool = wrapper.pool
+        self.addCleanup(backend.DatabaseWrapper._pools.pop, ('pool_prueba', 'gastos'))
+
+        self.assertNotIn('pool', wrapper.get_connection_params())
+        self.assertEqual((pool.min_size, pool.max_size), (1, 3))
+        self.assertIs(wrapper.pool, pool)
+        # No se conecta hasta la primera consulta
+        self.assertTrue(pool.closed)
+
+        persistente = backend.DatabaseWrapper({**config, 'NAME': 'otra', 'CONN_MAX_AGE': 600}, 'pool_prueba')
+        with self.assertRaises(ImproperlyConfigured):
+            persistente.pool
 
-# Create your tests here.
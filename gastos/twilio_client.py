@@ -0,0 +1,336 @@
+"""
+Clientes de Twilio usados por los servicios de envío
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+import weakref
+from types import SimpleNamespace
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from aiohttp import ClientSession, TCPConnector
+from requests.adapters import HTTPAdapter
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+logger = logging.getLogger('gastos')
+
+
+def build_client():
+    """
+    Construye el cliente de Twilio según la configuración.
+    Retorna None si no hay credenciales.
+    """
+    if settings.TWILIO_STUB:
+        logger.info("Usando cliente de Twilio simulado")
+        return StubTwilioClient()
+
+    if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
+        logger.error("Credenciales de Twilio no configuradas")
+        return None
+
+    http_client = PooledHttpClient(
+        pool_connections=settings.TWILIO_POOL_CONNECTIONS,
+        pool_maxsize=settings.TWILIO_POOL_MAXSIZE,
+        connect_timeout=settings.TWILIO_CONNECT_TIMEOUT,
+        read_timeout=settings.TWILIO_READ_TIMEOUT,
+        max_retries=settings.TWILIO_MAX_RETRIES,
+        base_url=settings.TWILIO_API_BASE_URL,
+    )
+    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
+    logger.info("Cliente de Twilio inicializado correctamente")
+    return client
+
+
+class PooledHttpClient(TwilioHttpClient):
+    """
+    Cliente HTTP de Twilio con una sesión keep-alive y un pool de conexiones
+    configurable. Si se indica base_url, redirige todas las llamadas a esa
+    URL (por ejemplo, un stand-in local para benchmarks).
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=10, connect_timeout=3.05,
+                 read_timeout=10, max_retries=0, base_url=''):
+        super().__init__(pool_connections=True)
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=max_retries,
+        )
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        # requests acepta (connect, read); se asigna después del constructor
+        # porque HttpClient solo valida timeouts numéricos
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_maxsize = pool_maxsize
+        self.requests_sent = 0
+        self._lock = threading.Lock()
+
+        parts = urlsplit(base_url) if base_url else None
+        self.base = (parts.scheme, parts.netloc) if parts else None
+
+    def request(self, method, url, *args, **kwargs):
+        if self.base:
+            parts = urlsplit(url)
+            url = urlunsplit(self.base + (parts.path, parts.query, parts.fragment))
+        with self._lock:
+            self.requests_sent += 1
+        return super().request(method, url, *args, **kwargs)
+
+    def stats(self):
+        """
+        Estadísticas del pool: conexiones abiertas, reutilizadas y libres
+        """
+        pools = self.adapter.poolmanager.pools
+        hosts = {}
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': pool.pool.qsize() if pool.pool else 0,
+            }
+        return {
+            'requests_sent': self.requests_sent,
+            'connections_opened': sum(h['connections_opened'] for h in hosts.values()),
+            'pool_maxsize': self.pool_maxsize,
+            'hosts': hosts,
+        }
+
+
+class ClientRegistry:
+    """
+    Registro del cliente de Twilio del proceso.
+
+    El cliente se construye una sola vez por proceso y se vuelve a crear
+    si el PID cambia (workers de gunicorn después del fork), así cada
+    worker tiene su propia sesión HTTP y no comparte sockets con el padre.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._builds = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Descarta el cliente actual; el próximo get() crea uno nuevo
+        """
+        self._client = None
+        self._pid = None
+        self._created_at = None
+
+    def get(self):
+        """
+        Retorna el cliente del proceso, creándolo si hace falta
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return self._client
+        with self._lock:
+            if self._pid != pid:
+                self._client = build_client()
+                self._pid = pid
+                self._created_at = time.time()
+                self._builds += 1
+        return self._client
+
+    def stats(self):
+        """
+        Estadísticas del cliente y de su pool de conexiones
+        """
+        stats = {
+            'pid': self._pid,
+            'client': type(self._client).__name__ if self._client else None,
+            'builds': self._builds,
+            'age_seconds': round(time.time() - self._created_at, 1) if self._created_at else None,
+        }
+        http_client = getattr(self._client, 'http_client', None)
+        if isinstance(http_client, PooledHttpClient):
+            stats['pool'] = http_client.stats()
+        return stats
+
+
+registry = ClientRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.reset)
+
+
+def get_client():
+    """
+    Cliente de Twilio compartido por el proceso
+    """
+    return registry.get()
+
+
+def pool_stats():
+    """
+    Estadísticas del cliente de Twilio compartido
+    """
+    return registry.stats()
+
+
+def build_async_client():
+    """
+    Construye el cliente async de Twilio (aiohttp) para el event loop actual.
+    Retorna None si no hay credenciales.
+    """
+    if settings.TWILIO_STUB:
+        return StubTwilioClient()
+
+    if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
+        logger.error("Credenciales de Twilio no configuradas")
+        return None
+
+    http_client = AsyncPooledHttpClient(
+        pool_maxsize=settings.TWILIO_POOL_MAXSIZE,
+        timeout=settings.TWILIO_CONNECT_TIMEOUT + settings.TWILIO_READ_TIMEOUT,
+        base_url=settings.TWILIO_API_BASE_URL,
+    )
+    return Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
+
+
+class AsyncPooledHttpClient(AsyncTwilioHttpClient):
+    """
+    Cliente HTTP async de Twilio con una sesión aiohttp keep-alive y un
+    límite de conexiones. Igual que PooledHttpClient, base_url redirige
+    las llamadas (por ejemplo, a un stand-in local).
+    """
+
+    def __init__(self, pool_maxsize=10, timeout=13.05, base_url=''):
+        super().__init__(pool_connections=False)
+        self.session = ClientSession(connector=TCPConnector(limit=pool_maxsize))
+        self.request_timeout = timeout
+        self.requests_sent = 0
+
+        parts = urlsplit(base_url) if base_url else None
+        self.base = (parts.scheme, parts.netloc) if parts else None
+
+    async def request(self, method, url, params=None, data=None, headers=None, auth=None,
+                      timeout=None, allow_redirects=False):
+        if self.base:
+            parts = urlsplit(url)
+            url = urlunsplit(self.base + (parts.path, parts.query, parts.fragment))
+        self.requests_sent += 1
+        return await super().request(
+            method, url, params=params, data=data, headers=headers, auth=auth,
+            timeout=timeout or self.request_timeout, allow_redirects=allow_redirects
+        )
+
+
+async def _cerrar_sesion(client):
+    session = getattr(getattr(client, 'http_client', None), 'session', None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+class AsyncClientRegistry:
+    """
+    Un cliente async por event loop: las sesiones de aiohttp no se pueden
+    usar desde otro loop. Con uvicorn hay un loop por proceso, así que en
+    la práctica es un cliente por worker. Las sesiones se cierran al
+    descartar los clientes (reset) y al apagar el worker (aclose, desde el
+    lifespan de gastos/asgi.py).
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            self._clients[loop] = build_async_client()
+        return self._clients[loop]
+
+    async def aclose(self):
+        """
+        Cierra el cliente del event loop actual
+        """
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        await _cerrar_sesion(client)
+
+    def reset(self):
+        """
+        Descarta los clientes y cierra sus sesiones, cada una en su loop
+        """
+        clients, self._clients = self._clients, weakref.WeakKeyDictionary()
+        try:
+            actual = asyncio.get_running_loop()
+        except RuntimeError:
+            actual = None
+        for loop, client in list(clients.items()):
+            if loop.is_closed():
+                # El loop terminó sin cerrarla: ya no se puede esperar
+                continue
+            if loop is actual:
+                loop.create_task(_cerrar_sesion(client))
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(_cerrar_sesion(client), loop)
+            else:
+                loop.run_until_complete(_cerrar_sesion(client))
+
+
+async_registry = AsyncClientRegistry()
+
+
+def get_async_client():
+    """
+    Cliente async de Twilio del event loop actual
+    """
+    return async_registry.get()
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting.startswith('TWILIO_'):
+        registry.reset()
+        async_registry.reset()
+
+
+class StubTwilioClient:
+    """
+    Cliente de Twilio falso que guarda los mensajes en memoria.
+
+    Expone la misma interfaz que ``twilio.rest.Client`` para
+    ``client.messages.create`` (y ``create_async``) y permite probar el
+    envío sin red.
+    """
+
+    def __init__(self, fail_for=None):
+        self.messages = _StubMessages(fail_for or ())
+
+    @property
+    def sent(self):
+        """Mensajes enviados, en orden de envío"""
+        return self.messages.sent
+
+
+class _StubMessages:
+    def __init__(self, fail_for):
+        self.fail_for = set(fail_for)
+        self.sent = []
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, body, from_, to):
+        if to in self.fail_for:
+            raise RuntimeError(f"Envío simulado fallido a {to}")
+        with self._lock:
+            sid = f"SMSTUB{next(self._counter):026d}"
+            message = SimpleNamespace(sid=sid, body=body, from_=from_, to=to)
+            self.sent.append(message)
+        return message
+
+    async def create_async(self, body, from_, to):
+        return self.create(body=body, from_=from_, to=to)
@@ -1,16 +1,38 @@
+from django.conf import settings
 from django.urls import path
-from .views import TwilioWebhookView, GastoListView, GastoDetailView, HealthCheckView
+from .views import (
+    TwilioWebhookView, GastoListView, GastoExportView, GastoDetailView, EstadisticasView,
+    HealthCheckView, MetricsView, TelefonoAutorizadoListView, TelefonoAutorizadoDetailView,
+    AsyncTwilioWebhookView, AsyncGastoListView, AsyncGastoExportView, AsyncGastoDetailView
+)
 
 app_name = 'gastos'
 
+# Con ASYNC_VIEWS (servidor ASGI) el webhook y las lecturas usan las vistas async
+if settings.ASYNC_VIEWS:
+    webhook_view, list_view, export_view, detail_view = (
+        AsyncTwilioWebhookView, AsyncGastoListView, AsyncGastoExportView, AsyncGastoDetailView
+    )
+else:
+    webhook_view, list_view, export_view, detail_view = (
+        TwilioWebhookView, GastoListView, GastoExportView, GastoDetailView
+    )
+
 urlpatterns = [
     # Webhook de Twilio
-    path('webhook/whatsapp/', TwilioWebhookView.as_view(), name='twilio-webhook'),
+    path('webhook/whatsapp/', webhook_view.as_view(), name='twilio-webhook'),
     
     # API endpoints
-    path('api/gastos/', GastoListView.as_view(), name='gasto-list'),
-    path('api/gastos/<int:pk>/', GastoDetailView.as_view(), name='gasto-detail'),
+    path('api/gastos/', list_view.as_view(), name='gasto-list'),
+    path('api/gastos/export/', export_view.as_view(), name='gasto-export'),
+    path('api/gastos/<int:pk>/', detail_view.as_view(), name='gasto-detail'),
+    path('api/stats/', EstadisticasView.as_view(), name='estadisticas'),
+    path('api/telefonos/', TelefonoAutorizadoListView.as_view(), name='telefono-list'),
+    path('api/telefonos/<int:pk>/', TelefonoAutorizadoDetailView.as_view(), name='telefono-detail'),
     
     # Health check
     path('health/', HealthCheckView.as_view(), name='health-check'),
+    
+    # Métricas para Prometheus
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
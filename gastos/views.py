@@ -1,20 +1,70 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.dateparse import parse_date
 from django.utils.decorators import method_decorator
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from twilio.twiml.messaging_response import MessagingResponse
 import logging
 
-from .services import MessageProcessor
-from .models import Gasto
-from .serializers import GastoSerializer, ResumenGastosSerializer
+from .pagination import GastoCursorPagination
+from .replicas import lectura, replica_stats
+from .services import EstadisticasService, GastoService, MessageProcessor
+from .export import FORMATS, aiter_export, iter_export
+from .models import TelefonoAutorizado
+from .serializers import GastoSerializer, ResumenGastosSerializer, TelefonoAutorizadoSerializer
+from .telefonos import telefonos_autorizados
+from .archivo import archivo
+from .cache import resumen_cache
+from .categorias import categoria_resolver
+from .dimensiones import categoria_cache, usuario_cache
+from .log import log_payload, log_stats
+from .metrics import WEBHOOK_LATENCY, render, webhook_command
+from .twilio_client import pool_stats
 
 logger = logging.getLogger('gastos')
 
+# Headers que no se registran ni en los logs de muestra
+PRIVATE_HEADERS = {'Authorization', 'Cookie', 'X-Twilio-Signature'}
+
+
+class ReplyModeMixin:
+    """
+    Modo de respuesta y TwiML compartidos por las vistas del webhook
+    """
+    REPLY_MODES = ('twiml', 'outbox', 'rest')
+    
+    # Modo de respuesta; si es None se usa settings.WHATSAPP_REPLY_MODE
+    reply_mode = None
+    
+    def get_reply_mode(self):
+        """
+        Retorna el modo de respuesta configurado
+        """
+        reply_mode = self.reply_mode or settings.WHATSAPP_REPLY_MODE
+        if reply_mode not in self.REPLY_MODES:
+            raise ValueError(f"Modo de respuesta no válido: {reply_mode}")
+        return reply_mode
+    
+    def _twiml_response(self, message):
+        """
+        Arma la respuesta TwiML con el mensaje para el usuario
+        """
+        response = MessagingResponse()
+        response.message(message)
+        return HttpResponse(str(response), content_type='text/xml')
+
 
 @method_decorator(csrf_exempt, name='dispatch')
-class TwilioWebhookView(APIView):
+class TwilioWebhookView(ReplyModeMixin, APIView):
     """
     Vista para recibir webhooks de Twilio WhatsApp
     """
@@ -23,36 +73,55 @@ class TwilioWebhookView(APIView):
         """
         Procesa mensajes entrantes de WhatsApp
         """
+        with WEBHOOK_LATENCY.labels(webhook_command(request.POST.get('Body', ''))).time():
+            return self._post(request)
+    
+    def _post(self, request):
         try:
-            # Log de debugging
-            logger.info("=== WEBHOOK RECIBIDO ===")
-            logger.info(f"Método: {request.method}")
-            logger.info(f"Headers: {dict(request.headers)}")
-            logger.info(f"POST data: {dict(request.POST)}")
-            
             # Obtener datos del webhook (Twilio envía como form data)
             from_number = request.POST.get('From', '').replace('whatsapp:', '')
             message_body = request.POST.get('Body', '')
             
-            logger.info(f"Número origen: {from_number}")
-            logger.info(f"Mensaje: {message_body}")
+            # Payload completo solo para una muestra de los requests
+            log_payload(
+                logger, "Payload del webhook",
+                headers={k: v for k, v in request.headers.items() if k not in PRIVATE_HEADERS},
+                post=dict(request.POST)
+            )
             
             if not from_number or not message_body:
                 logger.error("Datos del webhook incompletos")
                 return Response({'status': 'error', 'message': 'Datos incompletos'}, 
                               status=status.HTTP_400_BAD_REQUEST)
             
-            # Procesar mensaje
             processor = MessageProcessor()
-            response_message = processor.process_message(from_number, message_body)
+            reply_mode = self.get_reply_mode()
+            logger.info("Webhook recibido", extra={'datos': {'from': from_number, 'modo': reply_mode}})
+            
+            # Los reintentos de Twilio (mismo MessageSid) reciben la respuesta original
+            response_message, outbox_id, duplicado = processor.process_once(
+                from_number, message_body, request.POST.get('MessageSid', ''),
+                enqueue=(reply_mode == 'outbox')
+            )
+            if duplicado:
+                logger.info("Reintento de Twilio: se devuelve la respuesta original")
+            
+            if reply_mode == 'twiml':
+                # La respuesta viaja en el propio webhook
+                return self._twiml_response(response_message)
             
-            logger.info(f"Respuesta generada: {response_message}")
+            if reply_mode == 'outbox':
+                # La respuesta quedó encolada (la envía dispatch_outbox)
+                logger.info(f"Respuesta encolada: ID {outbox_id}")
+                return Response({'status': 'success', 'outbox_id': outbox_id}, status=status.HTTP_200_OK)
+            
+            # Enviar la respuesta por la API REST (un reintento no la reenvía)
+            if duplicado:
+                return Response({'status': 'success'}, status=status.HTTP_200_OK)
             
-            # Enviar respuesta
             success = processor.send_response(from_number, response_message)
             
             if success:
-                logger.info(f"Respuesta enviada correctamente")
                 return Response({'status': 'success'}, status=status.HTTP_200_OK)
             else:
                 logger.error(f"Error enviando respuesta")
@@ -60,15 +129,58 @@ class TwilioWebhookView(APIView):
                               status=status.HTTP_200_OK)
                 
         except Exception as e:
-            logger.error(f"Error procesando webhook: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception(f"Error procesando webhook: {str(e)}")
             return Response({'status': 'error', 'message': str(e)}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                
-        except Exception as e:
-            logger.error(f"Error procesando webhook: {str(e)}")
-            return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def parse_date_param(request, name):
+    """
+    Lee un parámetro de fecha YYYY-MM-DD de la query string
+    """
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Fecha inválida, usar YYYY-MM-DD'})
+    return parsed
+
+
+def gastos_filtrados(request):
+    """
+    Aplica los filtros de la query string a los gastos. El queryset queda
+    fijado a una réplica de lectura si corresponde.
+    """
+    phone_number = request.query_params.get('numero_telefono')
+    if phone_number:
+        # Un '+' sin codificar en la URL llega como espacio
+        phone_number = phone_number.replace(' ', '+')
+    with lectura(phone_number):
+        gastos = GastoService.filter_gastos(
+            phone_number=phone_number,
+            categoria=request.query_params.get('categoria'),
+            start_date=parse_date_param(request, 'desde'),
+            end_date=parse_date_param(request, 'hasta'),
+        )
+        # El listado y la exportación se evalúan fuera de este bloque
+        return gastos.using(gastos.db)
+
+
+def buscar_gasto(pk):
+    """
+    Gasto (o gasto archivado) por id, leído de una réplica si hay; si
+    todavía no llegó a la réplica, de la base principal
+    """
+    modelo = archivo.modelo()
+    with lectura():
+        gasto = modelo.objects.filter(pk=pk).first()
+    if gasto is None and settings.DATABASE_REPLICAS:
+        gasto = modelo.objects.filter(pk=pk).first()
+    return gasto
 
 
 class GastoListView(APIView):
@@ -76,13 +188,70 @@ class GastoListView(APIView):
     Vista para listar gastos
     """
     
+    pagination_class = GastoCursorPagination
+    
     def get(self, request):
         """
-        Lista todos los gastos
+        Lista los gastos paginados por cursor.
+        Filtros opcionales: numero_telefono, categoria, desde y hasta (YYYY-MM-DD)
         """
-        gastos = Gasto.objects.all()
-        serializer = GastoSerializer(gastos, many=True)
-        return Response(serializer.data)
+        gastos = gastos_filtrados(request)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(gastos, request, view=self)
+        serializer = GastoSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class GastoExportView(APIView):
+    """
+    Vista para exportar gastos en streaming (CSV o NDJSON)
+    """
+    
+    def get(self, request):
+        """
+        Exporta los gastos filtrados sin cargarlos en memoria.
+        Parámetros: formato (csv o ndjson), numero_telefono, categoria, desde, hasta
+        """
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATS:
+            return Response({'error': f"Formato no soportado: {formato}"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        gastos = gastos_filtrados(request)
+        response = StreamingHttpResponse(iter_export(gastos, formato), content_type=FORMATS[formato])
+        response['Content-Disposition'] = f'attachment; filename="gastos.{formato}"'
+        return response
+
+
+class EstadisticasView(APIView):
+    """
+    Vista de estadísticas y series de gastos de un teléfono
+    """
+    
+    def get(self, request):
+        """
+        Series por período de un teléfono.
+        Parámetros: numero_telefono (obligatorio), periodo (dia, semana o mes),
+        ventana (períodos de la media móvil), desde y hasta (YYYY-MM-DD)
+        """
+        phone_number = request.query_params.get('numero_telefono', '').replace(' ', '+')
+        if not phone_number:
+            raise ValidationError({'numero_telefono': 'Parámetro obligatorio'})
+        periodo = request.query_params.get('periodo', 'mes')
+        if periodo not in EstadisticasService.PERIODOS:
+            raise ValidationError({'periodo': f"Usar uno de: {', '.join(EstadisticasService.PERIODOS)}"})
+        ventana = request.query_params.get('ventana')
+        if ventana is not None:
+            if not ventana.isdigit() or not 1 <= int(ventana) <= 366:
+                raise ValidationError({'ventana': 'Entero entre 1 y 366'})
+            ventana = int(ventana)
+        desde, hasta = parse_date_param(request, 'desde'), parse_date_param(request, 'hasta')
+        if desde and hasta and desde > hasta:
+            raise ValidationError({'desde': 'Debe ser anterior a hasta'})
+        
+        with lectura(phone_number):
+            return Response(EstadisticasService.estadisticas(
+                phone_number, desde=desde, hasta=hasta, periodo=periodo, ventana=ventana
+            ))
 
 
 class GastoDetailView(APIView):
@@ -92,14 +261,66 @@ class GastoDetailView(APIView):
     
     def get(self, request, pk):
         """
-        Obtiene un gasto específico
+        Obtiene un gasto específico (también si está archivado)
         """
-        try:
-            gasto = Gasto.objects.get(pk=pk)
-            serializer = GastoSerializer(gasto)
-            return Response(serializer.data)
-        except Gasto.DoesNotExist:
+        gasto = buscar_gasto(pk)
+        if gasto is None:
             return Response({'error': 'Gasto no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(GastoSerializer(gasto).data)
+
+
+class TelefonoAutorizadoListView(APIView):
+    """
+    Vista para listar y dar de alta teléfonos autorizados (solo staff)
+    """
+    
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        telefonos = TelefonoAutorizado.objects.all()
+        return Response(TelefonoAutorizadoSerializer(telefonos, many=True).data)
+    
+    def post(self, request):
+        serializer = TelefonoAutorizadoSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class TelefonoAutorizadoDetailView(APIView):
+    """
+    Vista para ver, modificar o eliminar un teléfono autorizado (solo staff)
+    """
+    
+    permission_classes = [IsAdminUser]
+    
+    def get_object(self, pk):
+        try:
+            return TelefonoAutorizado.objects.get(pk=pk)
+        except TelefonoAutorizado.DoesNotExist:
+            return None
+    
+    def get(self, request, pk):
+        telefono = self.get_object(pk)
+        if telefono is None:
+            return Response({'error': 'Teléfono no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(TelefonoAutorizadoSerializer(telefono).data)
+    
+    def patch(self, request, pk):
+        telefono = self.get_object(pk)
+        if telefono is None:
+            return Response({'error': 'Teléfono no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = TelefonoAutorizadoSerializer(telefono, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+    
+    def delete(self, request, pk):
+        telefono = self.get_object(pk)
+        if telefono is None:
+            return Response({'error': 'Teléfono no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        telefono.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class HealthCheckView(APIView):
@@ -114,5 +335,147 @@ class HealthCheckView(APIView):
         return Response({
             'status': 'healthy',
             'service': 'Gastos WhatsApp API',
-            'version': '1.0.0'
+            'version': '1.0.0',
+            'twilio': pool_stats(),
+            'resumen_cache': resumen_cache.stats(),
+            'telefonos_autorizados': telefonos_autorizados.stats(),
+            'categorias': categoria_resolver.stats(),
+            'dimensiones': {'usuarios': usuario_cache.stats(), 'categorias': categoria_cache.stats()},
+            'archivo': archivo.stats(),
+            'replicas': replica_stats(),
+            # Conexiones del pool de PostgreSQL (DB_POOL) en este proceso
+            'db_pool': connection.pool_stats() if hasattr(connection, 'pool_stats') else None,
+            'logs': log_stats()
         })
+
+
+class MetricsView(View):
+    """
+    Métricas en formato de texto de Prometheus
+    """
+    
+    def get(self, request):
+        content, content_type = render()
+        return HttpResponse(content, content_type=content_type)
+
+
+# Vistas async (ASGI): se usan en lugar de las anteriores con ASYNC_VIEWS=True
+# (por defecto al servir con gastos_whatsapp.asgi). El procesamiento de un
+# mensaje es transaccional y Django todavía no tiene transacciones async, así
+# que corre en el hilo del request; la espera a Twilio y las lecturas usan
+# el event loop sin ocupar un worker.
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncTwilioWebhookView(ReplyModeMixin, View):
+    """
+    Versión async del webhook de Twilio WhatsApp
+    """
+    
+    async def post(self, request):
+        """
+        Procesa mensajes entrantes de WhatsApp
+        """
+        with WEBHOOK_LATENCY.labels(webhook_command(request.POST.get('Body', ''))).time():
+            return await self._post(request)
+    
+    async def _post(self, request):
+        try:
+            from_number = request.POST.get('From', '').replace('whatsapp:', '')
+            message_body = request.POST.get('Body', '')
+            
+            log_payload(
+                logger, "Payload del webhook",
+                headers={k: v for k, v in request.headers.items() if k not in PRIVATE_HEADERS},
+                post=dict(request.POST)
+            )
+            
+            if not from_number or not message_body:
+                logger.error("Datos del webhook incompletos")
+                return JsonResponse({'status': 'error', 'message': 'Datos incompletos'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+            
+            processor = MessageProcessor()
+            reply_mode = self.get_reply_mode()
+            logger.info("Webhook recibido", extra={'datos': {'from': from_number, 'modo': reply_mode}})
+            
+            response_message, outbox_id, duplicado = await sync_to_async(processor.process_once)(
+                from_number, message_body, request.POST.get('MessageSid', ''),
+                enqueue=(reply_mode == 'outbox')
+            )
+            if duplicado:
+                logger.info("Reintento de Twilio: se devuelve la respuesta original")
+            
+            if reply_mode == 'twiml':
+                return self._twiml_response(response_message)
+            
+            if reply_mode == 'outbox':
+                logger.info(f"Respuesta encolada: ID {outbox_id}")
+                return JsonResponse({'status': 'success', 'outbox_id': outbox_id})
+            
+            if duplicado:
+                return JsonResponse({'status': 'success'})
+            
+            if await processor.asend_response(from_number, response_message):
+                return JsonResponse({'status': 'success'})
+            logger.error("Error enviando respuesta")
+            return JsonResponse({'status': 'warning', 'message': 'Procesado pero no enviado'})
+        
+        except Exception as e:
+            logger.exception(f"Error procesando webhook: {str(e)}")
+            return JsonResponse({'status': 'error', 'message': str(e)},
+                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncGastoListView(View):
+    """
+    Versión async del listado de gastos paginado por cursor
+    """
+    
+    pagination_class = GastoCursorPagination
+    
+    async def get(self, request):
+        request = Request(request)
+        try:
+            # Los filtros por teléfono y categoría resuelven ids en la base
+            gastos = await sync_to_async(gastos_filtrados)(request)
+            paginator = self.pagination_class()
+            page = await paginator.apaginate_queryset(gastos, request, view=self)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except NotFound as e:
+            return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_404_NOT_FOUND)
+        data = await sync_to_async(lambda: GastoSerializer(page, many=True).data)()
+        return JsonResponse(paginator.get_paginated_data(data))
+
+
+class AsyncGastoExportView(View):
+    """
+    Versión async de la exportación en streaming (CSV o NDJSON)
+    """
+    
+    async def get(self, request):
+        request = Request(request)
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATS:
+            return JsonResponse({'error': f"Formato no soportado: {formato}"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            gastos = await sync_to_async(gastos_filtrados)(request)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(aiter_export(gastos, formato), content_type=FORMATS[formato])
+        response['Content-Disposition'] = f'attachment; filename="gastos.{formato}"'
+        return response
+
+
+class AsyncGastoDetailView(View):
+    """
+    Versión async del detalle de un gasto
+    """
+    
+    async def get(self, request, pk):
+        gasto = await sync_to_async(buscar_gasto)(pk)
+        if gasto is None:
+            return JsonResponse({'error': 'Gasto no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        # El teléfono y la categoría pueden no estar en la caché de dimensiones
+        return JsonResponse(await sync_to_async(lambda: GastoSerializer(gasto).data)())
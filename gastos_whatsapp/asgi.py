@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gastos_whatsapp.settings')
+# Bajo ASGI el webhook y la API de lectura usan las vistas async
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
+
+# Después de cargar las apps: cierra las sesiones de Twilio al apagar
+from gastos.asgi import con_lifespan  # noqa: E402
+
+application = con_lifespan(application)
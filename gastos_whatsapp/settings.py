@@ -63,10 +63,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Para servir archivos estáticos
+    'gastos.middleware.StaticFilesMiddleware',  # WhiteNoise, también bajo ASGI
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'gastos.middleware.DisableCSRFMiddleware',  # Desactivar CSRF para webhooks
+    'gastos.middleware.RequestIdMiddleware',  # Request ID para los logs
+    'gastos.middleware.MetricsMiddleware',  # Consultas SQL por vista en /metrics
+    'gastos.middleware.QueryCountMiddleware',  # Header X-DB-Queries (solo pruebas de carga)
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -74,6 +77,17 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'gastos_whatsapp.urls'
 
+# Métricas de Prometheus en /metrics (con varios workers de gunicorn,
+# definir también PROMETHEUS_MULTIPROC_DIR; ver gastos/metrics.py)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+
+# Header X-DB-Queries con las consultas de cada request (para loadtest_webhook)
+DB_QUERY_COUNT_HEADER = os.environ.get('DB_QUERY_COUNT_HEADER', 'False') == 'True'
+
+# Vistas async del webhook y la API de lectura (para servir con ASGI;
+# gastos_whatsapp/asgi.py lo activa por defecto)
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -95,6 +109,51 @@ WSGI_APPLICATION = 'gastos_whatsapp.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Conexiones: persistentes (DB_CONN_MAX_AGE segundos, con chequeo de salud
+# antes de reutilizarlas) o, con DB_POOL=True en PostgreSQL, un pool de
+# psycopg 3 por proceso. Bajo ASGI cada request corre en otro hilo y las
+# conexiones persistentes no se reutilizan: ahí conviene el pool, y por
+# defecto no se dejan conexiones abiertas.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '0' if ASYNC_VIEWS else '600'))
+DB_CONN_HEALTH_CHECKS = os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+DB_POOL_OPTIONS = {
+    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+    # Espera máxima por una conexión libre antes de fallar
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '300')),
+    'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', '3600')),
+}
+
+# SQLite: WAL (las lecturas no esperan a la escritura en curso), hasta
+# SQLITE_BUSY_TIMEOUT_MS de espera por el lock en lugar de "database is
+# locked" y lecturas con mmap. Se aplican en cada conexión nueva
+# (gastos/db/sqlite3).
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '20000')),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+}
+
+
+def configurar_conexion(config):
+    """
+    Aplica el manejo de conexiones a una entrada de DATABASES
+    """
+    config['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    config['CONN_HEALTH_CHECKS'] = DB_CONN_HEALTH_CHECKS
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        config['ENGINE'] = 'gastos.db.sqlite3'
+    elif config['ENGINE'] == 'django.db.backends.postgresql' and DB_POOL:
+        config['ENGINE'] = 'gastos.db.postgresql'
+        # Cada request devuelve su conexión al pool al terminar
+        config['CONN_MAX_AGE'] = 0
+        config.setdefault('OPTIONS', {})['pool'] = DB_POOL_OPTIONS
+    return config
+
+
 # Configuración de base de datos para producción
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
@@ -102,15 +161,71 @@ if DATABASE_URL:
     # Para PostgreSQL en Render
     import dj_database_url
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL)
+        'default': configurar_conexion(dj_database_url.parse(DATABASE_URL))
     }
 else:
     # Para desarrollo local
     DATABASES = {
-        'default': {
+        'default': configurar_conexion({
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
-        }
+        })
+    }
+
+# Réplicas de lectura: URLs separadas por coma, cada una queda como
+# DATABASES['replica_N']. Para probar en local con dos archivos SQLite:
+# DATABASE_REPLICA_URLS=sqlite:////ruta/replica.sqlite3 (copia de db.sqlite3).
+# Las lecturas de un teléfono van a la principal durante
+# REPLICA_STICKY_SECONDS después de que registra o elimina un gasto (ver
+# gastos/replicas.py); conviene que supere el atraso de las réplicas. La
+# marca se guarda en el cache 'default', que con réplicas no puede ser
+# LocMemCache (cada proceso tendría la suya).
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+if DATABASE_REPLICA_URLS:
+    import dj_database_url
+    for numero, url in enumerate(DATABASE_REPLICA_URLS, 1):
+        # En las pruebas las réplicas apuntan a la base de prueba principal
+        DATABASES[f'replica_{numero}'] = configurar_conexion(
+            {**dj_database_url.parse(url), 'TEST': {'MIRROR': 'default'}}
+        )
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['gastos.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', '30'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Los resúmenes se cachean por defecto en memoria del proceso (LRU con TTL);
+# con RESUMEN_CACHE_BACKEND/LOCATION se puede usar un backend compartido
+# (ej: django.core.cache.backends.redis.RedisCache, redis://...). Con varios
+# workers tiene que ser compartido: la invalidación al registrar un gasto
+# solo llega al cache del worker que lo registró (aviso gastos.W001).
+RESUMEN_CACHE_BACKEND = os.environ.get(
+    'RESUMEN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+# Workers del servidor (gunicorn lee la misma variable)
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+
+# El cache 'default' guarda la versión de los teléfonos autorizados y la
+# marca de read-your-writes de las réplicas; con varios procesos conviene un
+# backend compartido (CACHE_BACKEND/LOCATION; aviso gastos.W002), obligatorio
+# con réplicas
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+    'resumenes': {
+        'BACKEND': RESUMEN_CACHE_BACKEND,
+        'LOCATION': os.environ.get('RESUMEN_CACHE_LOCATION', 'resumenes'),
+        'TIMEOUT': int(os.environ.get('RESUMEN_CACHE_TIMEOUT', '300')),
+    },
+}
+
+if RESUMEN_CACHE_BACKEND.endswith('LocMemCache'):
+    CACHES['resumenes']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('RESUMEN_CACHE_MAX_ENTRIES', '5000')),
     }
 
 
@@ -169,39 +284,120 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Paginación de /api/gastos/
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', '50'))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', '500'))
+
+# Filas leídas por vuelta del cursor en las exportaciones
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+
+# Registros por lote (y transacción) en import_gastos
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '1000'))
+
 # Configuración de Twilio
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID', '')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', '')
 TWILIO_WHATSAPP_NUMBER = os.environ.get('TWILIO_WHATSAPP_NUMBER', '')
-
-# Números de teléfono autorizados
+# URL base alternativa para la API de Twilio (ej: un stand-in local)
+TWILIO_API_BASE_URL = os.environ.get('TWILIO_API_BASE_URL', '')
+# Pool de conexiones HTTP del cliente de Twilio (uno por worker)
+TWILIO_POOL_CONNECTIONS = int(os.environ.get('TWILIO_POOL_CONNECTIONS', '4'))
+TWILIO_POOL_MAXSIZE = int(os.environ.get('TWILIO_POOL_MAXSIZE', '10'))
+TWILIO_CONNECT_TIMEOUT = float(os.environ.get('TWILIO_CONNECT_TIMEOUT', '3.05'))
+TWILIO_READ_TIMEOUT = float(os.environ.get('TWILIO_READ_TIMEOUT', '10'))
+TWILIO_MAX_RETRIES = int(os.environ.get('TWILIO_MAX_RETRIES', '0'))
+# Usar un cliente simulado que no llama a Twilio (desarrollo y pruebas)
+TWILIO_STUB = os.environ.get('TWILIO_STUB', 'False').lower() in ['true', '1', 'yes']
+
+# Cómo responde el webhook:
+# - 'twiml': la respuesta viaja en el cuerpo HTTP del webhook (sin llamada extra a Twilio)
+# - 'outbox': se encola y la envía el comando dispatch_outbox
+# - 'rest': se envía con la API REST de Twilio antes de responder
+WHATSAPP_REPLY_MODE = os.environ.get('WHATSAPP_REPLY_MODE', 'twiml')
+
+# Configuración del outbox de respuestas (ver comando dispatch_outbox)
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '50'))
+OUTBOX_CONCURRENCY = int(os.environ.get('OUTBOX_CONCURRENCY', '8'))
+OUTBOX_MAX_INTENTOS = int(os.environ.get('OUTBOX_MAX_INTENTOS', '5'))
+OUTBOX_BACKOFF_SECONDS = int(os.environ.get('OUTBOX_BACKOFF_SECONDS', '5'))
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', '60'))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', '1'))
+
+# Idempotencia del webhook por MessageSid: segundos en el cache y horas que
+# se conservan los mensajes procesados (purge_mensajes_entrantes)
+WEBHOOK_IDEMPOTENCY_CACHE_SECONDS = int(os.environ.get('WEBHOOK_IDEMPOTENCY_CACHE_SECONDS', '600'))
+WEBHOOK_IDEMPOTENCY_TTL_HOURS = int(os.environ.get('WEBHOOK_IDEMPOTENCY_TTL_HOURS', '48'))
+
+# Números de teléfono autorizados (además de los cargados en TelefonoAutorizado)
 AUTHORIZED_PHONES = os.environ.get('AUTHORIZED_PHONES', '').split(',')
+# Cada cuánto se consulta la versión de la tabla en el cache y edad máxima
+# del conjunto en memoria antes de recargarlo igual (con el cache default en
+# memoria de cada proceso es la demora de una baja en los demás workers)
+AUTHORIZED_PHONES_REFRESH_SECONDS = float(os.environ.get('AUTHORIZED_PHONES_REFRESH_SECONDS', '1'))
+AUTHORIZED_PHONES_MAX_AGE = float(os.environ.get('AUTHORIZED_PHONES_MAX_AGE', '5'))
+
+# Categorías: los gastos se registran con la categoría conocida del usuario
+# más parecida ("comidas", "Cmida" -> "Comida"). Los alias se indican como
+# "super=Supermercado,uber=Transporte".
+CATEGORIAS_FUZZY = os.environ.get('CATEGORIAS_FUZZY', 'True') == 'True'
+CATEGORIA_ALIASES = dict(
+    (alias.strip(), categoria.strip())
+    for alias, _, categoria in (
+        item.partition('=') for item in os.environ.get('CATEGORIA_ALIASES', '').split(',') if '=' in item
+    )
+)
+CATEGORIAS_INDEX_TTL = float(os.environ.get('CATEGORIAS_INDEX_TTL', '300'))
+CATEGORIAS_INDEX_MAX_PHONES = int(os.environ.get('CATEGORIAS_INDEX_MAX_PHONES', '1000'))
+
+# Valores de Usuario y Categoria (teléfono/nombre <-> id) guardados en
+# memoria por proceso y por tabla (ver gastos/dimensiones.py)
+DIMENSIONES_CACHE_MAX = int(os.environ.get('DIMENSIONES_CACHE_MAX', '50000'))
+
+# Archivo: archive_gastos mueve a GastoArchivado los gastos de más de
+# ARCHIVO_DIAS días. Cada proceso relee el corte del archivo cada
+# ARCHIVO_CORTE_REFRESH_SECONDS (ver gastos/archivo.py).
+ARCHIVO_DIAS = int(os.environ.get('ARCHIVO_DIAS', '365'))
+ARCHIVO_CORTE_REFRESH_SECONDS = float(os.environ.get('ARCHIVO_CORTE_REFRESH_SECONDS', '60'))
 
 # Configuración de logging
+# Los handlers encolan y escriben desde un hilo aparte (gastos.log.QueuedHandler);
+# el archivo queda en JSON, un registro por línea, con request ID
+LOG_FILE = os.environ.get('LOG_FILE', 'gastos_whatsapp.log')
+# Fracción de requests que registran el payload completo del webhook (0 a 1)
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', '0.01'))
+LOG_REDACT_PHONES = os.environ.get('LOG_REDACT_PHONES', 'True') == 'True'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'gastos.log.RequestIdFilter',
+        },
+    },
     'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
+        'json': {
+            '()': 'gastos.log.JsonFormatter',
         },
         'simple': {
-            'format': '{levelname} {message}',
+            '()': 'gastos.log.RedactingFormatter',
+            'format': '{levelname} [{request_id}] {message}',
             'style': '{',
         },
     },
     'handlers': {
         'console': {
             'level': 'INFO',
-            'class': 'logging.StreamHandler',
+            'class': 'gastos.log.QueuedHandler',
+            'filters': ['request_id'],
             'formatter': 'simple',
         },
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': 'gastos_whatsapp.log',
-            'formatter': 'verbose',
+            'class': 'gastos.log.QueuedHandler',
+            'filename': LOG_FILE,
+            'filters': ['request_id'],
+            'formatter': 'json',
         },
     },
     'loggers': {
@@ -0,0 +1,19 @@
+"""
+Settings de las pruebas: los del proyecto, sin escribir en el archivo de logs.
+
+``manage.py test`` los usa solos; con otro runner (pytest-django,
+``python -m django test``) indicar
+DJANGO_SETTINGS_MODULE=gastos_whatsapp.settings_test.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import LOGGING
+
+LOGGING = {
+    **LOGGING,
+    'handlers': {nombre: handler for nombre, handler in LOGGING['handlers'].items() if nombre != 'file'},
+    'loggers': {
+        **LOGGING['loggers'],
+        'gastos': {**LOGGING['loggers']['gastos'], 'handlers': ['console']},
+    },
+}
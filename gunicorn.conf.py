@@ -0,0 +1,33 @@
+"""
+Configuración de gunicorn (se carga sola desde el directorio del proyecto).
+
+Con PROMETHEUS_MULTIPROC_DIR definido, las métricas de cada worker se
+escriben en ese directorio (ver gastos/metrics.py).
+"""
+
+import os
+import shutil
+
+
+def on_starting(server):
+    # Descarta las métricas de una ejecución anterior
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+    # Cada worker invalida solo su propia cache de resúmenes en memoria
+    # (mismo aviso que el chequeo gastos.W001)
+    backend = os.environ.get('RESUMEN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+    if server.cfg.workers > 1 and backend.endswith('LocMemCache'):
+        server.log.warning(
+            "%s workers con la cache de resúmenes en memoria de cada proceso: "
+            "los resúmenes pueden quedar desactualizados hasta RESUMEN_CACHE_TIMEOUT. "
+            "Definir RESUMEN_CACHE_BACKEND/RESUMEN_CACHE_LOCATION con un backend compartido.",
+            server.cfg.workers,
+        )
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -6,6 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
+    # Las pruebas usan gastos_whatsapp/settings_test.py
+    if sys.argv[1:2] == ['test']:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gastos_whatsapp.settings_test')
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gastos_whatsapp.settings')
     try:
         from django.core.management import execute_from_command_line